@@ -95,6 +95,7 @@ def main():
     h_dict = {"h": h, 
               "dhdx": dhdx,
               "h_args": h_args,
+              "vectorized": True,
               }
 
     start_time = time.time()
@@ -112,7 +113,7 @@ def main():
 
     start_time = time.time()
     logger = FilterLogger(len(x0), len(t))
-    filter = ParticleFilter(t0, x_0_k, f_dict, h_dict, logger=logger)
+    filter = ParticleFilter(t0, x_0_k, f_dict, h_dict, logger=logger, seed=1234)
     filter.run(t, Y, R_vec, np.full(len(t), None), np.empty((len(t),0)))
 
     print("Time Elapsed: " + str(time.time() - start_time))
@@ -58,7 +58,7 @@ def main():
 
     h_args = X_stations_ECI[0]
     h, dhdx = measurements(x0, h_rho_rhod, h_args)
-    h_dict = {'h': h, 'dhdx': dhdx, 'h_args': h_args}
+    h_dict = {'h': h, 'dhdx': dhdx, 'h_args': h_args, 'vectorized': True}
 
     #########################
     # Generate f/h_args_vec #
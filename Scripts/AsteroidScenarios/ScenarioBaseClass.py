@@ -3,7 +3,8 @@ import time
 from StatOD.data import get_measurements_general
 from StatOD.dynamics import dynamics_ivp_no_jit, dynamics_ivp_unscented_no_jit, process_noise, dynamics
 import numpy as np
-from StatOD.filters import FilterLogger
+from StatOD.filters import FilterLogger, UnscentedKalmanFilter
+from StatOD.gravity import memoizedGravityModel
 
 from StatOD.measurements import measurements
 from Scripts.AsteroidScenarios.helper_functions import *
@@ -97,6 +98,11 @@ class ScenarioBaseClass:
             'h_args': self.h_args
             }
 
+        # the STM propagation evaluates dfdx right after f at the same state,
+        # so the pair shares one evaluation of the gravity model
+        if isinstance(self.model, memoizedGravityModel) and not issubclass(filter_class, UnscentedKalmanFilter):
+            self.model.acceleration_order = 2
+
         logger = FilterLogger(len(self.x0), len(self.t))
         filter = filter_class(self.t0, self.x0, self.dx0, self.P0, f_dict, h_dict, logger=logger)
         
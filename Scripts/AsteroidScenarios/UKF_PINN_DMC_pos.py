@@ -157,7 +157,7 @@ def main():
 
     h_args = X_stations_ECI[0]
     h, dhdx = measurements(z0, h_fcn, h_args)
-    h_dict = {'h': h, 'dhdx': dhdx, 'h_args': h_args}
+    h_dict = {'h': h, 'dhdx': dhdx, 'h_args': h_args, 'vectorized': True}
 
     #########################
     # Generate f/h_args_vec #
@@ -180,6 +180,7 @@ def main():
     dz0 = None
     filter = ExtendedKalmanFilter(t0, z0, dz0, P0, f_dict, h_dict, logger=logger)
     filter.f_integrate = dynamics_ivp_no_jit # can't pass the model into the numba JIT function
+    model.acceleration_order = 2 # f and dfdx share one evaluation in the STM propagation
 
     # filter = UnscentedKalmanFilter(t0, z0, dz0, P0, alpha, kappa, beta, f_dict, h_dict, logger=logger)
     # filter.f_integrate = dynamics_ivp_unscented_no_jit # can't pass the model into the numba JIT function
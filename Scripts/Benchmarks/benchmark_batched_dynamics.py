@@ -0,0 +1,48 @@
+import time
+import numpy as np
+from StatOD.dynamics import (dynamics_ivp_particle_batch, dynamics_ivp_unscented_batch,
+                             dynamics_ivp_unscented_no_jit, f_PINN_DMC)
+from StatOD.gravity import mlpGravityModel
+from StatOD.gravity.mlp import ACTIVATIONS
+
+def random_model(rng, width=32):
+    # stand in for an exported PINN, no TF / GravNN required
+    sizes = np.array([3, width, width, 1])
+    weights = np.hstack([rng.normal(size=sizes[i]*sizes[i+1])*0.5 for i in range(3)])
+    biases = rng.normal(size=2*width + 1)*0.1
+    activations = [ACTIVATIONS["tanh"], ACTIVATIONS["tanh"], ACTIVATIONS["linear"]]
+    constants = np.array([0.5, 0.4, 0.3, 0.0, 0.0, 0.0, 2.0, 0.1, 3.0, 1.0, 1.0, 1.0])
+    return mlpGravityModel(weights, biases, sizes, activations, constants)
+
+def particle_no_jit(t, Z, f, N, f_args):
+    # dynamics_ivp_particle without numba (f calls the model per particle)
+    X = Z.reshape((N,-1))
+    return np.array([f(X[k], f_args) for k in range(N)]).reshape((-1))
+
+def time_rhs(fcn, Z_list, f, arg, f_args):
+    fcn(0.0, Z_list[0], f, arg, f_args)
+    start_time = time.time()
+    for Z in Z_list:
+        fcn(0.0, Z, f, arg, f_args)
+    return (time.time() - start_time) / len(Z_list)
+
+def main():
+    rng = np.random.default_rng(0)
+    model = random_model(rng)
+    f_args = np.array([model] + [0.0]*6 + [120.0], dtype=object)
+    x0 = np.array([3.0, 0.0, 0.0, 0.0, 0.6, 0.1, 0.0, 0.0, 0.0])
+
+    # states change every call, otherwise the model memoizes the evaluation
+    print("states, per state [us], batched [us], speedup")
+    for K, name in [(2*len(x0) + 1, "UKF sigma points"), (1000, "particles")]:
+        Z_list = [(x0 + rng.normal(size=(K, len(x0)))*1E-2).reshape((-1)) for _ in range(20)]
+        if name == "particles":
+            t_loop = time_rhs(particle_no_jit, Z_list, f_PINN_DMC, K, f_args)
+            t_batch = time_rhs(dynamics_ivp_particle_batch, Z_list, f_PINN_DMC, K, f_args)
+        else:
+            t_loop = time_rhs(dynamics_ivp_unscented_no_jit, Z_list, f_PINN_DMC, None, f_args)
+            t_batch = time_rhs(dynamics_ivp_unscented_batch, Z_list, f_PINN_DMC, None, f_args)
+        print("%s (%d), %.1f, %.1f, %.1fx" % (name, K, t_loop*1E6, t_batch*1E6, t_loop/t_batch))
+
+if __name__ == "__main__":
+    main()
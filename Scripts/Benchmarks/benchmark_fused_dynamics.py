@@ -0,0 +1,64 @@
+import time
+import timeit
+import numpy as np
+from numba import njit
+from StatOD.constants import EarthParams
+from StatOD.dynamics import dynamics, dynamics_ivp, dynamics_ivp_fused, f_J2, f_J3
+from StatOD.filters import FilterLogger, KalmanFilter
+from Scripts.Benchmarks.scenarios import get_earth_scenario
+
+@njit(cache=False)
+def repeat_rhs(fun, Z, f, dfdx, f_args, n):
+    # time inside compiled code so dispatch overhead isn't measured
+    Zd = fun(0.0, Z, f, dfdx, f_args)
+    for _ in range(n):
+        Zd += fun(0.0, Z, f, dfdx, f_args)
+    return Zd
+
+def time_rhs(f_fcn, f_args):
+    x0 = np.array([-3515.4903270335103, 8390.716310243395, 4127.627352553683,
+                   -4.357676322178153, -3.3565791387645487, 3.111892927869902])
+    f, dfdx, f_phi = dynamics(x0, f_fcn, f_args, fused=True)
+    Z = np.append(x0, np.eye(len(x0)).reshape((-1)))
+
+    Zd = dynamics_ivp(0.0, Z, f, dfdx, f_args)
+    Zd_fused = dynamics_ivp_fused(0.0, Z, f, f_phi, f_args)
+    assert np.allclose(Zd, Zd_fused, rtol=1E-12, atol=0.0)
+
+    n = 100000
+    repeat_rhs(dynamics_ivp, Z, f, dfdx, f_args, 1)
+    repeat_rhs(dynamics_ivp_fused, Z, f, f_phi, f_args, 1)
+    t_split = np.min(timeit.repeat(lambda : repeat_rhs(dynamics_ivp, Z, f, dfdx, f_args, n), repeat=5, number=1)) / n
+    t_fused = np.min(timeit.repeat(lambda : repeat_rhs(dynamics_ivp_fused, Z, f, f_phi, f_args, n), repeat=5, number=1)) / n
+    return t_split, t_fused
+
+def time_filter(model, integrator):
+    t, Y, X_stations_ECI, x0, dx0, P0, R0, f_dict, h_dict = get_earth_scenario(model)
+    f, dfdx, f_phi = dynamics(x0, f_J2 if model == "J2" else f_J3, f_dict['f_args'], fused=True)
+    f_dict.update({"f" : f, "dfdx" : dfdx, "f_phi" : f_phi, "integrator" : integrator})
+    R_vec = np.repeat(np.array([R0]), len(t), axis=0)
+    f_args_vec = np.full((len(t), len(f_dict['f_args'])), f_dict['f_args'])
+
+    filter = KalmanFilter(0.0, x0, dx0, P0, f_dict, h_dict)
+    filter.run(t[:3], Y[:3,1:], R_vec[:3], f_args_vec[:3], X_stations_ECI[:3])
+
+    logger = FilterLogger(len(x0), len(t))
+    filter = KalmanFilter(0.0, x0, dx0, P0, f_dict, h_dict, logger=logger)
+    start_time = time.time()
+    filter.run(t, Y[:,1:], R_vec, f_args_vec, X_stations_ECI)
+    return time.time() - start_time
+
+def main():
+    ep = EarthParams()
+    for name, f_fcn, f_args in [
+        ("J2", f_J2, np.array([ep.R, ep.mu, ep.J2])),
+        ("J3", f_J3, np.array([ep.R, ep.mu, ep.J2, ep.J3])),
+        ]:
+        t_split, t_fused = time_rhs(f_fcn, f_args)
+        print("%s rhs: split %.2f [us], fused %.2f [us] (%.1fx)" % (name, t_split*1E6, t_fused*1E6, t_split/t_fused))
+
+    for integrator in [None, "DOP853"]:
+        print("J2 CKF (%s) with fused rhs: %.2f [s]" % (integrator, time_filter("J2", integrator)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import time
+import numpy as np
+from StatOD.constants import EarthParams
+from StatOD.data import get_measurements
+from StatOD.dynamics import dynamics, f_J2
+from StatOD.filters import ExtendedKalmanFilter, FilterLogger, KalmanFilter
+from StatOD.measurements import h_rho_rhod, measurements
+
+def run_filter(filter_class, merge_gaps, integrator=None):
+    ep = EarthParams()
+    cart_state = np.array([-3515.4903270335103, 8390.716310243395, 4127.627352553683,
+                           -4.357676322178153, -3.3565791387645487, 3.111892927869902])
+    t, Y, X = get_measurements("Data/Measurements/range_rangerate_w_J2_w_noise.data")
+
+    dx0 = np.array([0.1, 0.0, 0.0, 1E-4, 0.0, 0.0])
+    x0 = cart_state + dx0
+    P0 = np.diag(np.array([1, 1, 1, 1E-3, 1E-3, 1E-3])**2)
+    R0 = np.diag(np.array([1E-3, 1E-6])**2)
+    f_args = np.array([ep.R, ep.mu, ep.J2])
+    f, dfdx = dynamics(x0, f_J2, f_args)
+    f_dict = {"f" : f, "dfdx" : dfdx, "f_args" : f_args, "Q" : np.zeros((3,3)), "integrator" : integrator}
+    h, dhdx = measurements(x0, h_rho_rhod, X[0])
+    h_dict = {"h" : h, "dhdx" : dhdx, "h_args" : X[0]}
+
+    R_vec = np.repeat(np.array([R0]), len(t), axis=0)
+    f_args_vec = np.full((len(t), len(f_args)), f_args)
+    logger = FilterLogger(len(x0), len(t))
+    filter = filter_class(t[0], x0, dx0, P0, f_dict, h_dict, logger=logger)
+    start_time = time.time()
+    filter.run(t, Y[:,1:], R_vec, f_args_vec, X, merge_gaps=merge_gaps)
+    return time.time() - start_time, logger
+
+def main():
+    t, Y, X = get_measurements("Data/Measurements/range_rangerate_w_J2_w_noise.data")
+    empty = np.any(np.isnan(Y[:,1:]), axis=1)
+    print("%d epochs, %d without measurements" % (len(t), np.sum(empty)))
+
+    # warm up the compiled dynamics
+    run_filter(KalmanFilter, False)
+    for filter_class in [KalmanFilter, ExtendedKalmanFilter]:
+        for integrator in [None, "RK45"]:
+            t_step, logger_step = run_filter(filter_class, False, integrator)
+            t_merged, logger_merged = run_filter(filter_class, True, integrator)
+            x_error = np.max(np.abs(logger_step.x_hat_i_plus - logger_merged.x_hat_i_plus))
+            P_error = np.max(np.abs(logger_step.P_i_plus - logger_merged.P_i_plus)) / np.max(np.abs(logger_step.P_i_plus))
+            print("%s (%s): per epoch %.2f [s], merged gaps %.2f [s], max x diff %.1e, P rel. diff %.1e" % (
+                filter_class.__name__, integrator, t_step, t_merged, x_error, P_error))
+
+if __name__ == "__main__":
+    main()
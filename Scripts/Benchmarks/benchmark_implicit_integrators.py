@@ -0,0 +1,49 @@
+import time
+import numpy as np
+from StatOD.constants import EarthParams
+from StatOD.dynamics import dynamics, f_scenario_1_J2, stm_jacobian
+from StatOD.filters import ExtendedKalmanFilter
+
+def main():
+    ep = EarthParams()
+    x0 = np.hstack((
+        [-3515.4903270335103, 8390.716310243395, 4127.627352553683,
+         -4.357676322178153, -3.3565791387645487, 3.111892927869902],
+        [ep.mu, ep.J2, 2.0],
+        [6000.0, 100.0, 200.0], [100.0, 6000.0, 300.0], [-4000.0, 4000.0, 1000.0]))
+    f_args = np.array([3.0, 970.0, 3.614E-13, 700000.0 + ep.R, 88667.0, 7.2921158553E-5, ep.R])
+    N = len(x0)
+
+    f, dfdx = dynamics(x0, f_scenario_1_J2, f_args)
+    start_time = time.time()
+    d2fdx2, jac_sparsity = stm_jacobian(x0, f_scenario_1_J2, f_args)
+    print("stm_jacobian: %.2f [s], %d of %d jacobian entries nonzero" % (time.time() - start_time, jac_sparsity.sum(), jac_sparsity.size))
+
+    phi_ref = None
+    for method, options in [
+        ("RK45", {}),
+        ("DOP853", {}),
+        ("Radau", {"jac_sparsity" : jac_sparsity}),
+        ("Radau", {"d2fdx2" : d2fdx2}),
+        ("BDF", {"jac_sparsity" : jac_sparsity}),
+        ("BDF", {"d2fdx2" : d2fdx2}),
+        ("LSODA", {"d2fdx2" : d2fdx2}),
+        ]:
+        f_dict = {"f" : f, "dfdx" : dfdx, "f_args" : f_args, "method" : method, **options}
+        h_dict = {"h" : None, "dhdx" : None, "h_args" : None}
+        filter = ExtendedKalmanFilter(0.0, x0, np.zeros(N), np.eye(N), f_dict, h_dict)
+        filter.atol = 1E-10
+        filter.rtol = 1E-10
+        filter.propagate_stm(60.0, x0, np.eye(N)) # compile
+
+        start_time = time.time()
+        x_i, phi_i, sol = filter.propagate_stm(3600.0, x0, np.eye(N))
+        elapsed = time.time() - start_time
+        if phi_ref is None:
+            phi_ref = phi_i
+        error = np.max(np.abs(phi_i - phi_ref)) / np.max(np.abs(phi_ref))
+        print("%s %s: %.3f [s], nfev %d, njev %d, phi rel. diff %.1e" % (
+            method, list(options.keys()), elapsed, sol.nfev, sol.njev, error))
+
+if __name__ == "__main__":
+    main()
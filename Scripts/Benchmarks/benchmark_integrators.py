@@ -0,0 +1,32 @@
+import time
+import numpy as np
+from StatOD.filters import FilterLogger, KalmanFilter
+from Scripts.Benchmarks.scenarios import get_earth_scenario
+
+def run_filter(integrator, model):
+    t, Y, X_stations_ECI, x0, dx0, P0, R0, f_dict, h_dict = get_earth_scenario(model)
+    f_dict['integrator'] = integrator
+    R_vec = np.repeat(np.array([R0]), len(t), axis=0)
+    f_args_vec = np.full((len(t), len(f_dict['f_args'])), f_dict['f_args'])
+
+    # warm up the jit compiled kernels before timing
+    filter = KalmanFilter(0.0, x0, dx0, P0, f_dict, h_dict)
+    filter.run(t[:3], Y[:3,1:], R_vec[:3], f_args_vec[:3], X_stations_ECI[:3])
+
+    logger = FilterLogger(len(x0), len(t))
+    filter = KalmanFilter(0.0, x0, dx0, P0, f_dict, h_dict, logger=logger)
+    start_time = time.time()
+    filter.run(t, Y[:,1:], R_vec, f_args_vec, X_stations_ECI)
+    return time.time() - start_time, logger.x_hat_i_plus
+
+def main():
+    for model in ["J2", "J3"]:
+        t_ref, x_ref = run_filter(None, model)
+        print("%s solve_ivp: %.2f [s]" % (model, t_ref))
+        for integrator in ["RK45", "DOP853"]:
+            dt, x_hat = run_filter(integrator, model)
+            print("%s %s: %.2f [s] (%.1fx), max |dx| = %.2e" % (
+                model, integrator, dt, t_ref/dt, np.max(np.abs(x_hat - x_ref))))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import copy
+import time
+import numpy as np
+from StatOD.filters import RESAMPLING, ParticleFilter
+from StatOD.measurements import h_pos, measurements
+
+def loop_update(filter, x, y, R):
+    # the per particle likelihoods and O(N^2) resampling the filter used before
+    w = np.zeros((len(x),))
+    R_inv = np.linalg.inv(R)
+    coef = 1/((2*np.pi)**(len(y)/2)*np.linalg.det(R)**(1/2.0))
+    for i in range(len(x)):
+        r = y - np.array(filter.h(x[i], filter.h_args))
+        w[i] = coef*np.exp(-1/2*r@R_inv@r)
+    w = w/np.sum(w)
+    cdf = np.cumsum(w)
+    u = np.random.uniform(0, 1, size=len(x))
+    x_plus = np.zeros_like(x)
+    for i in range(len(x)):
+        x_plus[i] = copy.deepcopy(x[np.where(cdf >= u[i])[0][0]])
+    return x_plus
+
+def log_update(filter, x, y, R):
+    log_w = filter.measurement_update(np.full((len(x),), -np.log(len(x))), R, filter.process_observations(x, y))
+    return filter.resample(x, log_w)
+
+def time_fcn(fcn):
+    start_time = time.time()
+    fcn()
+    return time.time() - start_time
+
+def main():
+    x0 = np.array([-3515.4903270335103, 8390.716310243395, 4127.627352553683,
+                   -4.357676322178153, -3.3565791387645487, 3.111892927869902])
+    X_obs = np.zeros((6,))
+    h, dhdx = measurements(x0, h_pos, X_obs)
+    R = np.eye(3)*10.0**2
+    y = x0[0:3] + np.array([5.0, -3.0, 1.0])
+    rng = np.random.default_rng(0)
+
+    print("particles, loop [s], log weights + resampling [s] (%s)" % ", ".join(RESAMPLING.keys()))
+    for N in [1000, 10000, 100000, 1000000]:
+        x = x0 + rng.normal(size=(N, 6))*np.array([10, 10, 10, 1E-2, 1E-2, 1E-2])
+        times = []
+        for resampling in RESAMPLING.keys():
+            filter = ParticleFilter(0.0, x, {"f" : None, "dfdx" : None, "f_args" : None}, 
+                                    {"h" : h, "dhdx" : dhdx, "h_args" : X_obs, "vectorized" : True}, resampling=resampling, seed=0)
+            times.append(time_fcn(lambda : log_update(filter, x, y, R)))
+        t_loop = time_fcn(lambda : loop_update(filter, x, y, R)) if N <= 10000 else np.nan
+        print("%d, %.4f, %s" % (N, t_loop, ", ".join(["%.4f" % t for t in times])))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import timeit
+import numpy as np
+from StatOD.constants import EarthParams
+from StatOD.data import get_measurements
+from StatOD.dynamics import dynamics, f_J2
+from StatOD.filters import FilterLogger, KalmanFilter
+from StatOD.linalg import joseph_update, kalman_gain, sequential_update
+from StatOD.measurements import h_pos, h_rho_rhod, measurements
+
+def batch_update(dx, P, H, R, r):
+    # the default (non sequential) KF measurement update
+    K = kalman_gain(P, H, R)
+    return dx + K@(r - H@dx), joseph_update(P, K, H, R)
+
+def time_update_fcn(fcn, n=5000):
+    fcn()
+    return np.min(timeit.repeat(fcn, repeat=5, number=n)) / n
+
+def main():
+    ep = EarthParams()
+    x0 = np.array([-3515.4903270335103, 8390.716310243395, 4127.627352553683,
+                   -4.357676322178153, -3.3565791387645487, 3.111892927869902])
+    X_obs = np.array([-5127.5, -3794.2, 0.0, 0.2767, -0.3739, 0.0])
+    rng = np.random.default_rng(0)
+
+    print("measurement, N, batch [us], sequential joseph [us], sequential conventional [us], max P diff")
+    for name, h_fcn, sigmas in [("range / range-rate", h_rho_rhod, [1E-3, 1E-6]), ("position", h_pos, [1E-3, 1E-3, 1E-3])]:
+        h, dhdx = measurements(x0, h_fcn, X_obs)
+        h_i = np.array(h(x0, X_obs))
+        H_6 = np.array(dhdx(x0, h_i, X_obs))
+        R = np.diag(np.array(sigmas)**2)
+        r = rng.normal(size=len(sigmas))*sigmas
+        for N in [6, 9, 18]:
+            # pad the state (e.g. DMC / dynamics parameters)
+            H = np.zeros((len(sigmas), N))
+            H[:,:6] = H_6
+            A = rng.normal(size=(N,N))
+            P = A@A.T + np.eye(N)
+            dx = np.zeros((N,))
+            t_batch = time_update_fcn(lambda : batch_update(dx, P, H, R, r))
+            t_joseph = time_update_fcn(lambda : sequential_update(dx, P, H, R, r, True))
+            t_conventional = time_update_fcn(lambda : sequential_update(dx, P, H, R, r, False))
+            error = np.max(np.abs(batch_update(dx, P, H, R, r)[1] - sequential_update(dx, P, H, R, r)[1])) / np.max(np.abs(P))
+            print("%s, %d, %.2f, %.2f, %.2f, %.1e" % (name, N, t_batch*1E6, t_joseph*1E6, t_conventional*1E6, error))
+
+    # full CKF on the range / range-rate data set
+    t, Y, X = get_measurements("Data/Measurements/range_rangerate_w_J2_w_noise.data")
+    dx0 = np.array([0.1, 0.0, 0.0, 1E-4, 0.0, 0.0])
+    P0 = np.diag(np.array([1, 1, 1, 1E-3, 1E-3, 1E-3])**2)
+    R_vec = np.repeat(np.array([np.diag(np.array([1E-3, 1E-6])**2)]), len(t), axis=0)
+    f_args = np.array([ep.R, ep.mu, ep.J2])
+    f, dfdx = dynamics(x0, f_J2, f_args)
+    h, dhdx = measurements(x0, h_rho_rhod, X[0])
+    for sequential in [False, "joseph", "conventional"]:
+        f_dict = {"f" : f, "dfdx" : dfdx, "f_args" : f_args, "Q" : np.zeros((3,3))}
+        h_dict = {"h" : h, "dhdx" : dhdx, "h_args" : X[0], "sequential" : sequential}
+        logger = FilterLogger(len(x0), len(t))
+        # warm up the compiled functions on the first epochs
+        KalmanFilter(t[0], x0 + dx0, dx0, P0, f_dict, h_dict).run(t[:10], Y[:10,1:], R_vec, np.full((10, len(f_args)), f_args), X)
+        filter = KalmanFilter(t[0], x0 + dx0, dx0, P0, f_dict, h_dict, logger=logger)
+        start_time = timeit.default_timer()
+        filter.run(t, Y[:,1:], R_vec, np.full((len(t), len(f_args)), f_args), X)
+        print("CKF, sequential = %s: %.2f [s]" % (sequential, timeit.default_timer() - start_time))
+
+if __name__ == "__main__":
+    main()
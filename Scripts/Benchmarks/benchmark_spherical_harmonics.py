@@ -0,0 +1,75 @@
+import argparse
+import time
+import timeit
+import numpy as np
+from numba import njit
+from StatOD.constants import ErosParams
+from StatOD.dynamics import dynamics, dynamics_ivp, f_C22
+from StatOD.gravity.spherical_harmonics import sphericalHarmonicModel, make_SH_dynamics
+
+@njit(cache=False)
+def repeat_rhs(fun, Z, f, dfdx, f_args, n):
+    # time inside compiled code so dispatch overhead isn't measured
+    Zd = fun(0.0, Z, f, dfdx, f_args)
+    for _ in range(n):
+        Zd += fun(0.0, Z, f, dfdx, f_args)
+    return Zd
+
+def random_coefficients(N, seed=0):
+    # Kaula-like decay so high degrees stay well scaled
+    rng = np.random.default_rng(seed)
+    C = np.tril(rng.normal(size=(N+1, N+1)))
+    S = np.tril(rng.normal(size=(N+1, N+1)))
+    scale = 1E-2/np.maximum(np.arange(N+1), 1)**2
+    C *= scale.reshape((-1,1))
+    S *= scale.reshape((-1,1))
+    C[0,0] = 1.0
+    C[1] = 0.0
+    S[:,0] = 0.0
+    S[1] = 0.0
+    return C, S
+
+def time_rhs(f, dfdx, f_args, x0, n):
+    Z = np.append(x0, np.eye(len(x0)).reshape((-1)))
+    repeat_rhs(dynamics_ivp, Z, f, dfdx, f_args, 1)
+    return np.min(timeit.repeat(lambda : repeat_rhs(dynamics_ivp, Z, f, dfdx, f_args, n), repeat=5, number=1)) / n
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--degrees", type=int, nargs="+", default=[2, 4, 8, 16, 32, 64, 100])
+    parser.add_argument("--symbolic", action="store_true", help="also time the sympy f_C22 model (its derivation takes minutes)")
+    args = parser.parse_args()
+
+    ep = ErosParams()
+    R = ep.R
+    mu = ep.mu
+    x0 = np.array([2.0*R, 0.5*R, 0.8*R, 0.0, 1E-3, 0.0])
+    f_args = np.zeros((0,))
+
+    if args.symbolic:
+        C, S = random_coefficients(2)
+        f_args_C22 = np.array([R, mu, C[2,0], S[2,0], C[2,1], S[2,1], C[2,2], S[2,2]])
+        start_time = time.time()
+        f, dfdx = dynamics(x0, f_C22, f_args_C22, use_cache=False)
+        t_setup = time.time() - start_time
+        t_rhs = time_rhs(f, dfdx, f_args_C22, x0, 10000)
+        print("sympy f_C22: setup %.2f [s], rhs %.2f [us]" % (t_setup, t_rhs*1E6))
+
+    print("degree, setup [ms], compile [s], rhs [us]")
+    for N in args.degrees:
+        C, S = random_coefficients(N)
+        start_time = time.time()
+        model = sphericalHarmonicModel((R, mu, C, S))
+        t_setup = time.time() - start_time
+
+        start_time = time.time()
+        f, dfdx = make_SH_dynamics(model)
+        f(x0, f_args)
+        dfdx(x0, f(x0, f_args), f_args)
+        t_compile = time.time() - start_time
+
+        t_rhs = time_rhs(f, dfdx, f_args, x0, max(100, 200000 // (N+1)**2))
+        print("%d, %.2f, %.2f, %.2f" % (N, t_setup*1E3, t_compile, t_rhs*1E6))
+
+if __name__ == "__main__":
+    main()
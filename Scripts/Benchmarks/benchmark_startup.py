@@ -0,0 +1,52 @@
+import argparse
+import json
+import subprocess
+import sys
+
+# Runs the imports needed for a classical (J2) filter in a fresh
+# interpreter, reports how long they take, and fails if any of the
+# heavy optional dependencies were pulled in along the way.
+
+HEAVY_MODULES = ["tensorflow", "GravNN", "pandas", "matplotlib"]
+
+STARTUP_CODE = """
+import json, sys, time
+start_time = time.time()
+import StatOD.filters
+import StatOD.dynamics
+import StatOD.measurements
+elapsed = time.time() - start_time
+loaded = [name for name in %s if name in sys.modules]
+print(json.dumps({"elapsed" : elapsed, "loaded" : loaded}))
+""" % HEAVY_MODULES
+
+def measure_startup(samples):
+    results = []
+    for _ in range(samples):
+        output = subprocess.check_output([sys.executable, "-c", STARTUP_CODE])
+        results.append(json.loads(output.decode().strip().splitlines()[-1]))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", type=int, default=5)
+    parser.add_argument("--max-time", type=float, default=None, help="fail if the median import time exceeds this [s]")
+    args = parser.parse_args()
+
+    results = measure_startup(args.samples)
+    elapsed = sorted([result['elapsed'] for result in results])
+    median = elapsed[len(elapsed)//2]
+    loaded = results[-1]['loaded']
+    print("Import time: median %.3f [s], min %.3f [s], max %.3f [s]" % (median, elapsed[0], elapsed[-1]))
+
+    failed = False
+    if len(loaded) > 0:
+        print("Heavy modules loaded on import: " + ", ".join(loaded))
+        failed = True
+    if args.max_time is not None and median > args.max_time:
+        print("Import time exceeds %.3f [s]" % args.max_time)
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
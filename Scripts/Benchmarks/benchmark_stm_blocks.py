@@ -0,0 +1,72 @@
+import time
+import timeit
+import numpy as np
+from numba import njit
+from StatOD.constants import EarthParams
+from StatOD.dynamics import (analytic_states, blocks_initial_state, dfdx_pattern,
+                             dynamics, dynamics_ivp, f_J2_DMC, f_scenario_1_J2,
+                             make_dynamics_ivp_blocks, stm_blocks)
+from StatOD.filters import ExtendedKalmanFilter
+
+@njit(cache=False)
+def repeat_rhs(fun, Z, f, dfdx, f_args, n):
+    # time inside compiled code so dispatch overhead isn't measured
+    Zd = fun(0.0, Z, f, dfdx, f_args)
+    for _ in range(n):
+        Zd += fun(0.0, Z, f, dfdx, f_args)
+    return Zd
+
+def get_cases():
+    ep = EarthParams()
+    x = np.array([-3515.4903270335103, 8390.716310243395, 4127.627352553683,
+                  -4.357676322178153, -3.3565791387645487, 3.111892927869902])
+    return [
+        ("f_J2_DMC", f_J2_DMC,
+            np.append(x, [1E-7, 2E-7, -1E-7]),
+            np.array([ep.R, ep.mu, ep.J2, 1000.0])),
+        ("f_scenario_1_J2", f_scenario_1_J2,
+            np.hstack((x, [ep.mu, ep.J2, 2.0], [6000.0, 100.0, 200.0], [100.0, 6000.0, 300.0], [-4000.0, 4000.0, 1000.0])),
+            np.array([3.0, 970.0, 3.614E-13, 700000.0 + ep.R, 88667.0, 7.2921158553E-5, ep.R])),
+    ]
+
+def main():
+    for name, f_fcn, x0, f_args in get_cases():
+        N = len(x0)
+        f, dfdx = dynamics(x0, f_fcn, f_args)
+        S = analytic_states(x0, f_fcn, f_args)
+        pattern = dfdx_pattern(x0, f_fcn, f_args)
+        D, S, C, E = stm_blocks(pattern, S)
+        f_blocks = make_dynamics_ivp_blocks(D, S, C, E)
+
+        Z_full = np.append(x0, np.eye(N).reshape((-1)))
+        Z_blocks = blocks_initial_state(x0, D, S, C)
+        n = 20000
+        repeat_rhs(dynamics_ivp, Z_full, f, dfdx, f_args, 1)
+        repeat_rhs(f_blocks, Z_blocks, f, dfdx, f_args, 1)
+        t_full = np.min(timeit.repeat(lambda : repeat_rhs(dynamics_ivp, Z_full, f, dfdx, f_args, n), repeat=5, number=1)) / n
+        t_blocks = np.min(timeit.repeat(lambda : repeat_rhs(f_blocks, Z_blocks, f, dfdx, f_args, n), repeat=5, number=1)) / n
+        print("%s: analytic states %s" % (name, S.tolist()))
+        print("  ODE dimension: full %d, blocks %d" % (len(Z_full), len(Z_blocks)))
+        print("  rhs: full %.2f [us], blocks %.2f [us]" % (t_full*1E6, t_blocks*1E6))
+
+        for integrator in [None, "DOP853"]:
+            times = []
+            phis = []
+            for blocks in [None, S]:
+                f_dict = {"f" : f, "dfdx" : dfdx, "f_args" : f_args, "integrator" : integrator}
+                if blocks is not None:
+                    f_dict['analytic_states'] = blocks
+                    f_dict['dfdx_pattern'] = pattern
+                h_dict = {"h" : None, "dhdx" : None, "h_args" : None}
+                filter = ExtendedKalmanFilter(0.0, x0, np.zeros(N), np.eye(N), f_dict, h_dict)
+                filter.propagate_forward(60.0, x0, np.eye(N))
+                start_time = time.time()
+                for _ in range(10):
+                    x_i, phi_i = filter.propagate_forward(3600.0, x0, np.eye(N))
+                times.append((time.time() - start_time) / 10)
+                phis.append(phi_i)
+            error = np.max(np.abs(phis[0] - phis[1])) / np.max(np.abs(phis[0]))
+            print("  1 hr propagation (%s): full %.2f [ms], blocks %.2f [ms], phi rel. diff %.1e" % (integrator, times[0]*1E3, times[1]*1E3, error))
+
+if __name__ == "__main__":
+    main()
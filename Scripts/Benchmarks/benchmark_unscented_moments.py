@@ -0,0 +1,64 @@
+import timeit
+import numpy as np
+from StatOD.constants import EarthParams
+from StatOD.data import get_measurements
+from StatOD.dynamics import dynamics, f_J2
+from StatOD.filters import FilterLogger, UnscentedKalmanFilter
+from StatOD.measurements import h_rho_rhod, measurements
+
+def loop_moments(filter, sigma_points, R):
+    # the per sigma point outer products the UKF used before
+    x_hat = np.sum([filter.w_m[k]*sigma_points[k] for k in range(len(sigma_points))], axis=0)
+    P = np.zeros((len(x_hat), len(x_hat)))
+    for k in range(len(sigma_points)):
+        P += filter.w_c[k]*np.outer(sigma_points[k] - x_hat, sigma_points[k] - x_hat)
+    Y = np.array([np.array(filter.h(x, filter.h_args)) for x in sigma_points])
+    y_hat = np.zeros((Y.shape[1],))
+    P_yy = np.copy(R)
+    P_xy = np.zeros((len(x_hat), Y.shape[1]))
+    for k in range(len(Y)):
+        y_hat += filter.w_m[k]*Y[k]
+    for k in range(len(Y)):
+        P_yy += filter.w_c[k]*np.outer(Y[k] - y_hat, Y[k] - y_hat)
+        P_xy += filter.w_c[k]*np.outer(sigma_points[k] - x_hat, Y[k] - y_hat)
+    return x_hat, P, y_hat, P_yy, P_xy
+
+def matrix_moments(filter, sigma_points, R):
+    x_hat, P = filter.time_update(sigma_points, 0.0)
+    y_hat, K, P_yy = filter.process_observations(x_hat, sigma_points, np.zeros((len(R),)), R)
+    return x_hat, P, y_hat, P_yy, K
+
+def time_fcn(fcn, n=2000):
+    fcn()
+    return np.min(timeit.repeat(fcn, repeat=5, number=n)) / n
+
+def main():
+    ep = EarthParams()
+    x0 = np.array([-3515.4903270335103, 8390.716310243395, 4127.627352553683,
+                   -4.357676322178153, -3.3565791387645487, 3.111892927869902])
+    t, Y, X = get_measurements("Data/Measurements/range_rangerate_w_J2_w_noise.data")
+    dx0 = np.array([0.1, 0.0, 0.0, 1E-4, 0.0, 0.0])
+    P0 = np.diag(np.array([1, 1, 1, 1E-3, 1E-3, 1E-3])**2)
+    R0 = np.diag(np.array([1E-3, 1E-6])**2)
+    f_args = np.array([ep.R, ep.mu, ep.J2])
+    f, dfdx = dynamics(x0, f_J2, f_args)
+    h, dhdx = measurements(x0, h_rho_rhod, X[0])
+    f_dict = {"f" : f, "dfdx" : dfdx, "f_args" : f_args, "Q" : np.zeros((3,3))}
+    h_dict = {"h" : h, "dhdx" : dhdx, "h_args" : X[0], "vectorized" : True}
+
+    filter = UnscentedKalmanFilter(t[0], x0 + dx0, dx0, P0, 1.0, 0.0, 2.0, f_dict, h_dict)
+    sigma_points = filter.propagate_forward(t[1], x0 + dx0, P0)
+    t_loop = time_fcn(lambda : loop_moments(filter, sigma_points, R0))
+    t_matrix = time_fcn(lambda : matrix_moments(filter, sigma_points, R0))
+    print("moments + gain: loop %.1f [us], matrix %.1f [us]" % (t_loop*1E6, t_matrix*1E6))
+
+    R_vec = np.repeat(np.array([R0]), len(t), axis=0)
+    f_args_vec = np.full((len(t), len(f_args)), f_args)
+    UnscentedKalmanFilter(t[0], x0 + dx0, dx0, P0, 1.0, 0.0, 2.0, f_dict, h_dict).run(t[:10], Y[:10,1:], R_vec, f_args_vec, X)
+    filter = UnscentedKalmanFilter(t[0], x0 + dx0, dx0, P0, 1.0, 0.0, 2.0, f_dict, h_dict, logger=FilterLogger(len(x0), len(t)))
+    start_time = timeit.default_timer()
+    filter.run(t, Y[:,1:], R_vec, f_args_vec, X)
+    print("UKF: %.2f [s]" % (timeit.default_timer() - start_time))
+
+if __name__ == "__main__":
+    main()
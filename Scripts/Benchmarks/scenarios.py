@@ -0,0 +1,48 @@
+import numpy as np
+from StatOD.constants import EarthParams
+from StatOD.data import get_measurements
+from StatOD.dynamics import dynamics, f_J2, f_J3, get_Q, process_noise
+from StatOD.measurements import h_rho_rhod, measurements
+
+def get_earth_scenario(model="J2", fraction=5, Q0=None):
+    """Range / range-rate scenario shared by the benchmark scripts.
+
+    Returns t, Y, X_stations_ECI, x0, dx0, P0, R0, f_dict, h_dict.
+    """
+    ep = EarthParams()
+    cart_state = np.array([-3515.4903270335103, 8390.716310243395, 4127.627352553683,
+                           -4.357676322178153, -3.3565791387645487, 3.111892927869902])
+
+    t, Y, X_stations_ECI = get_measurements("Data/Measurements/range_rangerate_w_%s_w_noise.data" % model)
+    M_end = len(t) // fraction
+    t = t[:M_end]
+    Y = Y[:M_end]
+    X_stations_ECI = X_stations_ECI[:M_end]
+
+    dx0 = np.array([0.1, 0.0, 0.0, 1E-4, 0.0, 0.0]) 
+    x0 = cart_state + dx0
+    P0 = np.diag(np.array([1, 1, 1, 1E-3, 1E-3, 1E-3])**2) 
+    R0 = np.diag(np.array([1E-3, 1E-6])**2)
+
+    if model == "J2":
+        f_args = np.array([ep.R, ep.mu, ep.J2])
+        f_fcn = f_J2
+    else:
+        f_args = np.array([ep.R, ep.mu, ep.J2, ep.J3])
+        f_fcn = f_J3
+    f, dfdx = dynamics(x0, f_fcn, f_args)
+
+    Q0 = np.eye(3) * 1e-7 ** 2 if Q0 is None else Q0
+    Q_fcn = process_noise(x0, Q0, get_Q, [], use_numba=False)
+    f_dict = {
+        "f": f,
+        "dfdx": dfdx,
+        "f_args": f_args,
+        "Q_fcn": Q_fcn,
+        "Q": Q0,
+        "Q_args": [],
+    }
+
+    h, dhdx = measurements(x0, h_rho_rhod, X_stations_ECI[0])
+    h_dict = {'h': h, 'dhdx': dhdx, 'h_args': X_stations_ECI[0]}
+    return t, Y, X_stations_ECI, x0, dx0, P0, R0, f_dict, h_dict
@@ -0,0 +1,118 @@
+import hashlib
+import importlib.util
+import inspect
+import os
+import pickle
+import shutil
+import sys
+
+import sympy
+
+import StatOD
+
+# On-disk cache shared by dynamics(), measurements(), and process_noise().
+# Entries are keyed on a hash of the source code of the user supplied
+# model functions and their modules, the StatOD code generating them, and
+# any options that change the generated code, so editing either a model or
+# StatOD automatically invalidates its entries. Each entry holds
+# the pickled sympy expressions and the generated python module that the
+# numba kernels are compiled from (allowing numba's own cache=True).
+
+_cache_dir = None
+
+def set_cache_dir(path):
+    """Set the cache directory (overrides the STATOD_CACHE_DIR env variable).
+    Passing None restores the default."""
+    global _cache_dir
+    _cache_dir = path
+
+def get_cache_dir():
+    if _cache_dir is not None:
+        return _cache_dir
+    default_dir = os.path.dirname(StatOD.__file__) + "/../.cachedir"
+    return os.environ.get("STATOD_CACHE_DIR", default_dir)
+
+def clear_cache(kind=None):
+    """Remove every cache entry, or only those of one kind
+    (e.g. 'dynamics', 'measurements', 'process_noise')"""
+    path = get_cache_dir()
+    if kind is not None:
+        path = os.path.join(path, kind)
+    shutil.rmtree(path, ignore_errors=True)
+
+# Bump when the layout of the cache entries changes
+CACHE_VERSION = 1
+
+def source_hash(obj):
+    try:
+        return hashlib.sha1(inspect.getsource(obj).encode()).hexdigest()
+    except (OSError, TypeError):
+        return getattr(obj, '__qualname__', repr(obj))
+
+def cache_key(*items):
+    # Functions are hashed by their source and that of their module (so
+    # helpers defined next to a model are covered), everything else by
+    # repr. The source of the module generating the code (the caller) and
+    # of this one are part of every key, so changes to the code generation
+    # don't load stale entries.
+    h = hashlib.sha1(f"{CACHE_VERSION} {sympy.__version__}".encode())
+    for module in [sys.modules[__name__], inspect.getmodule(sys._getframe(1))]:
+        h.update(source_hash(module).encode())
+    for item in items:
+        if callable(item):
+            module = inspect.getmodule(item)
+            item = source_hash(item) + (source_hash(module) if module is not None else "")
+        h.update(repr(item).encode())
+    return h.hexdigest()[:16]
+
+def entry_path(kind, name, key, ext):
+    directory = os.path.join(get_cache_dir(), kind)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{name}_{key}.{ext}")
+
+def load_symbolic(kind, name, key):
+    try:
+        with open(entry_path(kind, name, key, "data"), "rb") as f:
+            return pickle.load(f)
+    except Exception:
+        return None
+
+def save_symbolic(kind, name, key, exprs):
+    try:
+        with open(entry_path(kind, name, key, "data"), "wb") as f:
+            pickle.dump(exprs, f)
+    except OSError:
+        pass # read-only cache location, nothing to save
+
+def cached_symbolic(kind, name, key, generate):
+    exprs = load_symbolic(kind, name, key)
+    if exprs is None:
+        exprs = generate()
+        save_symbolic(kind, name, key, exprs)
+    return exprs
+
+def rename_function(source, name):
+    # lambdify always names the generated function _lambdifygenerated
+    def_idx = source.index("def ") + 4
+    paren_idx = source.index("(", def_idx)
+    return source[:def_idx] + name + source[paren_idx:]
+
+def cached_module(kind, name, key, generate, header=""):
+    """Import the generated module for this entry, writing it first using
+    generate() -> source if it isn't cached yet."""
+    path = entry_path(kind, name, key, "py")
+    if not os.path.exists(path):
+        source = header + "\n\n" + generate()
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(source)
+        os.replace(tmp_path, path) # atomic so concurrent processes don't read partial files
+
+    module_name = f"statod_cache_{kind}_{name}_{key}"
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
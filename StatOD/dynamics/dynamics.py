@@ -7,9 +7,11 @@ import sys
 from numba import njit, jit, prange
 import numpy as np
 from sympy import init_printing
+from sympy.printing.numpy import NumPyPrinter
 from StatOD.utils import print_expression
 from StatOD.data import get_earth_position
 import StatOD
+from StatOD.cache import cache_key, cached_module, cached_symbolic, rename_function
 
 import os
 os.environ["NUMBA_CACHE_DIR"] = "./numba_cache_tmp"
@@ -35,7 +37,42 @@ def dfdx(x, f, args):
     dfdx[np.where(dfdx == 1.0)] = 1.0
     return dfdx.tolist()
 
-def dynamics(x, f, args, cse_func=cse, use_numba=True, consider=None):
+def fused_source(x_args, c_args, f_sym, dfdx_sym, name='f_phi'):
+    # Source of a single kernel writing [f, A@phi] into out. One CSE pass
+    # is shared by f and the nonzero entries of A, and the product with phi
+    # only visits the nonzero columns of each row of A.
+    n = len(x_args)
+    A = np.array(dfdx_sym, dtype=object)
+    nonzero = [[j for j in range(n) if A[i,j] != 0] for i in range(n)]
+    exprs = list(f_sym) + [A[i,j] for i in range(n) for j in nonzero[i]]
+    replacements, reduced = cse(exprs, symbols=numbered_symbols('_c'))
+
+    printer = NumPyPrinter({'fully_qualified_modules' : False, 'inline' : True, 'allow_unknown_functions' : True})
+    lines = ["def %s(Z, args, out):" % name]
+    lines += ["    %s = Z[%d]" % (x_args[i], i) for i in range(n)]
+    lines += ["    %s = args[%d]" % (c_args[i], i) for i in range(len(c_args))]
+    lines += ["    %s = %s" % (sym, printer.doprint(expr)) for sym, expr in replacements]
+    lines += ["    out[%d] = %s" % (i, printer.doprint(reduced[i])) for i in range(n)]
+
+    k = n
+    for i in range(n):
+        terms = []
+        for j in nonzero[i]:
+            a_ij = reduced[k]
+            k += 1
+            phi_j = "Z[%d + j]" % (n + j*n)
+            if a_ij == 1:
+                terms.append(phi_j)
+            elif a_ij.is_Atom:
+                terms.append("%s*%s" % (printer.doprint(a_ij), phi_j))
+            else:
+                lines.append("    _a%d_%d = %s" % (i, j, printer.doprint(a_ij)))
+                terms.append("_a%d_%d*%s" % (i, j, phi_j))
+        lines.append("    for j in range(%d):" % n)
+        lines.append("        out[%d + j] = %s" % (n + i*n, " + ".join(terms) if len(terms) > 0 else "0.0"))
+    return "\n".join(lines) + "\n"
+
+def dynamics(x, f, args, cse_func=cse, use_numba=True, consider=None, fused=False, use_cache=True):
     n = len(x) # state
     k = len(args) # non-state arguments
 
@@ -47,20 +84,52 @@ def dynamics(x, f, args, cse_func=cse, use_numba=True, consider=None):
     x_args = np.array(symbols('x:'+str(n))) # state
     c_args = np.array(symbols('arg:'+str(k))) # parameters
 
-    f_sym = f(x_args, c_args)   
-    dfdx_sym = dfdx(x_args, f_sym, c_args)
+    if consider is not None:
+        assert len(consider) == k # ensure that consider variable is of length args
+        consider = np.array(consider).astype(bool)
+        c_arg_subset = c_args[consider]
+        required_args = np.append(x_args, c_args[~consider])
 
-    # Define X, R as the inputs to expression
-    lambdify_f = lambdify([x_args, c_args], f_sym, cse=cse_func, modules='numpy')
-    lambdify_dfdx = lambdify([x_args, f_args, c_args], dfdx_sym, cse=cse_func, modules='numpy')
+    def derive():
+        f_sym = f(x_args, c_args)   
+        dfdx_sym = dfdx(x_args, f_sym, c_args)
+        dfdc_sym = None
+        if consider is not None:
+            dfdc_sym = dfdx(c_arg_subset, f_sym, required_args)
+        return f_sym, dfdx_sym, dfdc_sym
 
-    # return func_f, func_dfdx
-    if use_numba:
-        f_func = numba.njit(lambdify_f, cache=False)
-        dfdx_func = numba.njit(lambdify_dfdx, cache=False)
+    def generate():
+        # Define X, R as the inputs to expression
+        lambdify_f = lambdify([x_args, c_args], f_sym, cse=cse_func, modules='numpy')
+        lambdify_dfdx = lambdify([x_args, f_args, c_args], dfdx_sym, cse=cse_func, modules='numpy')
+        source = [
+            rename_function(inspect.getsource(lambdify_f), 'f'),
+            rename_function(inspect.getsource(lambdify_dfdx), 'dfdx')
+        ]
+        if fused:
+            source.append(fused_source(x_args, c_args, f_sym, dfdx_sym))
+        if consider is not None:
+            lambdify_dfdc = lambdify([c_arg_subset, f_args, required_args], dfdc_sym, cse=cse_func, modules='numpy')
+            source.append(rename_function(inspect.getsource(lambdify_dfdc), 'dfdc'))
+        return "\n\n".join(source)
+
+    # Load or regenerate the symbolic expressions and code
+    header = "from numpy import *"
+    if use_cache:
+        key = cache_key(f, dfdx, fused_source, n, k, consider, fused, getattr(cse_func, '__name__', cse_func))
+        f_sym, dfdx_sym, dfdc_sym = cached_symbolic('dynamics', f.__name__, key, derive)
+        module = cached_module('dynamics', f.__name__, key, generate, header)
+        namespace = module.__dict__
     else:
-        f_func = lambdify_f
-        dfdx_func = lambdify_dfdx
+        f_sym, dfdx_sym, dfdc_sym = derive()
+        namespace = {}
+        exec(header + "\n\n" + generate(), namespace)
+
+    # return func_f, func_dfdx
+    def jit_fcn(fcn):
+        return numba.njit(fcn, cache=use_cache) if use_numba else fcn
+    f_func = jit_fcn(namespace['f'])
+    dfdx_func = jit_fcn(namespace['dfdx'])
 
     x_tmp = np.arange(1,n+1,1) # make values different
     f_tmp = np.arange(2,n+2,1) # to minimize risk of 
@@ -68,22 +137,139 @@ def dynamics(x, f, args, cse_func=cse, use_numba=True, consider=None):
     tmp = f_func(x_tmp, c_tmp)
     tmp = dfdx_func(x_tmp, f_tmp, c_tmp)
 
+    # Single kernel for [f, A@phi] used with dynamics_ivp_fused
+    if fused:
+        f_phi_func = jit_fcn(namespace['f_phi'])
+        Z_tmp = np.append(x_tmp, np.eye(n).reshape((-1))).astype(float)
+        f_phi_func(Z_tmp, c_tmp.astype(float), np.zeros_like(Z_tmp))
+
     # Generate consider dynamics if requested
     if consider is not None:
-        assert len(consider) == k # ensure that consider variable is of length args
-        consider = np.array(consider).astype(bool)
-        c_arg_subset = c_args[consider]
-        required_args = np.append(x_args, c_args[~consider])
-        dfdc_sym = dfdx(c_arg_subset, f_sym, required_args)
-        lambdify_dfdc = lambdify([c_arg_subset, f_args, required_args], dfdc_sym, cse=cse_func, modules='numpy')
-        dfdc_func = numba.njit(lambdify_dfdc, cache=False) if use_numba else lambdify_dfdc
+        dfdc_func = jit_fcn(namespace['dfdc'])
         required_tmp = np.append(x_tmp, c_tmp[~consider])
         tmp = dfdc_func(c_tmp[consider], f_tmp, required_tmp)
+        if fused:
+            return f_func, dfdx_func, dfdc_func, f_phi_func
         return f_func, dfdx_func, dfdc_func
 
+    if fused:
+        return f_func, dfdx_func, f_phi_func
     return f_func, dfdx_func
 
+def stm_jacobian(x, f, args, cse_func=cse, use_numba=True, use_cache=True):
+    """Second derivatives of f and the sparsity pattern of the jacobian of
+    the [x, phi] system integrated by dynamics_ivp, for the implicit
+    solve_ivp methods (f_dict['method'], f_dict['d2fdx2'], f_dict['jac_sparsity']).
+
+    d2fdx2(x, f, args) returns dA/dx as an (N*N, N) array, row i*N + l
+    holding the derivatives of A[i,l].
+    """
+    n = len(x)
+    k = len(args)
+    x_args = np.array(symbols('x:'+str(n)))
+    c_args = np.array(symbols('arg:'+str(k)))
+
+    def derive():
+        f_sym = f(x_args, c_args)
+        A = np.array(dfdx(x_args, f_sym, c_args), dtype=object)
+        dA = dfdx(x_args, A.reshape((-1)).tolist(), c_args)
+        return A.tolist(), dA
+
+    def generate():
+        # Only the nonzero entries are written; returning the nested lists
+        # of lambdify makes numba compile times explode for N**3 entries
+        dA = np.array(dA_sym, dtype=object)
+        nonzero = [(i, j) for i in range(n*n) for j in range(n) if dA[i,j] != 0]
+        replacements, reduced = cse_func([dA[i,j] for i, j in nonzero], symbols=numbered_symbols('_c'))
+        printer = NumPyPrinter({'fully_qualified_modules' : False, 'inline' : True, 'allow_unknown_functions' : True})
+        lines = ["def d2fdx2(X, F, args):"]
+        lines += ["    %s = X[%d]" % (x_args[i], i) for i in range(n)]
+        lines += ["    %s = args[%d]" % (c_args[i], i) for i in range(k)]
+        lines += ["    %s = %s" % (sym, printer.doprint(expr)) for sym, expr in replacements]
+        lines += ["    out = zeros((%d, %d))" % (n*n, n)]
+        lines += ["    out[%d, %d] = %s" % (i, j, printer.doprint(expr)) for (i, j), expr in zip(nonzero, reduced)]
+        lines += ["    return out"]
+        return "\n".join(lines) + "\n"
+
+    header = "from numpy import *"
+    if use_cache:
+        key = cache_key(f, dfdx, stm_jacobian, n, k, getattr(cse_func, '__name__', cse_func))
+        A_sym, dA_sym = cached_symbolic('stm_jacobian', f.__name__, key, derive)
+        namespace = cached_module('stm_jacobian', f.__name__, key, generate, header).__dict__
+    else:
+        A_sym, dA_sym = derive()
+        namespace = {}
+        exec(header + "\n\n" + generate(), namespace)
+
+    d2fdx2_func = numba.njit(namespace['d2fdx2'], cache=use_cache) if use_numba else namespace['d2fdx2']
+    d2fdx2_func(np.arange(1,n+1,1), np.arange(2,n+2,1), np.arange(3,k+3,1))
+
+    # Z = [x, phi]: d(f)/dx = A, d(A phi)/dx_k = dA/dx_k phi, and
+    # d(A phi)[i,j]/d phi[l,j] = A[i,l]
+    A_pattern = np.array(A_sym, dtype=object) != 0
+    dA_pattern = np.array(dA_sym, dtype=object).reshape((n,n,n)) != 0
+    sparsity = np.zeros((n + n**2, n + n**2), dtype=bool)
+    sparsity[:n,:n] = A_pattern
+    for i in range(n):
+        for j in range(n):
+            row = n + i*n + j
+            sparsity[row,:n] = np.any(dA_pattern[i], axis=0)
+            sparsity[row, n + j + n*np.arange(n)] = A_pattern[i]
+    return d2fdx2_func, sparsity
+
+def analytic_states(x, f, args, use_cache=True):
+    """Indices of the states whose rows of A = dfdx don't depend on the
+    state and only couple to each other (e.g. parameters, DMC accelerations,
+    rotating station positions). Their STM block is expm(A_SS dt), so only
+    the remaining rows need integrating (f_dict['analytic_states'], together
+    with f_dict['dfdx_pattern'] from dfdx_pattern())."""
+    n = len(x)
+    k = len(args)
+    x_args = np.array(symbols('x:'+str(n)))
+    c_args = np.array(symbols('arg:'+str(k)))
+
+    def derive():
+        f_sym = f(x_args, c_args)
+        A = np.array(dfdx(x_args, f_sym, c_args), dtype=object)
+        state_symbols = set(x_args)
+        S = [i for i in range(n) if not any(
+            getattr(A[i,j], 'free_symbols', set()) & state_symbols for j in range(n))]
+
+        # drop rows fed by states outside of S until the set is closed
+        closed = False
+        while not closed:
+            closed = True
+            for i in S:
+                if any(A[i,j] != 0 for j in range(n) if j not in S):
+                    S.remove(i)
+                    closed = False
+                    break
+        return S
+
+    if use_cache:
+        key = cache_key(f, dfdx, analytic_states, n, k)
+        return cached_symbolic('analytic_states', f.__name__, key, derive)
+    return derive()
+
+
+def dfdx_pattern(x, f, args, use_cache=True):
+    """Symbolic nonzero pattern of A = dfdx as an (N, N) bool array. Used
+    with analytic_states to split the STM into blocks (f_dict['dfdx_pattern'],
+    see stm_blocks()); unlike A at a given state it doesn't miss entries
+    that happen to vanish there."""
+    n = len(x)
+    k = len(args)
+    x_args = np.array(symbols('x:'+str(n)))
+    c_args = np.array(symbols('arg:'+str(k)))
+
+    def derive():
+        f_sym = f(x_args, c_args)
+        return np.array(dfdx(x_args, f_sym, c_args), dtype=object) != 0
 
+    if use_cache:
+        key = cache_key(f, dfdx, dfdx_pattern, n, k)
+        return cached_symbolic('dfdx_pattern', f.__name__, key, derive)
+    return derive()
 
 
 # if __name__ == "__main__":
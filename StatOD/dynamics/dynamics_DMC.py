@@ -1,5 +1,6 @@
 from sympy import *
 import numpy as np
+from StatOD.gravity import model_acceleration, model_dadx
 
 def get_Q_DMC(dt, x, Q, DCM, args):
     N = len(x)
@@ -55,18 +56,19 @@ def get_Q_DMC(dt, x, Q, DCM, args):
 
 # DMC with dynamics
 def f_PINN_DMC(x, args):
-    X_sc_ECI = x[0:6]
-    w_vec = x[6:]
+    # x is a state or a (K, N) block of states (f_dict['batch'])
+    X_sc_ECI = x[...,0:6]
+    w_vec = x[...,6:]
 
     model = args[0]
     X_body_ECI = args[1:-1].astype(float)
     tau = float(args[-1])
 
-    x_pos = (X_sc_ECI[0:3] - X_body_ECI[0:3]) # either km or [-]
-    x_vel = (X_sc_ECI[3:6] - X_body_ECI[3:6])
+    x_pos = (X_sc_ECI[...,0:3] - X_body_ECI[0:3]) # either km or [-]
+    x_vel = (X_sc_ECI[...,3:6] - X_body_ECI[3:6])
 
     # scaling occurs within the gravity model 
-    x_acc_m = model.generate_acceleration(x_pos).reshape((-1,))
+    x_acc_m = model_acceleration(model, x_pos).reshape(x_pos.shape)
 
     x_acc = x_acc_m + w_vec
     
@@ -83,7 +85,7 @@ def dfdx_PINN_DMC(x, f, args):
     
     x_pos = X_sc_ECI[0:3] - X_body_ECI[0:3]# either km or [-]
 
-    dfdx_acc_m = model.generate_dadx(x_pos).reshape((3,3)) #[(m/s^2) / m] = [1/s^2]
+    dfdx_acc_m = model_dadx(model, x_pos).reshape((3,3)) #[(m/s^2) / m] = [1/s^2]
 
     dfdx_vel = np.eye(3)
     zero_3x3 = np.zeros((3,3))
@@ -120,7 +122,7 @@ def get_Q_PINN_DMC(dt, x, Q, DCM, args):
     A[0:3, 3:6] = np.eye(3)    # velocities
 
     # acceleration is DMC + gravity
-    A[3:6,0:3] = model.generate_dadx(x[0:3])
+    A[3:6,0:3] = model_dadx(model, x[0:3])
     A[3:6,6:9] = np.eye(3)
 
     # DMC dynamics
@@ -146,17 +148,18 @@ def get_DMC_first_order(tau=120):
 
 # DMC without dynamics
 def f_PINN_DMC_zero_order(x, args):
-    X_sc_ECI = x[0:6]
-    w_vec = x[6:]
+    # x is a state or a (K, N) block of states (f_dict['batch'])
+    X_sc_ECI = x[...,0:6]
+    w_vec = x[...,6:]
 
     model = args[0]
     X_body_ECI = args[1:].astype(float)
 
-    x_pos = (X_sc_ECI[0:3] - X_body_ECI[0:3]) # either km or [-]
-    x_vel = (X_sc_ECI[3:6] - X_body_ECI[3:6])
+    x_pos = (X_sc_ECI[...,0:3] - X_body_ECI[0:3]) # either km or [-]
+    x_vel = (X_sc_ECI[...,3:6] - X_body_ECI[3:6])
 
     # scaling occurs within the gravity model 
-    x_acc_m = model.generate_acceleration(x_pos).reshape((-1,))
+    x_acc_m = model_acceleration(model, x_pos).reshape(x_pos.shape)
 
     x_acc = x_acc_m + w_vec
     
@@ -172,7 +175,7 @@ def dfdx_PINN_DMC_zero_order(x, f, args):
     
     x_pos = X_sc_ECI[0:3] - X_body_ECI[0:3]# either km or [-]
 
-    dfdx_acc_m = model.generate_dadx(x_pos).reshape((3,3)) #[(m/s^2) / m] = [1/s^2]
+    dfdx_acc_m = model_dadx(model, x_pos).reshape((3,3)) #[(m/s^2) / m] = [1/s^2]
 
     dfdx_vel = np.eye(3)
     zero_3x3 = np.zeros((3,3))
@@ -253,7 +256,7 @@ def get_Q_DMC_zero_order_model(dt, x, Q, DCM, args):
     A[4,7] = 1
     A[5,8] = 1
 
-    A[3:6,0:3] = model.generate_dadx(x[0:3])
+    A[3:6,0:3] = model_dadx(model, x[0:3])
 
     phi = np.eye(N) + A*dt
     # phi = exp(A*dt)
@@ -1,7 +1,8 @@
 from sympy import *
 import numpy as np
+from StatOD.gravity import model_acceleration, model_dadx
 
-from Scripts.AsteroidScenarios.helper_functions import compute_BN
+from StatOD.rotations import compute_BN
 
 def get_Q_DMC(dt, x, Q, DCM, args):
     N = len(x)
@@ -68,7 +69,7 @@ def f_rot_PINN_DMC_zero_order(x, args):
     x_vel = (X_sc_ECI[3:6] - X_body_ECI[3:6])
 
     # scaling occurs within the gravity model 
-    x_acc_m = model.generate_acceleration(x_pos).reshape((-1,))
+    x_acc_m = model_acceleration(model, x_pos).reshape((-1,))
 
     x, y, z = x_pos
     x_d, y_d, z_d = x_vel
@@ -92,7 +93,7 @@ def dfdx_rot_PINN_DMC_zero_order(x, f, args):
     
     x_pos = X_sc_ECI[0:3] - X_body_ECI[0:3]# either km or [-]
 
-    f_x = model.generate_dadx(x_pos).reshape((3,3)) #[(m/s^2) / m] = [1/s^2]
+    f_x = model_dadx(model, x_pos).reshape((3,3)) #[(m/s^2) / m] = [1/s^2]
 
     f_x_rotation = np.zeros((3,3))
     f_x_rotation[0,0] = -omega**2
@@ -146,7 +147,7 @@ def f_rot_N_PINN_DMC_zero_order(x, args):
     # scaling occurs within the gravity model 
     BN = compute_BN(t, omega).squeeze()
     x_pos_B = BN@x_pos
-    x_acc_m_B = model.generate_acceleration(x_pos_B).reshape((-1,))
+    x_acc_m_B = model_acceleration(model, x_pos_B).reshape((-1,))
     x_acc_m = BN.T@x_acc_m_B 
 
 
@@ -171,7 +172,7 @@ def dfdx_rot_N_PINN_DMC_zero_order(x, f, args):
     x_pos = X_sc_ECI[0:3] - X_body_ECI[0:3]# either km or [-]
     BN = compute_BN(t, omega).squeeze()
     x_pos_B = BN@x_pos
-    f_x_B = model.generate_dadx(x_pos_B).reshape((3,3)) #[(m/s^2) / m] = [1/s^2]
+    f_x_B = model_dadx(model, x_pos_B).reshape((3,3)) #[(m/s^2) / m] = [1/s^2]
     f_x = BN.T@f_x_B@BN 
 
 
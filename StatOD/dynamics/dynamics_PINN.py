@@ -1,18 +1,20 @@
 import numpy as np
+from StatOD.gravity import model_acceleration, model_dadx
 #################
 # PINN Dynamics #
 #################
 
 def f_PINN(x, args):
+    # x is a state or a (K, N) block of states (f_dict['batch'])
     X_sc_ECI = x
     model = args[0]
     X_body_ECI = args[1:].astype(float)
-    x_pos_km = (X_sc_ECI[0:3] - X_body_ECI[0:3])
-    x_vel_km = (X_sc_ECI[3:6] - X_body_ECI[3:6])
+    x_pos_km = (X_sc_ECI[...,0:3] - X_body_ECI[0:3])
+    x_vel_km = (X_sc_ECI[...,3:6] - X_body_ECI[3:6])
 
     # gravity model requires meters so convert km -> m
     x_pos_m = x_pos_km*1E3
-    x_acc_m = model.generate_acceleration(x_pos_m).reshape((-1,))
+    x_acc_m = model_acceleration(model, x_pos_m).reshape(x_pos_m.shape)
 
     #convert acceleration to km/s^2
     x_acc_km = x_acc_m/1E3
@@ -28,7 +30,7 @@ def dfdx_PINN(x, f, args):
     x_pos_km = X_sc_ECI[0:3] - X_body_ECI[0:3]
     x_pos_m = x_pos_km*1E3
 
-    dfdx_acc_m = model.generate_dadx(x_pos_m).reshape((3,3)) #[(m/s^2) / m] = [1/s^2]
+    dfdx_acc_m = model_dadx(model, x_pos_m).reshape((3,3)) #[(m/s^2) / m] = [1/s^2]
 
     dfdx_vel = np.eye(3)
     zero_3x3 = np.zeros((3,3))
@@ -1,5 +1,6 @@
 import numpy as np
 from numba import njit, prange
+from scipy.linalg import expm
 
 @njit(cache=False)
 def dynamics_ivp(t, Z, f, dfdx, f_args):
@@ -7,8 +8,8 @@ def dynamics_ivp(t, Z, f, dfdx, f_args):
     X_inst = Z[0:N]
     phi_inst = Z[N:].reshape((N,N))
 
-    f_inst = np.array(f(X_inst, f_args)).reshape((N))
-    dfdx_inst = np.array(dfdx(X_inst, f_inst, f_args)).reshape((N,N))
+    f_inst = np.asarray(f(X_inst, f_args)).reshape((N))
+    dfdx_inst = np.asarray(dfdx(X_inst, f_inst, f_args)).reshape((N,N))
 
     phi_dot = dfdx_inst@phi_inst
     Zd = np.hstack((f_inst, phi_dot.reshape((-1))))
@@ -20,13 +21,129 @@ def dynamics_ivp_no_jit(t, Z, f, dfdx, f_args):
     X_inst = Z[0:N]
     phi_inst = Z[N:].reshape((N,N))
 
-    f_inst = np.array(f(X_inst, f_args)).reshape((N))
-    dfdx_inst = np.array(dfdx(X_inst, f_inst, f_args)).reshape((N,N))
+    f_inst = np.asarray(f(X_inst, f_args)).reshape((N))
+    dfdx_inst = np.asarray(dfdx(X_inst, f_inst, f_args)).reshape((N,N))
 
     phi_dot = dfdx_inst@phi_inst
     Zd = np.hstack((f_inst, phi_dot.reshape((-1))))
     return Zd
 
+@njit(cache=False)
+def dynamics_ivp_fused(t, Z, f, f_phi, f_args):
+    # f_phi is the fused [f, A@phi] kernel from dynamics(..., fused=True)
+    Zd = np.empty_like(Z)
+    f_phi(Z, f_args, Zd)
+    return Zd
+
+@njit(cache=False)
+def dynamics_ivp_jacobian(t, Z, f, dfdx, d2fdx2, f_args):
+    # Jacobian of dynamics_ivp w.r.t. Z = [x, phi] (see stm_jacobian())
+    N = int(1/2 * (np.sqrt(4*len(Z) + 1) - 1))
+    X_inst = Z[0:N]
+    phi_inst = Z[N:].reshape((N,N))
+
+    f_inst = np.asarray(f(X_inst, f_args)).reshape((N))
+    A = np.asarray(dfdx(X_inst, f_inst, f_args)).reshape((N,N))
+    dA = np.asarray(d2fdx2(X_inst, f_inst, f_args)).reshape((N,N,N))
+
+    J = np.zeros((len(Z), len(Z)))
+    J[0:N,0:N] = A
+    for i in range(N):
+        for l in range(N):
+            a = A[i,l]
+            for j in range(N):
+                row = N + i*N + j
+                J[row, N + l*N + j] = a
+                for k in range(N):
+                    J[row, k] += dA[i,l,k]*phi_inst[l,j]
+    return J
+
+def stm_blocks(pattern, S):
+    # Split the state for block STM propagation given the analytic states S
+    # (A_SD = 0, A_SS constant, see analytic_states()) and the nonzero
+    # pattern of A = dfdx (see dfdx_pattern()). Starting from phi = I,
+    # phi_SD stays 0 and phi_SS = expm(A_SS dt) so only the rows of the
+    # other states D are integrated, together with the rows of phi_SS that
+    # feed them (C). Analytic states with a zero row in A (E, e.g.
+    # parameters) keep a constant identity row.
+    N = len(pattern)
+    S = np.asarray(S, dtype=np.int64)
+    D = np.setdiff1d(np.arange(N), S)
+    pattern = np.asarray(pattern, dtype=bool)
+    coupled = [j for j in S if np.any(pattern[D,j])]
+    closed = False
+    while not closed:
+        closed = True
+        for j in list(coupled):
+            for k in S:
+                if pattern[j,k] and k not in coupled:
+                    coupled.append(k)
+                    closed = False
+    E = np.array([j for j in S if j in coupled and not np.any(pattern[j])], dtype=np.int64)
+    C = np.array([j for j in S if j in coupled and np.any(pattern[j])], dtype=np.int64)
+    return D, S, C, E
+
+def make_dynamics_ivp_blocks(D, S, C, E):
+    # Z = [x, phi_D (rows D, all columns), phi_C (rows C, columns S)]
+    n_D = len(D)
+    n_S = len(S)
+    n_C = len(C)
+    n_E = len(E)
+    N = n_D + n_S
+    E_pos = np.searchsorted(S, E)
+
+    @njit(cache=False)
+    def dynamics_ivp_blocks(t, Z, f, dfdx, f_args):
+        X_inst = Z[0:N]
+        phi_D = Z[N:N + n_D*N].reshape((n_D,N))
+        phi_C = Z[N + n_D*N:].reshape((n_C,n_S))
+
+        f_inst = np.asarray(f(X_inst, f_args)).reshape((N))
+        A = np.asarray(dfdx(X_inst, f_inst, f_args)).reshape((N,N))
+
+        # products only visit the nonzero entries of A
+        Zd = np.zeros_like(Z)
+        Zd[0:N] = f_inst
+        phi_D_dot = Zd[N:N + n_D*N].reshape((n_D,N))
+        phi_C_dot = Zd[N + n_D*N:].reshape((n_C,n_S))
+        for i in range(n_D):
+            for k in range(n_D):
+                a = A[D[i],D[k]]
+                if a != 0.0:
+                    for j in range(N):
+                        phi_D_dot[i,j] += a*phi_D[k,j]
+            for c in range(n_C):
+                a = A[D[i],C[c]]
+                if a != 0.0:
+                    for s in range(n_S):
+                        phi_D_dot[i,S[s]] += a*phi_C[c,s]
+            for e in range(n_E):
+                phi_D_dot[i,E[e]] += A[D[i],E[e]]
+        for c in range(n_C):
+            for k in range(n_C):
+                a = A[C[c],C[k]]
+                if a != 0.0:
+                    for s in range(n_S):
+                        phi_C_dot[c,s] += a*phi_C[k,s]
+            for e in range(n_E):
+                phi_C_dot[c,E_pos[e]] += A[C[c],E[e]]
+        return Zd
+
+    return dynamics_ivp_blocks
+
+def blocks_initial_state(x, D, S, C):
+    N = len(x)
+    return np.hstack((x, np.eye(N)[D].reshape((-1)), np.eye(len(S))[np.searchsorted(S, C)].reshape((-1))))
+
+def blocks_stm(Z, A_SS, dt, D, S):
+    # Assemble phi(t, t_0) from the rows integrated by dynamics_ivp_blocks,
+    # with the analytic block in closed form
+    N = len(D) + len(S)
+    phi = np.zeros((N,N))
+    phi[D] = Z[N:N + len(D)*N].reshape((len(D),N))
+    phi[np.ix_(S,S)] = expm(A_SS*dt)
+    return phi
+
 @njit(cache=False)
 def consider_dynamics_ivp(t, Z, f, dfdx, dfdc, args, N, M, consider_mask):
     X_inst = Z[0:N]
@@ -36,9 +153,9 @@ def consider_dynamics_ivp(t, Z, f, dfdx, dfdc, args, N, M, consider_mask):
 
     required_args = np.append(X_inst, args[~consider_mask])
 
-    f_inst = np.array(f(X_inst, args)).reshape((N))
-    dfdx_inst = np.array(dfdx(X_inst, f_inst, args)).reshape((N,N))
-    dfdc_inst = np.array(dfdc(C_inst, f_inst, required_args)).reshape((N,M))
+    f_inst = np.asarray(f(X_inst, args)).reshape((N))
+    dfdx_inst = np.asarray(dfdx(X_inst, f_inst, args)).reshape((N,N))
+    dfdc_inst = np.asarray(dfdc(C_inst, f_inst, required_args)).reshape((N,M))
 
     phi_dot = dfdx_inst@phi_inst
     theta_dot = dfdx_inst@theta_inst + dfdc_inst
@@ -53,10 +170,15 @@ def dynamics_ivp_unscented(t, Z, f, dfdx, f_args):
     Zd = np.zeros((L,))
     for k in range(2*N+1):
         X_inst = sigma_points[k]
-        f_inst = np.array(f(X_inst, f_args)).reshape((N))
+        f_inst = np.asarray(f(X_inst, f_args)).reshape((N))
         Zd[k*N:(k+1)*N] = f_inst
     return Zd
 
+def dynamics_ivp_unscented_batch(t, Z, f, dfdx, f_args):
+    # f takes all 2N+1 sigma points as one (2N+1, N) block (f_dict['batch'])
+    L = len(Z)
+    N = int(1/4.*(np.sqrt(8*L + 1 ) -1))
+    return np.asarray(f(Z.reshape((2*N + 1, N)), f_args)).reshape((-1))
 
 def dynamics_ivp_unscented_no_jit(t, Z, f, dfdx, f_args):
     L = len(Z)
@@ -65,10 +187,57 @@ def dynamics_ivp_unscented_no_jit(t, Z, f, dfdx, f_args):
     Zd = np.zeros((L,))
     for k in range(2*N+1):
         X_inst = sigma_points[k]
-        f_inst = np.array(f(X_inst, f_args)).reshape((N))
+        f_inst = np.asarray(f(X_inst, f_args)).reshape((N))
         Zd[k*N:(k+1)*N] = f_inst
     return Zd
 
+@njit(cache=False, parallel=True)
+def dynamics_ivp_batch(t, Z, f, dfdx, f_args):
+    # K independent [x, phi] blocks stacked end to end, with
+    # one row of f_args per block
+    K = len(f_args)
+    L = len(Z) // K
+    N = int(1/2 * (np.sqrt(4*L + 1) - 1))
+    Z_k = Z.reshape((K, L))
+    Zd = np.zeros_like(Z_k)
+    for k in prange(K):
+        X_inst = Z_k[k, 0:N]
+        phi_inst = Z_k[k, N:].reshape((N,N))
+
+        f_inst = np.asarray(f(X_inst, f_args[k])).reshape((N))
+        dfdx_inst = np.asarray(dfdx(X_inst, f_inst, f_args[k])).reshape((N,N))
+
+        Zd[k, 0:N] = f_inst
+        Zd[k, N:] = (dfdx_inst@phi_inst).reshape((-1))
+    return Zd.reshape((-1))
+
+def dynamics_ivp_batch_no_jit(t, Z, f, dfdx, f_args):
+    K = len(f_args)
+    L = len(Z) // K
+    N = int(1/2 * (np.sqrt(4*L + 1) - 1))
+    Z_k = Z.reshape((K, L))
+    Zd = np.zeros_like(Z_k)
+    for k in range(K):
+        X_inst = Z_k[k, 0:N]
+        phi_inst = Z_k[k, N:].reshape((N,N))
+
+        f_inst = np.asarray(f(X_inst, f_args[k])).reshape((N))
+        dfdx_inst = np.asarray(dfdx(X_inst, f_inst, f_args[k])).reshape((N,N))
+
+        Zd[k, 0:N] = f_inst
+        Zd[k, N:] = (dfdx_inst@phi_inst).reshape((-1))
+    return Zd.reshape((-1))
+
+@njit(cache=False, parallel=True)
+def dynamics_ivp_batch_fused(t, Z, f, f_phi, f_args):
+    K = len(f_args)
+    L = len(Z) // K
+    Z_k = Z.reshape((K, L))
+    Zd = np.empty_like(Z_k)
+    for k in prange(K):
+        f_phi(Z_k[k], f_args[k], Zd[k])
+    return Zd.reshape((-1))
+
 @njit(cache=False, parallel=True)
 def dynamics_ivp_particle(t, Z, f, N, f_args):
     X_inst = Z.reshape((N,-1))
@@ -77,6 +246,10 @@ def dynamics_ivp_particle(t, Z, f, N, f_args):
         Zd[i] = f(X_inst[i], f_args)
     return Zd.reshape(-1)
 
+def dynamics_ivp_particle_batch(t, Z, f, N, f_args):
+    # f takes the N particles as one (N, n) block (f_dict['batch'])
+    return np.asarray(f(Z.reshape((N,-1)), f_args)).reshape((-1))
+
 
 from StatOD.data import get_earth_position
 
@@ -89,8 +262,8 @@ def dynamics_ivp_proj2(t, z, f_fcn, dfdx_fcn, f_args):
 
     r_E = get_earth_position(J0 + t/(24*3600))
     f_args[0:3] = r_E
-    f = np.array(f_fcn(x, f_args)).reshape((N,))
-    dfdx = np.array(dfdx_fcn(x, f, f_args)).reshape((N,N))
+    f = np.asarray(f_fcn(x, f_args)).reshape((N,))
+    dfdx = np.asarray(dfdx_fcn(x, f, f_args)).reshape((N,N))
     
     phi_dot = dfdx@phi
     z_dot = np.hstack((f, phi_dot.reshape((-1))))
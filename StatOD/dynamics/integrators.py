@@ -0,0 +1,301 @@
+import numpy as np
+from numba import njit
+
+# Compiled Runge-Kutta kernels which keep the whole [x, phi] propagation
+# inside numba. The right hand side must follow the dynamics_ivp signature
+# fun(t, Z, f, dfdx, f_args). Step size control mirrors scipy's RK45/DOP853
+# so results agree with solve_ivp to within the requested tolerances.
+
+EPS = np.finfo(float).eps
+SAFETY = 0.9
+MIN_FACTOR = 0.2
+MAX_FACTOR = 10.0
+
+# Butcher tableaux of the Dormand-Prince pairs, as in scipy's RK45 and
+# DOP853 (only the stages taking a step, no dense output)
+RK45_C = np.array([0, 1/5, 3/10, 4/5, 8/9, 1])
+RK45_A = np.array([
+    [0, 0, 0, 0, 0],
+    [1/5, 0, 0, 0, 0],
+    [3/40, 9/40, 0, 0, 0],
+    [44/45, -56/15, 32/9, 0, 0],
+    [19372/6561, -25360/2187, 64448/6561, -212/729, 0],
+    [9017/3168, -355/33, 46732/5247, 49/176, -5103/18656]
+])
+RK45_B = np.array([35/384, 0, 500/1113, 125/192, -2187/6784, 11/84])
+RK45_E = np.array([-71/57600, 0, 71/16695, -71/1920, 17253/339200, -22/525,
+                   1/40])
+
+DOP853_N = 12
+DOP853_C = np.array([0.0,
+                     0.526001519587677318785587544488e-01,
+                     0.789002279381515978178381316732e-01,
+                     0.118350341907227396726757197510,
+                     0.281649658092772603273242802490,
+                     0.333333333333333333333333333333,
+                     0.25,
+                     0.307692307692307692307692307692,
+                     0.651282051282051282051282051282,
+                     0.6,
+                     0.857142857142857142857142857142,
+                     1.0])
+
+DOP853_A = np.zeros((DOP853_N, DOP853_N))
+DOP853_A[1, 0] = 5.26001519587677318785587544488e-2
+
+DOP853_A[2, 0] = 1.97250569845378994544595329183e-2
+DOP853_A[2, 1] = 5.91751709536136983633785987549e-2
+
+DOP853_A[3, 0] = 2.95875854768068491816892993775e-2
+DOP853_A[3, 2] = 8.87627564304205475450678981324e-2
+
+DOP853_A[4, 0] = 2.41365134159266685502369798665e-1
+DOP853_A[4, 2] = -8.84549479328286085344864962717e-1
+DOP853_A[4, 3] = 9.24834003261792003115737966543e-1
+
+DOP853_A[5, 0] = 3.7037037037037037037037037037e-2
+DOP853_A[5, 3] = 1.70828608729473871279604482173e-1
+DOP853_A[5, 4] = 1.25467687566822425016691814123e-1
+
+DOP853_A[6, 0] = 3.7109375e-2
+DOP853_A[6, 3] = 1.70252211019544039314978060272e-1
+DOP853_A[6, 4] = 6.02165389804559606850219397283e-2
+DOP853_A[6, 5] = -1.7578125e-2
+
+DOP853_A[7, 0] = 3.70920001185047927108779319836e-2
+DOP853_A[7, 3] = 1.70383925712239993810214054705e-1
+DOP853_A[7, 4] = 1.07262030446373284651809199168e-1
+DOP853_A[7, 5] = -1.53194377486244017527936158236e-2
+DOP853_A[7, 6] = 8.27378916381402288758473766002e-3
+
+DOP853_A[8, 0] = 6.24110958716075717114429577812e-1
+DOP853_A[8, 3] = -3.36089262944694129406857109825
+DOP853_A[8, 4] = -8.68219346841726006818189891453e-1
+DOP853_A[8, 5] = 2.75920996994467083049415600797e1
+DOP853_A[8, 6] = 2.01540675504778934086186788979e1
+DOP853_A[8, 7] = -4.34898841810699588477366255144e1
+
+DOP853_A[9, 0] = 4.77662536438264365890433908527e-1
+DOP853_A[9, 3] = -2.48811461997166764192642586468
+DOP853_A[9, 4] = -5.90290826836842996371446475743e-1
+DOP853_A[9, 5] = 2.12300514481811942347288949897e1
+DOP853_A[9, 6] = 1.52792336328824235832596922938e1
+DOP853_A[9, 7] = -3.32882109689848629194453265587e1
+DOP853_A[9, 8] = -2.03312017085086261358222928593e-2
+
+DOP853_A[10, 0] = -9.3714243008598732571704021658e-1
+DOP853_A[10, 3] = 5.18637242884406370830023853209
+DOP853_A[10, 4] = 1.09143734899672957818500254654
+DOP853_A[10, 5] = -8.14978701074692612513997267357
+DOP853_A[10, 6] = -1.85200656599969598641566180701e1
+DOP853_A[10, 7] = 2.27394870993505042818970056734e1
+DOP853_A[10, 8] = 2.49360555267965238987089396762
+DOP853_A[10, 9] = -3.0467644718982195003823669022
+
+DOP853_A[11, 0] = 2.27331014751653820792359768449
+DOP853_A[11, 3] = -1.05344954667372501984066689879e1
+DOP853_A[11, 4] = -2.00087205822486249909675718444
+DOP853_A[11, 5] = -1.79589318631187989172765950534e1
+DOP853_A[11, 6] = 2.79488845294199600508499808837e1
+DOP853_A[11, 7] = -2.85899827713502369474065508674
+DOP853_A[11, 8] = -8.87285693353062954433549289258
+DOP853_A[11, 9] = 1.23605671757943030647266201528e1
+DOP853_A[11, 10] = 6.43392746015763530355970484046e-1
+
+DOP853_B = np.zeros(DOP853_N)
+DOP853_B[0] = 5.42937341165687622380535766363e-2
+DOP853_B[5] = 4.45031289275240888144113950566
+DOP853_B[6] = 1.89151789931450038304281599044
+DOP853_B[7] = -5.8012039600105847814672114227
+DOP853_B[8] = 3.1116436695781989440891606237e-1
+DOP853_B[9] = -1.52160949662516078556178806805e-1
+DOP853_B[10] = 2.01365400804030348374776537501e-1
+DOP853_B[11] = 4.47106157277725905176885569043e-2
+
+DOP853_E3 = np.zeros(DOP853_N + 1)
+DOP853_E3[:-1] = DOP853_B
+DOP853_E3[0] -= 0.244094488188976377952755905512
+DOP853_E3[8] -= 0.733846688281611857341361741547
+DOP853_E3[11] -= 0.220588235294117647058823529412e-1
+
+DOP853_E5 = np.zeros(DOP853_N + 1)
+DOP853_E5[0] = 0.1312004499419488073250102996e-1
+DOP853_E5[5] = -0.1225156446376204440720569753e+1
+DOP853_E5[6] = -0.4957589496572501915214079952
+DOP853_E5[7] = 0.1664377182454986536961530415e+1
+DOP853_E5[8] = -0.3503288487499736816886487290
+DOP853_E5[9] = 0.3341791187130174790297318841
+DOP853_E5[10] = 0.8192320648511571246570742613e-1
+DOP853_E5[11] = -0.2235530786388629525884427845e-1
+
+
+@njit(cache=False)
+def rms_norm(x):
+    return np.sqrt(np.sum(x**2) / x.size)
+
+@njit(cache=False)
+def select_initial_step(fun, t0, y0, f0, direction, order, rtol, atol, f, dfdx, f_args):
+    if y0.size == 0:
+        return np.inf
+    scale = atol + np.abs(y0) * rtol
+    d0 = rms_norm(y0 / scale)
+    d1 = rms_norm(f0 / scale)
+    if d0 < 1e-5 or d1 < 1e-5:
+        h0 = 1e-6
+    else:
+        h0 = 0.01 * d0 / d1
+
+    y1 = y0 + h0 * direction * f0
+    f1 = fun(t0 + h0 * direction, y1, f, dfdx, f_args)
+    d2 = rms_norm((f1 - f0) / scale) / h0
+
+    if d1 <= 1e-15 and d2 <= 1e-15:
+        h1 = max(1e-6, h0 * 1e-3)
+    else:
+        h1 = (0.01 / max(d1, d2)) ** (1 / (order + 1))
+    return min(100 * h0, h1)
+
+@njit(cache=False)
+def rk_stages(fun, t, y, f0, h, A, C, K, f, dfdx, f_args):
+    K[0] = f0
+    for s in range(1, len(C)):
+        dy = np.zeros_like(y)
+        for j in range(s):
+            dy += A[s, j] * K[j]
+        K[s] = fun(t + C[s] * h, y + h * dy, f, dfdx, f_args)
+
+@njit(cache=False)
+def rk_adaptive(fun, t_eval, y0, f, dfdx, f_args, rtol, atol, A, B, C, E3, E5, error_order):
+    # Integrates from t_eval[0] and returns the state at every entry of t_eval
+    # and the number of rhs evaluations. E3 is only used for DOP853 (all
+    # zeros selects the RK45 error estimate).
+    n_stages = len(C)
+    n = len(y0)
+    rtol = max(rtol, 100 * EPS)
+    exponent = -1.0 / (error_order + 1)
+    use_E3 = np.any(E3 != 0.0)
+
+    Y = np.zeros((len(t_eval), n))
+    Y[0] = y0
+    K = np.zeros((n_stages + 1, n))
+
+    t = t_eval[0]
+    y = y0.copy()
+    if len(t_eval) == 1:
+        return Y, 0
+    direction = 1.0 if t_eval[-1] >= t else -1.0
+    f0 = fun(t, y, f, dfdx, f_args)
+    h_abs = select_initial_step(fun, t, y, f0, direction, error_order, rtol, atol, f, dfdx, f_args)
+    nfev = 2
+
+    for i in range(1, len(t_eval)):
+        t_bound = t_eval[i]
+        while direction * (t_bound - t) > 0:
+            min_step = 10 * np.abs(np.nextafter(t, direction * np.inf) - t)
+            if h_abs < min_step:
+                h_abs = min_step
+
+            step_rejected = False
+            while True:
+                h = h_abs * direction
+                t_new = t + h
+                if direction * (t_new - t_bound) > 0:
+                    t_new = t_bound
+                h = t_new - t
+                h_abs = np.abs(h)
+
+                rk_stages(fun, t, y, f0, h, A, C, K, f, dfdx, f_args)
+                y_new = y + h * (B @ K[:n_stages])
+                f_new = fun(t_new, y_new, f, dfdx, f_args)
+                K[n_stages] = f_new
+                nfev += n_stages
+
+                scale = atol + np.maximum(np.abs(y), np.abs(y_new)) * rtol
+                if use_E3:
+                    err5 = (E5 @ K) / scale
+                    err3 = (E3 @ K) / scale
+                    err5_norm_2 = np.sum(err5**2)
+                    err3_norm_2 = np.sum(err3**2)
+                    if err5_norm_2 == 0 and err3_norm_2 == 0:
+                        error_norm = 0.0
+                    else:
+                        denom = err5_norm_2 + 0.01 * err3_norm_2
+                        error_norm = h_abs * err5_norm_2 / np.sqrt(denom * n)
+                else:
+                    error_norm = rms_norm((E5 @ K) * h / scale)
+
+                if error_norm < 1:
+                    if error_norm == 0:
+                        factor = MAX_FACTOR
+                    else:
+                        factor = min(MAX_FACTOR, SAFETY * error_norm ** exponent)
+                    if step_rejected:
+                        factor = min(1.0, factor)
+                    h_abs *= factor
+                    break
+                else:
+                    h_abs *= max(MIN_FACTOR, SAFETY * error_norm ** exponent)
+                    step_rejected = True
+                    if h_abs < min_step:
+                        raise ValueError("Required step size is less than spacing between numbers.")
+
+            t = t_new
+            y = y_new
+            f0 = f_new
+        Y[i] = y
+    return Y, nfev
+
+@njit(cache=False)
+def rk4(fun, t_eval, y0, f, dfdx, f_args, h_max):
+    # Classical fixed step RK4; each interval of t_eval is split into
+    # equal steps no larger than h_max.
+    Y = np.zeros((len(t_eval), len(y0)))
+    nfev = 0
+    Y[0] = y0
+    y = y0.copy()
+    for i in range(1, len(t_eval)):
+        dt = t_eval[i] - t_eval[i-1]
+        steps = max(1, int(np.ceil(np.abs(dt) / h_max)))
+        h = dt / steps
+        t = t_eval[i-1]
+        for _ in range(steps):
+            k1 = fun(t, y, f, dfdx, f_args)
+            k2 = fun(t + h/2, y + h/2*k1, f, dfdx, f_args)
+            k3 = fun(t + h/2, y + h/2*k2, f, dfdx, f_args)
+            k4 = fun(t + h, y + h*k3, f, dfdx, f_args)
+            y = y + h/6*(k1 + 2*k2 + 2*k3 + k4)
+            t += h
+        nfev += 4*steps
+        Y[i] = y
+    return Y, nfev
+
+@njit(cache=False)
+def rk45(fun, t_eval, y0, f, dfdx, f_args, rtol, atol):
+    return rk_adaptive(fun, t_eval, y0, f, dfdx, f_args, rtol, atol,
+                       RK45_A, RK45_B, RK45_C, np.zeros_like(RK45_E), RK45_E, 4)
+
+@njit(cache=False)
+def dop853(fun, t_eval, y0, f, dfdx, f_args, rtol, atol):
+    return rk_adaptive(fun, t_eval, y0, f, dfdx, f_args, rtol, atol,
+                       DOP853_A, DOP853_B, DOP853_C, DOP853_E3, DOP853_E5, 7)
+
+
+def integrate_ivp(fun, t_eval, y0, args, method='RK45', rtol=1E-3, atol=1E-6, h_max=10.0):
+    """Propagate y0 through t_eval with one of the compiled kernels.
+
+    method is one of 'RK4', 'RK45', or 'DOP853'. Returns an array of
+    shape (n, len(t_eval)) laid out like solve_ivp's sol.y and the
+    number of rhs evaluations
+    """
+    t_eval = np.asarray(t_eval, dtype=np.float64)
+    y0 = np.asarray(y0, dtype=np.float64)
+    f, dfdx, f_args = args
+    if method == 'RK4':
+        Y, nfev = rk4(fun, t_eval, y0, f, dfdx, f_args, h_max)
+    elif method == 'RK45':
+        Y, nfev = rk45(fun, t_eval, y0, f, dfdx, f_args, rtol, atol)
+    elif method == 'DOP853':
+        Y, nfev = dop853(fun, t_eval, y0, f, dfdx, f_args, rtol, atol)
+    else:
+        raise ValueError("Unknown integrator: %s" % method)
+    return Y.T, nfev
@@ -6,7 +6,8 @@ import StatOD
 import pickle
 import inspect
 import os
-def process_noise(x, Q, Q_fcn, args, cse_func=cse, use_numba=True):
+from StatOD.cache import cache_key, cached_module, cached_symbolic, rename_function
+def process_noise(x, Q, Q_fcn, args, cse_func=cse, use_numba=True, use_cache=True):
     n = len(x) # state
     m = len(Q)
     k = len(args)
@@ -18,32 +19,28 @@ def process_noise(x, Q, Q_fcn, args, cse_func=cse, use_numba=True):
     DCM_args = MatrixSymbol("DCM", m, m)
     misc_args = np.array(symbols('arg:'+str(k)), dtype=np.object)
 
-    # Load or rerun the symbolic expressions
-    fcn_name = f"{Q_fcn.__name__}_{m}" 
-    dir_name = os.path.dirname(StatOD.__file__) + "/.."
-    try:
-        # Look for a cached version of the sympy function 
-        os.makedirs(f"{dir_name}/.cachedir/process_noise/", exist_ok=True)
-        with open(f"{dir_name}/.cachedir/process_noise/{fcn_name}.data", "rb") as f:
-            Q_fcn_loaded_src = pickle.load(f)
-            Q_sym_loaded = pickle.load(f)
-
-        # Check that the code of the original function hasn't changed
-        if inspect.getsource(Q_fcn) == Q_fcn_loaded_src:
-            Q_sym = Q_sym_loaded
-        else:
-            raise ValueError()
-    except:
-        # If the code has changed, or there wasn't a cached symbolic expression, (re)generate one.
-        Q_sym = Q_fcn(dt, x_args, Q_args, DCM_args, misc_args)
-        with open(f"{dir_name}/.cachedir/process_noise/{fcn_name}.data", "wb") as f:
-            pickle.dump(inspect.getsource(Q_fcn), f)
-            pickle.dump(Q_sym, f)
-
-    lambdify_Q = lambdify([dt, x_args, Q_args, DCM_args, misc_args], Q_sym, cse=cse_func, modules='numpy')
+    def derive():
+        return Q_fcn(dt, x_args, Q_args, DCM_args, misc_args)
+
+    def generate():
+        lambdify_Q = lambdify([dt, x_args, Q_args, DCM_args, misc_args], Q_sym, cse=cse_func, modules='numpy')
+        return rename_function(inspect.getsource(lambdify_Q), 'Q')
+
+    # Load or rerun the symbolic expressions and code
+    header = "from numpy import *"
+    if use_cache:
+        fcn_name = f"{Q_fcn.__name__}_{m}" 
+        key = cache_key(Q_fcn, n, m, k, getattr(cse_func, '__name__', cse_func))
+        Q_sym = cached_symbolic('process_noise', fcn_name, key, derive)
+        lambdify_Q = cached_module('process_noise', fcn_name, key, generate, header).Q
+    else:
+        Q_sym = derive()
+        namespace = {}
+        exec(header + "\n\n" + generate(), namespace)
+        lambdify_Q = namespace['Q']
 
     if use_numba:
-        Q_func = numba.njit(lambdify_Q, cache=False) # can't cache file b/c it exists within an .egg directory
+        Q_func = numba.njit(lambdify_Q, cache=use_cache)
     else:
         Q_func = lambdify_Q
 
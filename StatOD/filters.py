@@ -1,13 +1,24 @@
 import numpy as np
 from scipy.integrate import solve_ivp
+from scipy.linalg import block_diag, qr, solve_triangular
+from scipy.optimize import OptimizeResult
+from scipy.sparse import csc_matrix
+from scipy.special import logsumexp
 from StatOD.dynamics import *
+from StatOD.dynamics.integrators import integrate_ivp
+from StatOD.linalg import (batch_kalman_gain, bierman_update, cholesky_solve,
+                           cholesky_sqrt, cholupdate, joseph_update, kalman_gain,
+                           sequential_update, spd_solve, tria, ud_factor,
+                           ud_pack, ud_time_update, ud_unpack, whiten)
 from StatOD.rotations import no_rotation
 from numba import njit, jit, prange
 import time
 import copy
 from abc import ABC, abstractmethod
 
-from StatOD.utils import ProgressBar, get_jac_sparsity_matrix
+from StatOD.utils import ProgressBar
+
+IMPLICIT_METHODS = ['Radau', 'BDF', 'LSODA']
 
 @njit(cache=True)
 def numba_inv(A):
@@ -26,8 +37,21 @@ def invert(A):
         A_inv = numba_inv(A)
     return A_inv
 
+def stack_columns(values, K):
+    """(K, ...) array of a lambdified function evaluated on the columns of a
+    (N, K) state matrix. The function returns (nested lists of) (K,) arrays,
+    with scalars for the entries that don't depend on the state."""
+    def broadcast(v):
+        if isinstance(v, (list, tuple)) or np.ndim(v) > 1:
+            return [broadcast(u) for u in v]
+        return np.broadcast_to(v, (K,))
+    values = np.array(broadcast(values), dtype=np.float64)
+    # rows contiguous like a loop over the states, so reductions over them
+    # (e.g. the sigma point moments) round off the same either way
+    return np.ascontiguousarray(np.moveaxis(values, -1, 0))
+
 class FilterLogger():
-    def __init__(self, N, samples, M=None, state_labels=None):
+    def __init__(self, N, samples, M=None, state_labels=None, K=None):
 
         self.state_labels = state_labels
 
@@ -38,89 +62,95 @@ class FilterLogger():
         self.i = np.zeros((samples,))
         self.t_i = np.zeros((samples,))
 
+        # Number of filters run in lockstep (None for a single filter)
+        # in which case every array gains a leading (K,) dimension
+        self.K = K
+        S = (samples,) if K is None else (K, samples)
+
         # Current Reference (?)
-        self.x_i = np.zeros((samples, N))
-        self.c_i = np.zeros((samples, N))
+        self.x_i = np.zeros(S + (N,))
+        self.c_i = np.zeros(S + (N,))
         
         # Current Deviation from State Reference
-        self.dx_i_minus = np.zeros((samples, N,))
-        self.dx_i_plus = np.zeros((samples, N,))
+        self.dx_i_minus = np.zeros(S + (N,))
+        self.dx_i_plus = np.zeros(S + (N,))
 
         # Covariance
-        self.P_i_minus = np.zeros((samples, N, N))
-        self.P_i_plus = np.zeros((samples, N, N))
+        self.P_i_minus = np.zeros(S + (N, N))
+        self.P_i_plus = np.zeros(S + (N, N))
 
         # Current Best Estimate
-        self.x_hat_i_minus = np.zeros((samples, N))
-        self.x_hat_i_plus = np.zeros((samples, N))
+        self.x_hat_i_minus = np.zeros(S + (N,))
+        self.x_hat_i_plus = np.zeros(S + (N,))
 
         # Current Best Estimate (w/ consider parameters)
-        self.x_hat_c_i_minus = np.zeros((samples, N))
-        self.x_hat_c_i_plus = np.zeros((samples, N))
+        self.x_hat_c_i_minus = np.zeros(S + (N,))
+        self.x_hat_c_i_plus = np.zeros(S + (N,))
 
         # State Transition Matrices 
-        self.phi_ti_ti_m1 = np.zeros((samples, N, N))
-        self.phi_ti_t0 = np.zeros((samples, N, N))
+        self.phi_ti_ti_m1 = np.zeros(S + (N, N))
+        self.phi_ti_t0 = np.zeros(S + (N, N))
 
-        self.sigma_i = np.zeros((samples, N))
+        self.sigma_i = np.zeros(S + (N,))
 
         self.M = M # consider parameters
 
         if self.M is not None:
             # Current Deviation from State Reference (using consider parameters)
-            self.dx_c_i_minus = np.zeros((samples, N,))
-            self.dx_c_i_plus = np.zeros((samples, N,))
+            self.dx_c_i_minus = np.zeros(S + (N,))
+            self.dx_c_i_plus = np.zeros(S + (N,))
 
-            self.P_c_i_minus = np.zeros((samples, N+M, N+M))
-            self.P_c_i_plus = np.zeros((samples, N+M, N+M))
+            self.P_c_i_minus = np.zeros(S + (N+M, N+M))
+            self.P_c_i_plus = np.zeros(S + (N+M, N+M))
             
-            self.theta_ti_ti_m1 = np.zeros((samples, N, M))
-            self.theta_ti_t0 = np.zeros((samples, N, M))
+            self.theta_ti_ti_m1 = np.zeros(S + (N, M))
+            self.theta_ti_t0 = np.zeros(S + (N, M))
 
     def log(self, data):
         empty_vec = np.full((self.N), np.nan)
         empty_mat = np.full((self.N, self.N), np.nan)
 
         idx = data.get('i', 0) - 1
+        loc = idx if self.K is None else (slice(None), idx)
 
         self.i[idx] = data.get('i', np.nan)
         self.t_i[idx] = data.get('t_i', np.nan)
 
         # Current Reference (?)
-        self.x_i[idx] = data.get('x_i', empty_vec)
+        self.x_i[loc] = data.get('x_i', empty_vec)
         
         # Current Deviation from State Reference
-        self.dx_i_minus[idx] = data.get('dx_i_minus', empty_vec)
-        self.dx_i_plus[idx] = data.get('dx_i_plus', empty_vec)
+        self.dx_i_minus[loc] = data.get('dx_i_minus', empty_vec)
+        self.dx_i_plus[loc] = data.get('dx_i_plus', empty_vec)
 
         # Covariance
-        self.P_i_minus[idx] = data.get('P_i_minus', empty_mat)
-        self.P_i_plus[idx] = data.get('P_i_plus', empty_mat)
+        self.P_i_minus[loc] = data.get('P_i_minus', empty_mat)
+        self.P_i_plus[loc] = data.get('P_i_plus', empty_mat)
         
         # Current Best Estimate
-        self.x_hat_i_minus[idx] = data.get('x_hat_i_minus', empty_vec)
-        self.x_hat_i_plus[idx] = data.get('x_hat_i_plus', empty_vec)
+        self.x_hat_i_minus[loc] = data.get('x_hat_i_minus', empty_vec)
+        self.x_hat_i_plus[loc] = data.get('x_hat_i_plus', empty_vec)
 
         # State Transition Matrices 
-        self.phi_ti_ti_m1[idx] = data.get('phi_ti_ti_m1', empty_mat)
-        self.phi_ti_t0[idx] = data.get('phi_ti_t0', empty_mat)
+        self.phi_ti_ti_m1[loc] = data.get('phi_ti_ti_m1', empty_mat)
+        self.phi_ti_t0[loc] = data.get('phi_ti_t0', empty_mat)
 
-        self.sigma_i[idx] = data.get('sigma_i', empty_vec)
+        self.sigma_i[loc] = data.get('sigma_i', empty_vec)
 
         if self.M is not None:        
-            self.dx_c_i_minus[idx] = data.get('dx_c_i_minus', empty_vec)
-            self.dx_c_i_plus[idx] = data.get('dx_c_i_plus', empty_vec)
+            self.dx_c_i_minus[loc] = data.get('dx_c_i_minus', empty_vec)
+            self.dx_c_i_plus[loc] = data.get('dx_c_i_plus', empty_vec)
 
-            self.x_hat_c_i_minus[idx] = data.get('x_hat_c_i_minus', empty_vec)
-            self.x_hat_c_i_plus[idx] = data.get('x_hat_c_i_plus', empty_vec)
+            self.x_hat_c_i_minus[loc] = data.get('x_hat_c_i_minus', empty_vec)
+            self.x_hat_c_i_plus[loc] = data.get('x_hat_c_i_plus', empty_vec)
 
-            self.P_c_i_minus[idx] = data.get('P_c_i_minus', empty_mat)
-            self.P_c_i_plus[idx] = data.get('P_c_i_plus', empty_mat)
+            self.P_c_i_minus[loc] = data.get('P_c_i_minus', empty_mat)
+            self.P_c_i_plus[loc] = data.get('P_c_i_plus', empty_mat)
 
             empty_mat = np.full((self.N, self.M), np.nan)
 
-            self.theta_ti_ti_m1[idx] = data.get('theta_ti_ti_m1', empty_mat)
-            self.theta_ti_t0[idx] = data.get('theta_ti_t0', empty_mat)
+            self.theta_ti_ti_m1[loc] = data.get('theta_ti_ti_m1', empty_mat)
+            self.theta_ti_t0[loc] = data.get('theta_ti_t0', empty_mat)
 
     def save(self, name=None):
         save_path = os.path.dirname(StatOD.__file__) + "/../Data/FilterLogs"
@@ -133,8 +163,7 @@ class FilterLogger():
 
     def clear(self):
         samples = len(self.i)
-        N = len(self.x_i[0])
-        self.__init__(N, samples)
+        self.__init__(self.N, samples, self.M, self.state_labels, self.K)
 
 class FilterBase(ABC):
     def __init__(self, f_dict, h_dict, logger, events):
@@ -145,18 +174,66 @@ class FilterBase(ABC):
         self.dfdx = f_dict['dfdx']
         self.f_args = f_dict['f_args']
         self.f_integrate = f_dict.get('f_integrate', dynamics_ivp)
-
+        self.dfdx_integrate = self.dfdx
+
+        # f also accepts a (K, N) block of states and returns (K, N), so the
+        # UKF sigma points / particles are evaluated in one call
+        self.batch = f_dict.get('batch', False)
+
+        # fused [f, A@phi] kernel from dynamics(..., fused=True)
+        self.f_phi = f_dict.get('f_phi', None)
+        if self.f_phi is not None and 'f_integrate' not in f_dict:
+            self.f_integrate = dynamics_ivp_fused
+            self.dfdx_integrate = self.f_phi
+        self.integrator = f_dict.get('integrator', None) # 'RK4', 'RK45', 'DOP853', or None for solve_ivp
+
+        # states with a closed form STM block (see analytic_states()),
+        # split using the symbolic pattern of dfdx (see dfdx_pattern())
+        self.analytic_states = f_dict.get('analytic_states', None)
+        self.dfdx_pattern = f_dict.get('dfdx_pattern', None)
+        if self.analytic_states is not None and self.dfdx_pattern is None:
+            raise ValueError("f_dict['analytic_states'] requires f_dict['dfdx_pattern'] (see dfdx_pattern())")
+        self.stm_blocks = None
+        self.f_blocks = None
+
+        # epochs of the next measurement gap to propagate in one go (see run())
+        self.merged_t_eval = None
+        self.merged_propagation = {}
+        self.integrator_step = f_dict.get('integrator_step', 10.0) # max step for RK4
+
+        # solve_ivp method override; the implicit methods use the analytic
+        # jacobian of [x, phi] if d2fdx2 is given, else its sparsity pattern.
+        # Both are opt-in: the filter only holds the compiled f / dfdx, so
+        # they have to be derived from the symbolic model with stm_jacobian()
+        # and passed in f_dict, otherwise solve_ivp falls back to dense
+        # finite difference jacobians.
+        self.method = f_dict.get('method', None)
+        self.d2fdx2 = f_dict.get('d2fdx2', None)
+        self.jac_sparsity = f_dict.get('jac_sparsity', None)
 
         self.Q_dt_fcn = f_dict.get('Q_fcn', None)
         self.Q_0 = f_dict.get('Q', None)
         self.Q_args = f_dict.get('Q_args', [])
         self.Q_DCM = f_dict.get('Q_DCM', no_rotation)
         self.Q_dt = f_dict.get('Q_dt', 60)
+        # Q_fcn / Q_DCM also accept a (K, N) block of states, see
+        # evaluate_process_noise()
+        self.Q_vectorized = f_dict.get('Q_vectorized', False)
 
         self.h = h_dict['h']
         self.dhdx = h_dict['dhdx']
         self.h_args = h_dict['h_args']
 
+        # process the observations one at a time (KF / EKF): False,
+        # 'joseph' (or True), or 'conventional'
+        self.sequential = h_dict.get('sequential', False)
+
+        # h / dhdx also accept the columns of a (N, K) state matrix (e.g. the
+        # lambdified measurements(), not numba or DiracDelta models), so
+        # sigma points / particles / trials are evaluated in one call, see
+        # evaluate_h()
+        self.h_vectorized = h_dict.get('vectorized', False)
+
         if hasattr(events, 'terminal'):
             self.terminate_upon_event = getattr(events, 'terminal')
         else:
@@ -169,32 +246,165 @@ class FilterBase(ABC):
         self.atol = 1E-14
         self.rtol = 2.23E-14
 
-        self.jac_sparsity = get_jac_sparsity_matrix()
-
         pass
 
+    def integrate(self, fun, t_span, y0, args, t_eval=None, **kwargs):
+        # The compiled kernels require a numba rhs with the dynamics_ivp
+        # signature and don't support events, otherwise defer to solve_ivp
+        if self.method is not None:
+            kwargs['method'] = self.method
+        if kwargs.get('method', 'RK45') not in IMPLICIT_METHODS:
+            kwargs.pop('jac', None)
+            kwargs.pop('jac_sparsity', None)
+        if self.integrator is None or \
+            self.method is not None or \
+            kwargs.get('events', None) is not None or \
+            not hasattr(fun, 'py_func') or \
+            len(args) != 3:
+            return solve_ivp(fun, t_span, y0, args=args, t_eval=t_eval, atol=self.atol, rtol=self.rtol, **kwargs)
+
+        t = np.array(t_span, dtype=float) if t_eval is None else np.array(t_eval, dtype=float)
+        prepend = t[0] != t_span[0]
+        if prepend:
+            t = np.hstack(([t_span[0]], t))
+        y, nfev = integrate_ivp(fun, t, y0, args, 
+                          method=self.integrator, 
+                          rtol=self.rtol, 
+                          atol=self.atol, 
+                          h_max=self.integrator_step)
+        if prepend:
+            t, y = t[1:], y[:,1:]
+        return OptimizeResult(t=t, y=y, sol=None, t_events=None, y_events=None,
+                              nfev=nfev, njev=0, nlu=0, status=0,
+                              message="The solver successfully reached the end of the integration interval.",
+                              success=True)
+
+    def stm_jacobian_kwargs(self):
+        # jac / jac_sparsity for the [x, phi] system of dynamics_ivp
+        if self.method not in IMPLICIT_METHODS:
+            return {}
+        if self.d2fdx2 is not None:
+            f, dfdx, d2fdx2 = self.f, self.dfdx, self.d2fdx2
+            # Radau / BDF factorize a sparse jacobian with splu, LSODA is dense only
+            sparse = csc_matrix if self.method != 'LSODA' else np.asarray
+            return {"jac" : lambda t, Z, *args : sparse(dynamics_ivp_jacobian(t, Z, f, dfdx, d2fdx2, self.f_args))}
+        if self.jac_sparsity is not None and self.method != 'LSODA':
+            return {"jac_sparsity" : self.jac_sparsity}
+        return {}
+
+    def integrate_stm(self, t_eval, x_i_m1, phi_i_m1, **kwargs):
+        # Integrate [x, phi] from t_i_m1 through t_eval, returns the states
+        # (K, N), the STMs (K, N, N), and sol. A single epoch is taken from
+        # the end of the integration, several from the dense output.
+        # With analytic_states only the remaining rows of phi are integrated
+        # and the analytic blocks are filled in with expm.
+        N = len(x_i_m1)
+        t_span = [self.t_i_m1, t_eval[-1]]
+        if len(t_eval) == 1:
+            t_eval = None
+        if self.analytic_states is None:
+            Z_i_m1 = np.hstack((x_i_m1, phi_i_m1.reshape((-1))))
+            kwargs.update(self.stm_jacobian_kwargs())
+            sol = self.integrate(self.f_integrate, t_span, Z_i_m1, 
+                                 args=(self.f, self.dfdx_integrate, self.f_args), t_eval=t_eval, **kwargs)
+            Y = sol.y if t_eval is not None else sol.y[:,-1:]
+            return Y[:N].T, Y[N:].T.reshape((-1,N,N)), sol
+
+        if self.f_blocks is None:
+            self.stm_blocks = stm_blocks(self.dfdx_pattern, self.analytic_states)
+            self.f_blocks = make_dynamics_ivp_blocks(*self.stm_blocks)
+        D, S, C, E = self.stm_blocks
+        Z_i_m1 = blocks_initial_state(x_i_m1, D, S, C)
+        sol = self.integrate(self.f_blocks, t_span, Z_i_m1, 
+                             args=(self.f, self.dfdx, self.f_args), t_eval=t_eval, **kwargs)
+        Y = sol.y if t_eval is not None else sol.y[:,-1:]
+        t = sol.t if t_eval is not None else sol.t[-1:]
+        X = Y[:N].T
+        phis = np.zeros((len(X),N,N))
+        for k in range(len(X)):
+            A = np.array(self.dfdx(X[k], np.array(self.f(X[k], self.f_args)), self.f_args))
+            phis[k] = blocks_stm(Y[:,k], A[np.ix_(S,S)], t[k] - self.t_i_m1, D, S)@phi_i_m1
+        return X, phis, sol
+
+    def propagate_stm(self, t_i, x_i_m1, phi_i_m1, **kwargs):
+        # Integrate [x, phi] from t_i_m1 to t_i, returns x_i, phi_i, sol.
+        # Epochs of a merged measurement gap (see run()) are served from
+        # one integration across the whole gap.
+        if self.merged_t_eval is not None and t_i == self.merged_t_eval[0]:
+            self.merge_propagation(np.unique(self.merged_t_eval), x_i_m1, **kwargs)
+            self.merged_t_eval = None
+        merged = self.merged_propagation.pop(t_i, None)
+        if merged is not None and np.array_equal(merged[0], x_i_m1):
+            x_i, phi_i, sol = merged[1:]
+            return x_i, phi_i@phi_i_m1, sol
+        self.merged_propagation = {} # the trajectory changed, e.g. an event
+
+        X, phis, sol = self.integrate_stm([t_i], x_i_m1, phi_i_m1, **kwargs)
+        return X[-1], phis[-1], sol
+
+    def merge_propagation(self, t_eval, x_i_m1, **kwargs):
+        # phi(t_k, t_k-1) between the epochs of t_eval from the STMs
+        # relative to the start of the integration
+        N = len(x_i_m1)
+        X, phis, sol = self.integrate_stm(t_eval, x_i_m1, np.eye(N), **kwargs)
+        self.merged_propagation = {}
+        x_k_m1 = x_i_m1
+        phi_k_m1 = np.eye(N)
+        for k in range(len(t_eval)):
+            phi_k = np.linalg.solve(phi_k_m1.T, phis[k].T).T
+            self.merged_propagation[t_eval[k]] = (x_k_m1, X[k], phi_k, sol)
+            x_k_m1 = X[k]
+            phi_k_m1 = phis[k]
+
+    def process_noise_steps(self, t_i):
+        # Q is accumulated over sub-steps of at most Q_dt (1 minute by default)
+        dt = t_i - self.t_i_m1
+        if self.Q_dt_fcn is None or dt == 0:
+            return []
+        if dt > self.Q_dt:
+            return np.diff(np.append(np.arange(0, dt, step=self.Q_dt), dt))
+        return [dt]
+
     def get_process_noise(self, t_i, x_i):
         N = x_i.shape[-1]
+        Q_i_i_m1 = np.zeros((N,N))
+        for dt in self.process_noise_steps(t_i):
+            Q_i_i_m1 += np.array(self.Q_dt_fcn(dt, x_i, self.Q_0, self.Q_DCM(x_i), self.Q_args))
+        return Q_i_i_m1
 
-        if self.Q_dt_fcn == None:
-            Q_i_i_m1 = np.zeros((N,N))
-        else:
-            dt = t_i - self.t_i_m1
-            if dt == 0:
-                Q_i_i_m1 = np.zeros((N,N))
-            else:
-                dt = t_i - self.t_i_m1
-                Q_i_i_m1 = np.zeros((N,N))
-                if dt > self.Q_dt: # 1 minutes by default
-                    tk_list = np.arange(0, dt, step=self.Q_dt) 
-                    tk_list = np.append(tk_list, dt)
-                    for k in range(1,len(tk_list)):
-                        dt = tk_list[k] - tk_list[k-1]
-                        Q_i_i_m1 += np.array(self.Q_dt_fcn(dt, x_i, self.Q_0, self.Q_DCM(x_i), self.Q_args))
-                else:   
-                    Q_i_i_m1 = np.array(self.Q_dt_fcn(dt, x_i, self.Q_0, self.Q_DCM(x_i), self.Q_args))
+    def evaluate_process_noise(self, t_i, X):
+        # Q at every row of X as a (K, N, N) array. With f_dict['Q_vectorized']
+        # Q_DCM returns a (K, 3, 3) block and Q_fcn is called on the columns
+        # of X.T with a (3, 3, K) DCM, once per sub-step for all rows.
+        if not self.Q_vectorized:
+            return np.array([self.get_process_noise(t_i, x) for x in X])
+        K, N = X.shape
+        Q_i_i_m1 = np.zeros((K,N,N))
+        dt_list = self.process_noise_steps(t_i)
+        if len(dt_list) > 0:
+            DCM = np.moveaxis(np.asarray(self.Q_DCM(X), dtype=np.float64), (-2,-1), (0,1))
+        for dt in dt_list:
+            Q_i_i_m1 += stack_columns(self.Q_dt_fcn(dt, X.T, self.Q_0, DCM, self.Q_args), K)
         return Q_i_i_m1
 
+    def evaluate_h(self, X, h_args=None):
+        # h at every row of X as a (K, M) array, e.g. sigma points or
+        # particles. With h_dict['vectorized'] h is called once on the
+        # columns of X.T. h_args defaults to self.h_args, columns of a (P, K)
+        # h_args are the arguments of each row.
+        h_args = self.h_args if h_args is None else h_args
+        if self.h_vectorized:
+            return stack_columns(self.h(X.T, h_args), len(X))
+        return np.array([np.array(self.h(x, h_args), dtype=np.float64).reshape((-1)) for x in X])
+
+    def evaluate_dhdx(self, X, h, h_args=None):
+        # dhdx at every row of X and h (from evaluate_h()) as a (K, M, N)
+        # array, see evaluate_h()
+        h_args = self.h_args if h_args is None else h_args
+        if self.h_vectorized:
+            return stack_columns(self.dhdx(X.T, h.T, h_args), len(X))
+        return np.array([np.array(self.dhdx(X[k], h[k], h_args), dtype=np.float64).reshape((len(h[k]),-1)) for k in range(len(X))])
+
     def predict_measurement(self, x_i, dx_i, h_args):
         h_i = np.array(self.h(x_i, h_args))
         H_i = np.array(self.dhdx(x_i, h_i, h_args))
@@ -215,6 +425,33 @@ class FilterBase(ABC):
             if self.terminate_upon_event:
                 t_i = sol.t_events[0] # overwrite the current time step 
 
+    def find_gaps(self, t_vec, y_vec, f_arg_vec):
+        # Runs of measurement free epochs (e.g. the NaN rows padded in by
+        # get_measurements) with constant f_args, mapped from the first
+        # index of the run to the first epoch with a measurement after it.
+        # The propagation across each run is done by one integration.
+        gaps = {}
+        if self.events is not None:
+            return gaps
+        empty = np.array([np.any(np.isnan(y_i)) for y_i in y_vec])
+        i = 0
+        while i < len(t_vec):
+            if not empty[i]:
+                i += 1
+                continue
+            j = i
+            while j + 1 < len(t_vec) and empty[j+1]:
+                j += 1
+            end = min(j + 1, len(t_vec) - 1)
+            try:
+                constant = np.all(np.array(f_arg_vec[i:end+1]) == np.array(f_arg_vec[i]))
+            except Exception:
+                constant = False # e.g. callable args
+            if end > i and constant:
+                gaps[i] = end
+            i = j + 1
+        return gaps
+
     @abstractmethod
     def propagate_forward(self):
         # take t_i_m1 to t_i
@@ -241,9 +478,54 @@ class FilterBase(ABC):
         pass
 
     
-    def run(self, t_vec, y_vec, R_vec, f_arg_vec, h_arg_vec, h_args_append=None):
+    def stacked_measurements(self, sizes):
+        # h / dhdx of several observations at one epoch, each evaluated with
+        # its own row of h_args and stacked into one measurement
+        h, dhdx = self.h, self.dhdx
+        splits = np.cumsum(sizes)[:-1]
+        def h_stacked(x, h_args):
+            return np.hstack([np.array(h(x, args)).reshape((-1)) for args in h_args])
+        def dhdx_stacked(x, h_i, h_args):
+            h_rows = np.split(np.asarray(h_i).reshape((-1)), splits)
+            return np.vstack([np.atleast_2d(np.array(dhdx(x, h_k, args))) for h_k, args in zip(h_rows, h_args)])
+        return h_stacked, dhdx_stacked
+
+    def update_stacked(self, t_i, y_rows, R_rows, f_args, h_args_rows):
+        # One propagation and one measurement update with the observations
+        # of an epoch stacked (block diagonal R). Rows without measurements
+        # are dropped.
+        valid = [k for k in range(len(y_rows)) if not np.any(np.isnan(y_rows[k]))]
+        if len(valid) < 2:
+            k = valid[0] if len(valid) == 1 else 0
+            return self.update(t_i, y_rows[k], R_rows[k], f_args, h_args_rows[k])
+
+        y_i = np.hstack([np.reshape(y_rows[k], (-1)) for k in valid])
+        R_i = block_diag(*[np.atleast_2d(R_rows[k]) for k in valid])
+        h, dhdx = self.h, self.dhdx
+        self.h, self.dhdx = self.stacked_measurements([np.size(y_rows[k]) for k in valid])
+        try:
+            fail = self.update(t_i, y_i, R_i, f_args, [h_args_rows[k] for k in valid])
+        finally:
+            self.h, self.dhdx = h, dhdx
+        return fail
+
+    def run(self, t_vec, y_vec, R_vec, f_arg_vec, h_arg_vec, h_args_append=None, merge_gaps=False, stack_measurements=False):
+        # merge_gaps: integrate across runs of measurement free epochs at
+        # once (see find_gaps). The step STMs are recovered from the STM of
+        # the whole run, which loses a little precision, so it's opt-in.
+        # stack_measurements: rows sharing an epoch (e.g. several stations)
+        # are processed as one measurement, every row is still logged
         pbar = ProgressBar(len(t_vec)-1, enable=True)
-        for i in range(len(t_vec)):
+        if merge_gaps:
+            gaps = self.find_gaps(t_vec, y_vec, f_arg_vec)
+        i = 0
+        while i < len(t_vec):
+            j = i + 1
+            if stack_measurements:
+                while j < len(t_vec) and t_vec[j] == t_vec[i]:
+                    j += 1
+            if merge_gaps and i in gaps:
+                self.merged_t_eval = t_vec[i:gaps[i]+1]
             t_i = t_vec[i]
             y_i = y_vec[i]
             R_i = R_vec[i]
@@ -254,8 +536,17 @@ class FilterBase(ABC):
             if h_args_append is not None:
                 h_args_i = np.append(h_args_i, h_args_append)
 
-            fail = self.update(t_i, y_i, R_i, f_args_i, h_args_i)
-            pbar.update(i)
+            if j - i == 1:
+                fail = self.update(t_i, y_i, R_i, f_args_i, h_args_i)
+            else:
+                h_args_rows = [h_arg_vec[k] if h_args_append is None else np.append(h_arg_vec[k], h_args_append) for k in range(i, j)]
+                fail = self.update_stacked(t_i, y_vec[i:j], R_vec[i:j], f_args_i, h_args_rows)
+                for k in range(i+1, j):
+                    self.i += 1
+                    if self.logger is not None:
+                        self.logger.log(self.get_logger_dict())
+            pbar.update(j-1)
+            i = j
         pbar.close()
 
 class KalmanFilter(FilterBase):
@@ -279,19 +570,9 @@ class KalmanFilter(FilterBase):
         if t_i == self.t_i_m1:
             # return x_hat_i_m1_plus, phi_i_m1
             return copy.deepcopy(x_i_m1), copy.deepcopy(phi_i_m1)
-        N = len(x_i_m1)
-        Z_i_m1 = np.hstack((x_i_m1, phi_i_m1.reshape((-1))))
-        sol = solve_ivp(self.f_integrate, 
-                        [self.t_i_m1, t_i], 
-                        Z_i_m1, 
-                        args=(self.f, self.dfdx, self.f_args), 
-                        atol=self.atol,
-                        rtol=self.rtol, 
-                        method='RK45',
-                        events=self.events,
-                        jac_sparsity=self.jac_sparsity)
-        x_i = sol.y[:N,-1]
-        phi_i = sol.y[N:,-1].reshape((N,N))
+        x_i, phi_i, sol = self.propagate_stm(t_i, x_i_m1, phi_i_m1, 
+                                             method='RK45',
+                                             events=self.events)
         self.gather_event_data(t_i,sol)
         return x_i, phi_i
 
@@ -304,13 +585,14 @@ class KalmanFilter(FilterBase):
         h_i = np.array(self.h(x_i, self.h_args))
         H_i = np.array(self.dhdx(x_i, h_i, self.h_args))
         r_i = y_i - h_i 
-        K_i = P_i_minus@H_i.T@invert(H_i@P_i_minus@H_i.T + R_i)
+        K_i = None if self.sequential else kalman_gain(P_i_minus, H_i, R_i)
         return r_i, H_i, K_i
 
     def measurement_update(self, dx_i_minus, P_i_minus, K_i, H_i, R_i, r_i):
+        if self.sequential:
+            return sequential_update(dx_i_minus, P_i_minus, H_i, R_i, r_i, self.sequential != 'conventional')
         dx_i_plus = dx_i_minus + K_i@(r_i - H_i@dx_i_minus)
-        G = np.eye(len(K_i)) - K_i@H_i
-        P_i_plus = G@P_i_minus@G.T + K_i@R_i@K_i.T
+        P_i_plus = joseph_update(P_i_minus, K_i, H_i, R_i)
         return dx_i_plus, P_i_plus
 
     def get_logger_dict(self):
@@ -372,6 +654,44 @@ class KalmanFilter(FilterBase):
             self.logger.log(data) 
         return fail
 
+class UDKalmanFilter(KalmanFilter):
+    """Conventional Kalman filter (same interface and logger output as
+    KalmanFilter) with P stored as U diag(D) U^T. The time update is
+    Thornton's MWGS, the measurement update Bierman's scalar updates, which
+    keeps P symmetric positive semi-definite at close to the cost of the
+    conventional filter.
+
+    P_i_m1_minus / P_i_m1_plus hold the factors packed into one matrix (see
+    ud_pack), the logger receives P."""
+    def __init__(self, t0, x0, dx0, P0, f_dict, h_dict, logger=None, events=None):
+        super().__init__(t0, x0, dx0, P0, f_dict, h_dict, logger, events)
+        self.P_i_m1_plus = ud_pack(*ud_factor(np.asarray(P0, dtype=np.float64)))
+
+        # Bierman's update processes one observation at a time, so no gain
+        # is formed in process_observations
+        self.sequential = True
+
+    def time_update(self, dx_i_m1_plus, UD_i_m1_plus, phi_i, Q_i_i_m1):
+        dx_i_minus = phi_i@dx_i_m1_plus
+        U_Q, D_Q = ud_factor(np.asarray(Q_i_i_m1, dtype=np.float64))
+        U_i_minus, D_i_minus = ud_time_update(*ud_unpack(UD_i_m1_plus), np.asarray(phi_i, dtype=np.float64), U_Q, D_Q)
+        return dx_i_minus, ud_pack(U_i_minus, D_i_minus)
+
+    def measurement_update(self, dx_i_minus, UD_i_minus, K_i, H_i, R_i, r_i):
+        H_i, r_i, R_diag = whiten(np.atleast_2d(np.asarray(H_i, dtype=np.float64)), R_i, np.reshape(r_i, (-1)))
+        dx_i_plus, U_i_plus, D_i_plus = bierman_update(np.asarray(dx_i_minus, dtype=np.float64), *ud_unpack(UD_i_minus),
+                                                       np.ascontiguousarray(H_i), R_diag, np.ascontiguousarray(r_i))
+        return dx_i_plus, ud_pack(U_i_plus, D_i_plus)
+
+    def get_logger_dict(self):
+        logger_data = super().get_logger_dict()
+        U_i_m1_minus, D_i_m1_minus = ud_unpack(self.P_i_m1_minus)
+        U_i_m1_plus, D_i_m1_plus = ud_unpack(self.P_i_m1_plus)
+        logger_data["P_i_minus"] = U_i_m1_minus@np.diag(D_i_m1_minus)@U_i_m1_minus.T
+        logger_data["P_i_plus"] = U_i_m1_plus@np.diag(D_i_m1_plus)@U_i_m1_plus.T
+        logger_data["sigma_i"] = np.sqrt(D_i_m1_plus@(U_i_m1_plus**2).T)
+        return logger_data
+
 class ExtendedKalmanFilter(FilterBase):
     def __init__(self, t0, x0, dx0, P0, f_dict, h_dict, logger=None, events=None):
         super().__init__(f_dict, h_dict, logger, events)
@@ -393,18 +713,7 @@ class ExtendedKalmanFilter(FilterBase):
             # return x_hat_i_m1_plus, phi_i_m1
             return copy.deepcopy(x_hat_i_m1_plus), copy.deepcopy(phi_i_m1)
 
-        N = len(x_hat_i_m1_plus)
-        Z_i_m1 = np.hstack((x_hat_i_m1_plus, phi_i_m1.reshape((-1))))
-        event_fcn = self.events
-        sol = solve_ivp(self.f_integrate, 
-                        [self.t_i_m1, t_i], 
-                        Z_i_m1, 
-                        args=(self.f, self.dfdx, self.f_args), 
-                        atol=self.atol, 
-                        rtol=self.rtol, 
-                        events=event_fcn)
-        x_i = sol.y[:N,-1]
-        phi_i = sol.y[N:,-1].reshape((N,N))
+        x_i, phi_i, sol = self.propagate_stm(t_i, x_hat_i_m1_plus, phi_i_m1, events=self.events)
 
         self.gather_event_data(t_i,sol)
 
@@ -421,13 +730,16 @@ class ExtendedKalmanFilter(FilterBase):
         h_i = np.array(self.h(x_hat_i_minus, self.h_args))
         H_i = np.array(self.dhdx(x_hat_i_minus, h_i, self.h_args))
         r_i = y_i - h_i 
-        K_i = P_i_minus@H_i.T@invert(H_i@P_i_minus@H_i.T + R_i)
+        K_i = None if self.sequential else kalman_gain(P_i_minus, H_i, R_i)
         return r_i, H_i, K_i
 
     def measurement_update(self, x_hat_i_minus, P_i_minus, K_i, H_i, R_i, r_i):
-        x_hat_i_plus = x_hat_i_minus + K_i@r_i
-        G = np.eye(len(K_i)) - K_i@H_i
-        P_i_plus = G@P_i_minus@G.T + K_i@R_i@K_i.T
+        if self.sequential:
+            dx_i_plus, P_i_plus = sequential_update(np.zeros_like(x_hat_i_minus), P_i_minus, H_i, R_i, r_i, self.sequential != 'conventional')
+            x_hat_i_plus = x_hat_i_minus + dx_i_plus
+        else:
+            x_hat_i_plus = x_hat_i_minus + K_i@r_i
+            P_i_plus = joseph_update(P_i_minus, K_i, H_i, R_i)
         if np.any(np.isnan(P_i_plus)):
             print("NaNs Encountered")
             self.failed = True
@@ -484,6 +796,250 @@ class ExtendedKalmanFilter(FilterBase):
             data = self.get_logger_dict()
             self.logger.log(data)
         
+class BatchedKalmanFilter(FilterBase):
+    """Runs K independent Kalman filters in lockstep (e.g. Monte Carlo trials).
+
+    States are stacked as (K, N) and covariances as (K, N, N). All K
+    trajectories and STMs are integrated as one ODE system so each
+    integrator stage is a single call of the batched RHS, and the
+    time / measurement updates are broadcast over the leading axis.
+    Measurements may be shared, (M,), or per trial, (K, M); trials
+    with NaN observations are only time updated. R may be shared or per
+    trial (K, M, M), h_args per trial (K, P) with h_dict['h_args_per_trial'].
+    With h_dict['vectorized'] / f_dict['Q_vectorized'] h, dhdx and Q are
+    evaluated once for all trials (see evaluate_h()). Pair with
+    FilterLogger(N, samples, K=K).
+    """
+    def __init__(self, t0, x0, dx0, P0, f_dict, h_dict, logger=None, events=None):
+        super().__init__(f_dict, h_dict, logger, events)
+        self.f_integrate = f_dict.get('f_integrate', dynamics_ivp_batch if self.f_phi is None else dynamics_ivp_batch_fused)
+
+        self.K, self.N = np.shape(x0)
+        self.h_args_per_trial = h_dict.get('h_args_per_trial', False)
+
+        self.i = 0
+        self.t_i_m1 = t0
+        self.x_i_m1 = x0
+
+        self.dx_i_m1_minus = np.zeros((self.K, self.N))
+        self.dx_i_m1_plus = np.broadcast_to(dx0, (self.K, self.N)).copy()
+
+        self.P_i_m1_minus = np.zeros((self.K, self.N, self.N))
+        self.P_i_m1_plus = np.broadcast_to(P0, (self.K, self.N, self.N)).copy()
+
+        self.phi_0 = np.broadcast_to(np.eye(self.N), (self.K, self.N, self.N))
+        self.phi_i_m1 = self.phi_0.copy()
+
+    def batch_f_args(self):
+        # one row of dynamics arguments per filter
+        f_args = np.asarray(self.f_args)
+        if f_args.ndim < 2:
+            f_args = np.repeat(f_args.reshape((1,-1)), self.K, axis=0)
+        return f_args
+
+    def batch_h_args(self, trials):
+        # shared measurement arguments, or with h_dict['h_args_per_trial']
+        # one row per filter
+        if self.h_args_per_trial:
+            return np.asarray(self.h_args)[trials]
+        return self.h_args
+
+    def propagate_forward(self, t_i, x_i_m1, phi_i_m1):
+        if t_i == self.t_i_m1:
+            return copy.deepcopy(x_i_m1), copy.deepcopy(phi_i_m1)
+        K, N = self.K, self.N
+        Z_i_m1 = np.hstack((x_i_m1, phi_i_m1.reshape((K,-1)))).reshape((-1))
+        sol = self.integrate(self.f_integrate, 
+                             [self.t_i_m1, t_i], 
+                             Z_i_m1, 
+                             args=(self.f, self.dfdx_integrate, self.batch_f_args()), 
+                             method='RK45',
+                             events=self.events)
+        self.gather_event_data(t_i,sol)
+        Z_i = sol.y[:,-1].reshape((K,-1))
+        x_i = Z_i[:,:N]
+        phi_i = Z_i[:,N:].reshape((K,N,N))
+        return x_i, phi_i
+
+    def time_update(self, dx_i_m1_plus, P_i_m1_plus, phi_i, Q_i_i_m1):
+        dx_i_minus = np.einsum('kij,kj->ki', phi_i, dx_i_m1_plus)
+        P_i_minus = phi_i@P_i_m1_plus@np.swapaxes(phi_i, 1, 2) + Q_i_i_m1
+        return dx_i_minus, P_i_minus
+
+    def evaluate_measurements(self, x_i, trials):
+        # x_i holds the states of the given trials (indices into the K
+        # filters). Per trial arguments are the columns of h_args.T for a
+        # vectorized h, otherwise h is called per trial.
+        h_args = self.batch_h_args(trials)
+        if self.h_args_per_trial and not self.h_vectorized:
+            h_i = np.array([np.array(self.h(x_i[j], h_args[j]), dtype=np.float64).reshape((-1)) for j in range(len(x_i))])
+            H_i = np.array([np.array(self.dhdx(x_i[j], h_i[j], h_args[j]), dtype=np.float64) for j in range(len(x_i))])
+            return h_i, H_i
+        if self.h_args_per_trial:
+            h_args = h_args.T
+        h_i = self.evaluate_h(x_i, h_args)
+        return h_i, self.evaluate_dhdx(x_i, h_i, h_args)
+
+    def batch_R(self, R_i, trials):
+        # shared (M, M) or per trial (K, M, M) measurement noise
+        R_i = np.asarray(R_i)
+        if R_i.ndim == 3:
+            return R_i[trials]
+        return R_i
+
+    def process_observations(self, x_i, P_i_minus, R_i, y_i, trials):
+        h_i, H_i = self.evaluate_measurements(x_i, trials)
+        r_i = y_i - h_i
+        K_i = batch_kalman_gain(P_i_minus, H_i, R_i)
+        return r_i, H_i, K_i
+
+    def measurement_update(self, dx_i_minus, P_i_minus, K_i, H_i, R_i, r_i):
+        dx_i_plus = dx_i_minus + np.einsum('kij,kj->ki', K_i, r_i - np.einsum('kij,kj->ki', H_i, dx_i_minus))
+        G = np.eye(self.N) - K_i@H_i
+        P_i_plus = G@P_i_minus@np.swapaxes(G, 1, 2) + K_i@R_i@np.swapaxes(K_i, 1, 2)
+        return dx_i_plus, P_i_plus
+
+    def get_logger_dict(self):
+        logger_data = {
+            "i" : self.i,
+            "t_i" : self.t_i_m1,
+            "x_i" : self.x_i_m1,
+            "dx_i_minus" : self.dx_i_m1_minus,
+            "dx_i_plus" : self.dx_i_m1_plus,
+            "P_i_minus" : self.P_i_m1_minus,
+            "P_i_plus" : self.P_i_m1_plus,
+            "x_hat_i_minus" : self.x_i_m1 + self.dx_i_m1_minus,
+            "x_hat_i_plus" :self.x_i_m1 + self.dx_i_m1_plus,
+            "phi_ti_ti_m1" : self.phi_i_m1,
+            "sigma_i" : np.sqrt(np.diagonal(self.P_i_m1_plus, axis1=1, axis2=2))
+        }
+        return logger_data
+
+    def update(self, t_i, y_i, R_i, f_args=None, h_args=None):
+        fail = False
+        if f_args is not None:
+            self.f_args = f_args
+        if h_args is not None:
+            self.h_args = h_args
+
+        x_i, phi_i = self.propagate_forward(t_i, self.x_i_m1, self.phi_0)
+        Q_i = self.evaluate_process_noise(t_i, x_i)
+        dx_i_minus, P_i_minus = self.time_update(self.dx_i_m1_plus, self.P_i_m1_plus, phi_i, Q_i)
+        if np.any(np.isnan(dx_i_minus)) or np.any(np.isnan(P_i_minus)):
+            print("NaNs Encountered")
+            fail = True
+            return fail
+
+        # only the trials with observations receive a measurement update
+        y_i = np.broadcast_to(np.atleast_2d(y_i), (self.K, np.shape(y_i)[-1]))
+        valid = ~np.any(np.isnan(y_i), axis=1)
+        dx_i_plus, P_i_plus = dx_i_minus.copy(), P_i_minus.copy()
+        if np.any(valid):
+            trials = np.flatnonzero(valid)
+            R_valid = self.batch_R(R_i, trials)
+            r_i, H_i, K_i = self.process_observations(x_i[valid], P_i_minus[valid], R_valid, y_i[valid], trials)
+            dx_i_plus[valid], P_i_plus[valid] = self.measurement_update(dx_i_minus[valid], P_i_minus[valid], K_i, H_i, R_valid, r_i)
+            if np.any(np.isnan(dx_i_plus)) or np.any(np.isnan(P_i_plus)):
+                print("NaNs Encountered")
+                fail = True
+                return fail
+
+        self.i += 1
+        self.t_i_m1 = t_i
+        self.x_i_m1 = x_i
+
+        self.dx_i_m1_minus = dx_i_minus
+        self.dx_i_m1_plus = dx_i_plus
+
+        self.P_i_m1_minus = P_i_minus       
+        self.P_i_m1_plus = P_i_plus       
+
+        self.phi_i_m1 = phi_i
+        
+        if self.logger is not None:
+            data = self.get_logger_dict()
+            self.logger.log(data) 
+        return fail
+
+class BatchedExtendedKalmanFilter(BatchedKalmanFilter):
+    """ExtendedKalmanFilter counterpart of BatchedKalmanFilter."""
+    def __init__(self, t0, x0, dx0, P0, f_dict, h_dict, logger=None, events=None):
+        super().__init__(t0, x0, dx0, P0, f_dict, h_dict, logger, events)
+
+        self.x_hat_i_m1_minus = x0
+        self.x_hat_i_m1_plus = x0
+
+        self.P_i_m1_minus = self.P_i_m1_plus.copy()
+
+    def time_update(self, P_i_m1_plus, phi_i, Q_i):
+        P_i_minus = phi_i@P_i_m1_plus@np.swapaxes(phi_i, 1, 2) + Q_i
+        return P_i_minus
+
+    def measurement_update(self, x_hat_i_minus, P_i_minus, K_i, H_i, R_i, r_i):
+        x_hat_i_plus = x_hat_i_minus + np.einsum('kij,kj->ki', K_i, r_i)
+        G = np.eye(self.N) - K_i@H_i
+        P_i_plus = G@P_i_minus@np.swapaxes(G, 1, 2) + K_i@R_i@np.swapaxes(K_i, 1, 2)
+        return x_hat_i_plus, P_i_plus
+
+    def get_logger_dict(self):
+        logger_data = {
+            "i" : self.i,
+            "t_i" : self.t_i_m1,
+
+            "P_i_minus" : self.P_i_m1_minus,
+            "P_i_plus" : self.P_i_m1_plus,
+
+            "x_hat_i_minus" : self.x_hat_i_m1_minus,
+            "x_hat_i_plus" : self.x_hat_i_m1_plus,
+
+            "phi_ti_ti_m1" : self.phi_i_m1,
+
+            "sigma_i" : np.sqrt(np.diagonal(self.P_i_m1_plus, axis1=1, axis2=2))
+        }
+        return logger_data
+
+    def update(self, t_i, y_i, R_i, f_args=None, h_args=None):
+        fail = False
+        if f_args is not None:
+            self.f_args = f_args
+        if h_args is not None:
+            self.h_args = h_args
+
+        x_hat_i_minus, phi_i = self.propagate_forward(t_i, self.x_hat_i_m1_plus, self.phi_0)
+        Q_i = self.evaluate_process_noise(t_i, x_hat_i_minus)
+        P_i_minus = self.time_update(self.P_i_m1_plus, phi_i, Q_i)
+
+        y_i = np.broadcast_to(np.atleast_2d(y_i), (self.K, np.shape(y_i)[-1]))
+        valid = ~np.any(np.isnan(y_i), axis=1)
+        if self.event_triggered and self.terminate_upon_event:
+            valid[:] = False
+
+        x_hat_i_plus, P_i_plus = x_hat_i_minus.copy(), P_i_minus.copy()
+        if np.any(valid):
+            trials = np.flatnonzero(valid)
+            R_valid = self.batch_R(R_i, trials)
+            r_i, H_i, K_i = self.process_observations(x_hat_i_minus[valid], P_i_minus[valid], R_valid, y_i[valid], trials)
+            x_hat_i_plus[valid], P_i_plus[valid] = self.measurement_update(x_hat_i_minus[valid], P_i_minus[valid], K_i, H_i, R_valid, r_i)
+            if np.any(np.isnan(P_i_plus)):
+                print("NaNs Encountered")
+                fail = True
+
+        self.i += 1
+        self.t_i_m1 = t_i
+
+        self.x_hat_i_m1_minus = x_hat_i_minus
+        self.x_hat_i_m1_plus = x_hat_i_plus
+
+        self.P_i_m1_minus = P_i_minus        
+        self.P_i_m1_plus = P_i_plus        
+
+        self.phi_i_m1 = phi_i
+
+        if self.logger is not None:
+            data = self.get_logger_dict()
+            self.logger.log(data)
+        return fail
+
 class NonLinearBatchFilter(FilterBase):
     def __init__(self, t0, x0, dx0, P0, f_dict, h_dict, logger=None, events=None, iterations=3, update_gamma=1.0):
         super().__init__(f_dict, h_dict, logger, events)
@@ -526,7 +1082,7 @@ class NonLinearBatchFilter(FilterBase):
     def propagate_trajectory(self, t_vec, x_hat_0, phi_0):
         N = len(x_hat_0)
         Z_i_m1 = np.hstack((x_hat_0, phi_0.reshape((-1))))
-        sol = solve_ivp(dynamics_ivp, [t_vec[0], t_vec[-1]], Z_i_m1, args=(self.f, self.dfdx, self.f_args), atol=self.atol, rtol=self.rtol, t_eval=t_vec, method='RK45')
+        sol = self.integrate(dynamics_ivp, [t_vec[0], t_vec[-1]], Z_i_m1, args=(self.f, self.dfdx, self.f_args), t_eval=t_vec, method='RK45')
 
         x_hat = sol.y[:N].T.reshape((-1,N))
         phi = sol.y[N:].T.reshape((-1,N,N))
@@ -656,11 +1212,23 @@ class SquareRootInformationFilter(FilterBase):
 
         self.mu_i_m1_plus = np.zeros((3,1))
 
-        self.R0 = np.linalg.cholesky(invert(P0)).T
+        self.R0 = np.linalg.cholesky(spd_solve(P0, np.eye(len(P0)))).T
         self.db0 = self.R0@dx0
         self.db_i_m1_plus = self.db0
         self.R_i_m1_plus = self.R0
 
+        # square root information of the process noise, None without
+        # (or if Q isn't positive definite, e.g. zero)
+        self.R_u_0 = None
+        if self.Q_0 is not None:
+            try:
+                self.R_u_0 = np.linalg.cholesky(spd_solve(self.Q_0, np.eye(len(self.Q_0)))).T
+            except np.linalg.LinAlgError:
+                pass
+
+        # per update: logger index, R_u, R_ux, db_tilde_u, phi, Gamma (see smooth())
+        self.smoother_data = []
+
     def test_failure(self, matrices):
         fail = False
         for matrix in matrices:
@@ -675,33 +1243,20 @@ class SquareRootInformationFilter(FilterBase):
         return db, R
 
     def info_2_state(self, db, R):
-        R_inv = invert(R)
-        dx = R_inv@db
+        # R is upper triangular
+        R_inv = solve_triangular(R, np.eye(len(R)), check_finite=False)
+        dx = solve_triangular(R, db, check_finite=False)
         P = R_inv@R_inv.T
         return dx, P
 
-    def householder_transformation(self,A_input, N):
-        A = copy.deepcopy(A_input)
-        L = len(A) # Augmented Matrix = N + M
-        for k in range(N):
-            u = np.zeros((L,))
-            sigma = np.sign(A[k,k])*np.linalg.norm(A[k:L,k])
-            u[k] = A[k,k] + sigma
-            A[k,k] = -sigma
-            u[k+1:] = A[k+1:,k]
-
-            for i in range(k+1, L):
-                u[i] = A[i,k]
-            beta = 1 / (sigma * u[k])
-            # beta = 1.0/(sigma*u[k])
-
-            for j in range(k+1, N+1):
-                gamma = beta*np.sum([u[i] * A[i,j] for i in range(k, L)])
-                for i in range(k,L):
-                    A[i,j] = A[i,j] - gamma*u[i]
-
-            for i in range(k+1, L):
-                A[i,k] = 0.0
+    def householder_transformation(self, A_input, N):
+        # Orthogonal triangularization of the first N columns of A (LAPACK
+        # geqrf). The rows of R are only unique up to sign, which cancels in
+        # dx = R^-1 db and P. The columns past N are triangularized as well,
+        # i.e. the residuals below row N are collapsed into row N.
+        R = qr(A_input, mode='r', check_finite=False)[0]
+        A = np.zeros(np.shape(A_input))
+        A[:len(R)] = R
         return A
 
     def propagate_forward(self, t_i, x_i_m1, phi_i_m1):
@@ -709,12 +1264,7 @@ class SquareRootInformationFilter(FilterBase):
             # return x_hat_i_m1_plus, phi_i_m1
             return copy.deepcopy(x_i_m1), copy.deepcopy(phi_i_m1)
 
-        N = len(x_i_m1)
-        Z_i_m1 = np.hstack((x_i_m1, phi_i_m1.reshape((-1))))
-        event_fcn = self.events
-        sol = solve_ivp(self.f_integrate, [self.t_i_m1, t_i], Z_i_m1, args=(self.f, self.dfdx, self.f_args), atol=self.atol, rtol=self.rtol, method='RK45',events=event_fcn)
-        x_i = sol.y[:N,-1]
-        phi_i = sol.y[N:,-1].reshape((N,N))
+        x_i, phi_i, sol = self.propagate_stm(t_i, x_i_m1, phi_i_m1, method='RK45', events=self.events)
 
         self.gather_event_data(t_i,sol)
 
@@ -753,13 +1303,12 @@ class SquareRootInformationFilter(FilterBase):
             return db_i_m1_plus, R_i_m1_plus, db_tilde_u_i, R_u_i_minus, R_ux_i
 
         # Check if there is process noise
-        try:
-            R_u_i_m1 = np.linalg.cholesky(invert(self.Q_0)).T
-        except:
+        R_u_i_m1 = self.R_u_0
+        if R_u_i_m1 is None:
             # If not, perform smaller householder transform.
 
             # Time update for information covariance 
-            R_v_i = R_i_m1_plus@invert(phi_i) # TSB 5.10.69 (R_k_tilde) = Pre-transform R_i_minus
+            R_v_i = np.linalg.solve(phi_i.T, R_i_m1_plus.T).T # TSB 5.10.69 (R_k_tilde) = Pre-transform R_i_minus
 
             # Time update for information state through householder transform, T
             MM = np.hstack((R_v_i, db_i_m1_plus.reshape((-1,1)))) # 5.10.88 second row
@@ -777,7 +1326,7 @@ class SquareRootInformationFilter(FilterBase):
         
         # convert control into information space 
         db_u_i_m1 = R_u_i_m1@mu_i_m1 # Recall that mu is the average control, not the actual control. 
-        R_v_i = R_i_m1_plus@invert(phi_i) # TSB 5.10.69 (R_k_tilde) = Pre-transform R_i_minus
+        R_v_i = np.linalg.solve(phi_i.T, R_i_m1_plus.T).T # TSB 5.10.69 (R_k_tilde) = Pre-transform R_i_minus
 
         #  pg 363 T.S.B.
         zeros_q_x_n = np.zeros((q,n))
@@ -803,34 +1352,25 @@ class SquareRootInformationFilter(FilterBase):
         eps_i = r_i - H_i@dx_i
 
         V_i = np.linalg.cholesky(R_i).T
-        V_i_inv = invert(V_i)
-        H_tilde_i = V_i_inv@H_i
-        eps_tilde_i = V_i_inv@eps_i
-        r_tilde_i = V_i_inv@r_i
+        H_tilde_i = solve_triangular(V_i, H_i, check_finite=False)
+        eps_tilde_i = solve_triangular(V_i, eps_i, check_finite=False)
+        r_tilde_i = solve_triangular(V_i, r_i, check_finite=False)
 
         return r_tilde_i, H_tilde_i, eps_tilde_i
 
     def measurement_update(self, db_i_minus, R_i_minus, H_tilde_i, r_tilde_i):
+        # all (whitened) observations of Y_i are triangularized together
         N = len(db_i_minus)
-        db_i_minus_k = db_i_minus
-        R_i_minus_k = R_i_minus
-        N = len(R_i_minus_k)
-
-        # each observation in Y_i must be processed separately (index k)
-        for k in range(len(r_tilde_i)): 
-            G = np.vstack([
-                np.hstack([R_i_minus_k, db_i_minus_k.reshape((-1,1))]),
-                np.hstack([H_tilde_i[k], r_tilde_i[k]])]
-            )
-            G_new = self.householder_transformation(G, N)
-            R_i_plus = G_new[:N,:N]
-            db_i_plus = G_new[:N,N]
-            e_tilde_i_k = G_new[N,N]
-
-            R_i_minus_k = R_i_plus
-            db_i_minus_k = db_i_plus
+        G = np.vstack([
+            np.hstack([R_i_minus, db_i_minus.reshape((-1,1))]),
+            np.hstack([np.atleast_2d(H_tilde_i), np.reshape(r_tilde_i, (-1,1))])]
+        )
+        G_new = self.householder_transformation(G, N)
+        R_i_plus = G_new[:N,:N]
+        db_i_plus = G_new[:N,N]
+        e_tilde_i = G_new[N,N] # norm of the post-fit residuals
 
-        return db_i_plus, R_i_plus, e_tilde_i_k
+        return db_i_plus, R_i_plus, e_tilde_i
 
     def get_logger_dict(self):
         logger_data = {
@@ -874,6 +1414,10 @@ class SquareRootInformationFilter(FilterBase):
             )
         fail = self.test_failure([db_i_minus, R_i_minus])
         dx_i_minus, P_i_minus = self.info_2_state(db_i_minus, R_i_minus)
+
+        if t_i == self.t_i_m1 or self.R_u_0 is None:
+            Gamma_i = np.zeros((len(db_i_minus), len(db_tilde_u_i)))
+        self.smoother_data.append((self.i, R_u_i_minus, R_ux_i, np.reshape(db_tilde_u_i, (-1)), phi_i, Gamma_i))
         if np.any(np.isnan(y_i)) or \
             (self.event_triggered and self.terminate_upon_event): 
             db_i_plus, R_i_plus = db_i_minus, R_i_minus
@@ -885,7 +1429,7 @@ class SquareRootInformationFilter(FilterBase):
         dx_i_plus, P_i_plus = self.info_2_state(db_i_plus, R_i_plus)
 
         # measurement updated past control value (that isn't used in the next time update (?))  
-        mu_i_m1_plus = invert(R_u_i_minus)@(db_tilde_u_i - R_ux_i@dx_i_plus) 
+        mu_i_m1_plus = solve_triangular(R_u_i_minus, db_tilde_u_i - R_ux_i@dx_i_plus, check_finite=False)
         
         self.i += 1
         self.t_i_m1 = t_i
@@ -907,16 +1451,54 @@ class SquareRootInformationFilter(FilterBase):
             self.logger.log(data) 
         return fail
 
-    
-    # def smooth(self):
-        # TSB 5.10.105 -- Smoothed Covariance
-        # TSB 5.10.96 -- Smoothed State 
+    def smooth(self):
+        """Square root information smoother (TSB 5.10.96 - 5.10.105). Sweeps
+        back from the last update, combining the stored noise information
+        [R_u, R_ux, db_tilde_u] with the smoothed information of the next
+        epoch in one QR per step:
+
+            [R_u + R_ux Gamma, R_ux phi, db_tilde_u]   [R_u*, R_ux*, .    ]
+            [R*_k Gamma,       R*_k phi, db*_k     ] = [0,    R*_k-1, db*_k-1]
+
+        and writes the smoothed deviations, states, covariances, and sigmas
+        into the logger (if any). Returns the smoothed dx and P.
+        """
+        K = len(self.smoother_data)
+        N = len(self.db_i_m1_plus)
+        dx_smoothed = np.zeros((K, N))
+        P_smoothed = np.zeros((K, N, N))
+
+        R_k = self.R_i_m1_plus
+        db_k = self.db_i_m1_plus
+        dx_smoothed[-1], P_smoothed[-1] = self.info_2_state(db_k, R_k)
+        for k in range(K-1, 0, -1):
+            i, R_u, R_ux, db_u, phi, Gamma = self.smoother_data[k]
+            q = len(db_u)
+            A = np.vstack([
+                np.hstack((R_u + R_ux@Gamma, R_ux@phi, db_u.reshape((-1,1)))),
+                np.hstack((R_k@Gamma, R_k@phi, db_k.reshape((-1,1))))
+            ])
+            A_prime = self.householder_transformation(A, q + N)
+            R_k = A_prime[q:q+N, q:q+N]
+            db_k = A_prime[q:q+N, -1]
+            dx_smoothed[k-1], P_smoothed[k-1] = self.info_2_state(db_k, R_k)
+
+        if self.logger is not None:
+            rows = [data[0] for data in self.smoother_data] + [self.i]
+            for k in range(K):
+                # rows logged without an update (stacked measurements) share the epoch
+                for i in range(rows[k], rows[k+1]):
+                    self.logger.dx_i_plus[i] = dx_smoothed[k]
+                    self.logger.x_hat_i_plus[i] = self.logger.x_i[i] + dx_smoothed[k]
+                    self.logger.P_i_plus[i] = P_smoothed[k]
+                    self.logger.sigma_i[i] = np.sqrt(np.diag(P_smoothed[k]))
+        return dx_smoothed, P_smoothed
 
 class UnscentedKalmanFilter(FilterBase):
     def __init__(self, t0, x0, dx0, P0, alpha, kappa, beta, f_dict, h_dict, logger=None, events=None):
         super().__init__(f_dict, h_dict, logger, events)
 
-        self.f_integrate = f_dict.get('f_integrate', dynamics_ivp_unscented)
+        self.f_integrate = f_dict.get('f_integrate', dynamics_ivp_unscented_batch if self.batch else dynamics_ivp_unscented)
 
         self.i = 0
         self.t_i_m1 = t0
@@ -975,54 +1557,34 @@ class UnscentedKalmanFilter(FilterBase):
         return S
 
     def propagate_forward(self, t_i, x_hat_i_m1_plus, P_i_m1_plus):
+        return self.propagate_sigma_points(t_i, x_hat_i_m1_plus, self.get_sigma_vecs(P_i_m1_plus))
+
+    def propagate_sigma_points(self, t_i, x_hat_i_m1_plus, sigma_vecs):
         N = len(x_hat_i_m1_plus)
-        sigma_vecs = self.get_sigma_vecs(P_i_m1_plus)
-        sigma_i_m1_plus = np.zeros((2*N+1,N))
-        sigma_i_m1_plus[0] = x_hat_i_m1_plus
+        sigma_vecs = (self.gamma*sigma_vecs).T
+        sigma_i_m1_plus = x_hat_i_m1_plus + np.vstack((np.zeros((1,N)), sigma_vecs, -sigma_vecs))
         event_fcn = self.events
-        for k in range(1, len(sigma_i_m1_plus)):
-            if k < N+1:
-                sigma_i_m1_plus[k] = x_hat_i_m1_plus + self.gamma[k-1]*sigma_vecs[:,k-1]
-            else:
-                sigma_i_m1_plus[k] = x_hat_i_m1_plus - self.gamma[(k-1)-N]*sigma_vecs[:,(k-1)-(N)]
 
-        sol = solve_ivp(self.f_integrate, [self.t_i_m1, t_i], sigma_i_m1_plus.reshape((-1,)), args=(self.f, self.dfdx, self.f_args), atol=self.atol, rtol=self.rtol, events=event_fcn)
+        sol = self.integrate(self.f_integrate, [self.t_i_m1, t_i], sigma_i_m1_plus.reshape((-1,)), args=(self.f, self.dfdx, self.f_args), events=event_fcn)
         x_i = sol.y[:,-1].reshape((2*N+1,N))
         self.gather_event_data(t_i,sol)
 
         return x_i
 
     def time_update(self, sigma_points, Q_i):
-        N = len(sigma_points[0])
-        P_i_minus = np.zeros((N,N))
-        x_hat_i_minus = np.sum([
-            self.w_m[k]*sigma_points[k] for k in range(0, 2*N+1)
-            ], axis=0)
-        for k in range(0,2*N+1):
-            P_i_minus += self.w_c[k]*np.outer((sigma_points[k] - x_hat_i_minus),(sigma_points[k] - x_hat_i_minus)) 
-        
-        P_i_minus += Q_i
+        x_hat_i_minus = self.w_m@sigma_points
+        dX = sigma_points - x_hat_i_minus
+        P_i_minus = (self.w_c*dX.T)@dX + Q_i
         return x_hat_i_minus, P_i_minus
 
     def process_observations(self, x_hat_i_minus, sigma_points, y_i, R_i):
-        y_hat_vec = np.zeros((len(sigma_points), len(y_i)))
-        for k in range(0, len(sigma_points)):
-            y_hat_vec[k] = np.array(self.h(sigma_points[k], self.h_args))
-        
-        N = len(x_hat_i_minus)
-        M = len(y_i)
-        y_hat_i_minus = np.zeros((M,))
-        P_xy_i_minus = np.zeros((N, M))
-        P_yy_i_minus = np.zeros((M,M))
-        for k in range(len(y_hat_vec)):
-            y_hat_i_minus += self.w_m[k]*y_hat_vec[k]
-
-        for k in range(len(y_hat_vec)):
-            P_yy_i_minus += self.w_c[k]*np.outer((y_hat_vec[k] - y_hat_i_minus), (y_hat_vec[k] - y_hat_i_minus)) #+ R_i
-            P_xy_i_minus += self.w_c[k]*np.outer((sigma_points[k]-x_hat_i_minus), (y_hat_vec[k] - y_hat_i_minus))
-
-        P_yy_i_minus += R_i
-        K_i = P_xy_i_minus@invert(P_yy_i_minus)
+        y_hat_vec = self.evaluate_h(sigma_points)
+        y_hat_i_minus = self.w_m@y_hat_vec
+        dX = sigma_points - x_hat_i_minus
+        dY = y_hat_vec - y_hat_i_minus
+        P_yy_i_minus = (self.w_c*dY.T)@dY + R_i
+        P_xy_i_minus = (self.w_c*dX.T)@dY
+        K_i = spd_solve(P_yy_i_minus, P_xy_i_minus.T).T
         if np.any(np.isnan(K_i)) or np.any(np.isnan(P_yy_i_minus)):
             print("NaNs Encountered")
             self.failed = True
@@ -1090,36 +1652,278 @@ class UnscentedKalmanFilter(FilterBase):
             data = self.get_logger_dict()
             self.logger.log(data)
 
-class Smoother():
-    def __init__(self, logger):
-        self.logger = copy.deepcopy(logger)
+class SRUnscentedKalmanFilter(UnscentedKalmanFilter):
+    """Square root UKF (Van der Merwe), same interface and logger output as
+    UnscentedKalmanFilter. The lower triangular S with P = S S^T is
+    propagated with QR and rank one Cholesky updates / downdates, so the
+    sigma points are a scaling of S rather than an eigendecomposition of P
+    and P can't lose definiteness to round off."""
+
+    @property
+    def P_i_m1_minus(self):
+        return self.S_i_m1_minus@self.S_i_m1_minus.T
+
+    @P_i_m1_minus.setter
+    def P_i_m1_minus(self, P):
+        self.S_i_m1_minus = cholesky_sqrt(P)
+
+    @property
+    def P_i_m1_plus(self):
+        return self.S_i_m1_plus@self.S_i_m1_plus.T
+
+    @P_i_m1_plus.setter
+    def P_i_m1_plus(self, P):
+        self.S_i_m1_plus = cholesky_sqrt(P)
+
+    def get_sigma_vecs(self, P):
+        return cholesky_sqrt(P)
+
+    def weighted_sqrt(self, dZ, S_noise):
+        # tria([sqrt(w_c) dZ_1:2N, S_noise]) then the (possibly negative)
+        # zeroth weight as a rank one update / downdate
+        S = tria(np.hstack((np.sqrt(self.w_c[1:])*dZ[1:].T, S_noise)))
+        S, success = cholupdate(S, np.sqrt(np.abs(self.w_c[0]))*dZ[0].reshape((-1,1)), np.sign(self.w_c[0]))
+        if not success:
+            S = cholesky_sqrt((self.w_c*dZ.T)@dZ + S_noise@S_noise.T)
+        return S
 
-    def update(self):
-        # https://arl.cs.utah.edu/resources/Kalman%20Smoothing.pdf or
-        # https://en.wikipedia.org/wiki/Kalman_filter#Rauch%E2%80%93Tung%E2%80%93Striebel 
-        i = len(self.logger.t_i) - 2 # total updates - 1 
+    def propagate_forward(self, t_i, x_hat_i_m1_plus, S_i_m1_plus):
+        return self.propagate_sigma_points(t_i, x_hat_i_m1_plus, S_i_m1_plus)
+
+    def time_update(self, sigma_points, Q_i):
+        x_hat_i_minus = self.w_m@sigma_points
+        S_i_minus = self.weighted_sqrt(sigma_points - x_hat_i_minus, cholesky_sqrt(Q_i))
+        return x_hat_i_minus, S_i_minus
+
+    def process_observations(self, x_hat_i_minus, sigma_points, y_i, R_i):
+        y_hat_vec = self.evaluate_h(sigma_points)
+        y_hat_i_minus = self.w_m@y_hat_vec
+        dX = sigma_points - x_hat_i_minus
+        dY = y_hat_vec - y_hat_i_minus
+        S_yy_i_minus = self.weighted_sqrt(dY, cholesky_sqrt(np.atleast_2d(R_i)))
+        P_xy_i_minus = (self.w_c*dX.T)@dY
+
+        # K = P_xy (S_yy S_yy^T)^-1
+        K_i = solve_triangular(S_yy_i_minus, P_xy_i_minus.T, lower=True, check_finite=False)
+        K_i = solve_triangular(S_yy_i_minus.T, K_i, lower=False, check_finite=False).T
+        if np.any(np.isnan(K_i)):
+            print("NaNs Encountered")
+            self.failed = True
+
+        return y_hat_i_minus, K_i, S_yy_i_minus
+
+    def measurement_update(self, x_hat_i_minus, S_i_minus, K_i, S_yy_i, y_i, y_hat_i):
+        x_hat_i_plus = x_hat_i_minus + K_i@(y_i - y_hat_i)
+        U = K_i@S_yy_i
+        S_i_plus, success = cholupdate(S_i_minus, U, -1.0)
+        if not success:
+            S_i_plus = cholesky_sqrt(S_i_minus@S_i_minus.T - U@U.T)
+        if np.any(np.isnan(S_i_plus)):
+            print("NaNs Encountered")
+            self.failed = True
 
-        while i >= 0:
-            # (timestep = i, measurements = i) 
-            x_hat_i_plus = self.logger.x_hat_i_plus[i] 
-            P_i_plus = self.logger.P_i_plus[i]
+        return x_hat_i_plus, S_i_plus
 
-            # (timestep = i + 1, measurements = i) 
-            phi_i_p1_i = self.logger.phi_ti_ti_m1[i+1] 
-            P_i_p1_minus = self.logger.P_i_minus[i+1] 
-            P_i_p1_plus = self.logger.P_i_plus[i+1] 
-            x_hat_i_p1_minus = self.logger.x_hat_i_minus[i+1] 
-            x_hat_i_p1_plus = self.logger.x_hat_i_plus[i+1] 
+    def update(self, t_i, y_i, R_i, f_args=None, h_args=None):
+        if f_args is not None:
+            self.f_args = f_args
+        if h_args is not None:
+            self.h_args = h_args
 
-            S_i = P_i_plus@phi_i_p1_i.T@invert(P_i_p1_minus)
-            new_x_hat_i_plus = x_hat_i_plus + S_i@(x_hat_i_p1_plus - x_hat_i_p1_minus)
-            new_P_i_plus = P_i_plus + S_i@(P_i_p1_plus - P_i_p1_minus)@S_i.T
+        Q_i = self.get_process_noise(t_i, self.x_hat_i_m1_plus)
+        sigma_points = self.propagate_forward(t_i, self.x_hat_i_m1_plus, self.S_i_m1_plus)
+        x_hat_i_minus, S_i_minus = self.time_update(sigma_points, Q_i)
 
-            self.logger.P_i_plus[i] = new_P_i_plus
-            self.logger.x_hat_i_plus[i] = new_x_hat_i_plus
-            self.logger.dx_i_plus[i] = new_x_hat_i_plus - self.logger.x_i[i]
+        if np.any(np.isnan(y_i)) or \
+            (self.event_triggered and self.terminate_upon_event):
+            x_hat_i_plus, S_i_plus = x_hat_i_minus, S_i_minus
+        else:
+            y_hat_i_minus, K_i, S_yy_i_minus = self.process_observations(x_hat_i_minus, sigma_points, y_i, R_i)
+            x_hat_i_plus, S_i_plus = self.measurement_update(x_hat_i_minus, S_i_minus, K_i, S_yy_i_minus, y_i, y_hat_i_minus)
 
-            i -= 1
+        self.i += 1
+        self.t_i_m1 = t_i
+
+        self.x_hat_i_m1_minus = x_hat_i_minus
+        self.x_hat_i_m1_plus = x_hat_i_plus
+
+        self.S_i_m1_minus = S_i_minus
+        self.S_i_m1_plus = S_i_plus
+
+        self.phi_i_m1 = None
+
+        if self.logger is not None:
+            data = self.get_logger_dict()
+            self.logger.log(data)
+
+@njit(cache=True)
+def rts_smoother(x_hat_plus, P_plus, phi, P_minus, x_hat_minus, x_out, P_out, sigma_out, full):
+    # Backward RTS recursion. S_i = P_i+ phi^T (P_i+1-)^-1 comes from a
+    # Cholesky solve, S_i^T = P_i+1-^-1 phi P_i+ (LU if P_i+1- isn't
+    # positive definite). The outputs may alias the
+    # inputs (in place smoothing), row i is only read before it's written.
+    # P_out is only written if full, sigma_out always.
+    n = len(x_hat_plus)
+    x_s = x_hat_plus[n-1].copy()
+    P_s = P_plus[n-1].copy()
+    x_out[n-1] = x_s
+    sigma_out[n-1] = np.sqrt(np.diag(P_s))
+    if full:
+        P_out[n-1] = P_s
+    for i in range(n-2, -1, -1):
+        P_i = P_plus[i].copy()
+        B = phi[i+1]@P_i
+        S_T, ok = cholesky_solve(P_minus[i+1], B)
+        if not ok:
+            S_T = np.ascontiguousarray(np.linalg.solve(P_minus[i+1], B))
+        S = np.ascontiguousarray(S_T.T)
+        x_s = x_hat_plus[i] + S@(x_s - x_hat_minus[i+1])
+        P_s = P_i + S@(P_s - P_minus[i+1])@S_T
+        x_out[i] = x_s
+        sigma_out[i] = np.sqrt(np.diag(P_s))
+        if full:
+            P_out[i] = P_s
+
+class Smoother():
+    """Rauch-Tung-Striebel smoother of a filter's FilterLogger.
+
+    With in_place the smoothed results overwrite the logger's x_hat_i_plus,
+    dx_i_plus, P_i_plus, and sigma_i, otherwise self.logger is a shallow
+    copy of the logger sharing every input array and owning only new output
+    arrays. With diagonal_only the smoothed covariances aren't stored, just
+    their square root diagonals (sigma_i), and P_i_plus is left untouched.
+    """
+    def __init__(self, logger, in_place=False, diagonal_only=False):
+        self.in_place = in_place
+        self.diagonal_only = diagonal_only
+        if in_place:
+            self.logger = logger
+        else:
+            self.logger = copy.copy(logger)
+            self.logger.x_hat_i_plus = logger.x_hat_i_plus.copy()
+            self.logger.dx_i_plus = logger.dx_i_plus.copy()
+            self.logger.sigma_i = logger.sigma_i.copy()
+            if not diagonal_only:
+                self.logger.P_i_plus = logger.P_i_plus.copy()
+
+    def update(self):
+        # https://arl.cs.utah.edu/resources/Kalman%20Smoothing.pdf or
+        # https://en.wikipedia.org/wiki/Kalman_filter#Rauch%E2%80%93Tung%E2%80%93Striebel 
+        logger = self.logger
+        rts_smoother(
+            logger.x_hat_i_plus, 
+            logger.P_i_plus, 
+            logger.phi_ti_ti_m1, 
+            logger.P_i_minus, 
+            logger.x_hat_i_minus,
+            logger.x_hat_i_plus, 
+            logger.P_i_plus, 
+            logger.sigma_i, 
+            not self.diagonal_only)
+        logger.dx_i_plus[:] = logger.x_hat_i_plus - logger.x_i
+
+class FixedLagSmoother():
+    """Fixed lag RTS smoother wrapped around a filter (KalmanFilter,
+    ExtendedKalmanFilter, ...) for streaming use.
+
+    The smoother replaces the filter's logger and keeps the last lag + 1
+    epochs of (x+, P+, x-, P-, phi) in a ring buffer, so memory is O(lag N^2)
+    for any arc length. Once an epoch is lag epochs old it is smoothed with
+    the data up to the newest epoch and emitted to the logger and / or
+    callback(data), data holding the logger keys of the smoothed estimate.
+    Call flush() (done by run()) at the end of the data to emit the
+    remaining epochs.
+    """
+    def __init__(self, filter, lag, logger=None, callback=None):
+        self.filter = filter
+        self.lag = lag
+        self.logger = logger
+        self.callback = callback
+        filter.logger = self
+
+        N = len(filter.phi_0)
+        L = lag + 1
+        self.t = np.zeros((L,))
+        self.x_ref = np.zeros((L, N))
+        self.x_hat_plus = np.zeros((L, N))
+        self.x_hat_minus = np.zeros((L, N))
+        self.P_plus = np.zeros((L, N, N))
+        self.P_minus = np.zeros((L, N, N))
+        self.phi = np.zeros((L, N, N))
+        self.rows = np.zeros((L,), dtype=int) # logger rows per epoch
+        self.head = 0 # oldest epoch in the buffer
+        self.size = 0
+        self.i = 0 # rows emitted
+
+    def log(self, data):
+        N = self.x_hat_plus.shape[1]
+        L = len(self.t)
+        if self.size > 0 and data['t_i'] == self.t[(self.head + self.size - 1) % L]:
+            # another row of the same epoch (e.g. sequential stations), only
+            # the posterior changes
+            k = (self.head + self.size - 1) % L
+            self.x_hat_plus[k] = data['x_hat_i_plus']
+            self.P_plus[k] = data['P_i_plus']
+            self.rows[k] += 1
+            return
+
+        if self.size == L:
+            self.emit(1)
+        k = (self.head + self.size) % L
+        self.t[k] = data['t_i']
+        # the EKF has no reference trajectory, its deviations are from zero
+        self.x_ref[k] = data.get('x_i', np.zeros((N,)))
+        self.x_hat_plus[k] = data['x_hat_i_plus']
+        self.x_hat_minus[k] = data['x_hat_i_minus']
+        self.P_plus[k] = data['P_i_plus']
+        self.P_minus[k] = data['P_i_minus']
+        self.phi[k] = data['phi_ti_ti_m1']
+        self.rows[k] = 1
+        self.size += 1
+
+    def emit(self, count):
+        # smooth the buffered epochs and emit the oldest count of them
+        order = (self.head + np.arange(self.size)) % len(self.t)
+        x_s = np.zeros((self.size, self.x_hat_plus.shape[1]))
+        P_s = np.zeros((self.size,) + self.P_plus.shape[1:])
+        sigma_s = np.zeros_like(x_s)
+        rts_smoother(
+            self.x_hat_plus[order], 
+            self.P_plus[order], 
+            self.phi[order], 
+            self.P_minus[order], 
+            self.x_hat_minus[order], 
+            x_s, P_s, sigma_s, True)
+        for j in range(count):
+            k = order[j]
+            data = {
+                "t_i" : self.t[k],
+                "x_i" : self.x_ref[k],
+                "x_hat_i_plus" : x_s[j],
+                "dx_i_plus" : x_s[j] - self.x_ref[k],
+                "P_i_plus" : P_s[j],
+                "sigma_i" : sigma_s[j],
+            }
+            for _ in range(self.rows[k]):
+                self.i += 1
+                data['i'] = self.i
+                if self.logger is not None:
+                    self.logger.log(data)
+                if self.callback is not None:
+                    self.callback(dict(data))
+        self.head = (self.head + count) % len(self.t)
+        self.size -= count
+
+    def flush(self):
+        if self.size > 0:
+            self.emit(self.size)
+
+    def update(self, *args, **kwargs):
+        return self.filter.update(*args, **kwargs)
+
+    def run(self, *args, **kwargs):
+        self.filter.run(*args, **kwargs)
+        self.flush()
 
 class ConsiderCovarianceFilter(FilterBase):
     def __init__(self, t0, x0, dx0, c0, dc0, P_xx_0, P_cc_0, f_dict, h_dict, logger=None, events=None):
@@ -1152,7 +1956,7 @@ class ConsiderCovarianceFilter(FilterBase):
     def propagate_forward(self, t_i, x_i_m1, phi_i_m1):
         N = len(x_i_m1)
         Z_i_m1 = np.hstack((x_i_m1, phi_i_m1.reshape((-1))))
-        sol = solve_ivp(dynamics_ivp, [self.t_i_m1, t_i], Z_i_m1, args=(self.f, self.dfdx, self.f_args), atol=self.atol, rtol=self.rtol, method='RK45')
+        sol = self.integrate(dynamics_ivp, [self.t_i_m1, t_i], Z_i_m1, args=(self.f, self.dfdx, self.f_args), method='RK45')
         x_i = sol.y[:N,-1]
         phi_i = sol.y[N:,-1].reshape((N,N))
         self.gather_event_data(t_i,sol)
@@ -1319,11 +2123,9 @@ class SequentialConsiderCovarianceFilter(FilterBase):
         N = len(x_i_m1)
         M = len(c_i_m1)
         Z_i_m1 = np.hstack((x_i_m1, c_i_m1, phi_i_m1.reshape((-1)), theta_i_m1.reshape((-1))))
-        sol = solve_ivp(consider_dynamics_ivp, [self.t_i_m1, t_i], Z_i_m1, 
-                        args=(self.f, self.dfdx, self.dfdc, self.f_args, N, M, self.f_consider_mask), 
-                        atol=self.atol, 
-                        rtol=self.rtol, 
-                        method='RK45')
+        sol = self.integrate(consider_dynamics_ivp, [self.t_i_m1, t_i], Z_i_m1, 
+                             args=(self.f, self.dfdx, self.dfdc, self.f_args, N, M, self.f_consider_mask), 
+                             method='RK45')
         x_i = sol.y[:N,-1]
         c_i = sol.y[N:N+M,-1]
 
@@ -1361,8 +2163,8 @@ class SequentialConsiderCovarianceFilter(FilterBase):
         
         N = len(dx_i_minus)
         eye = np.eye(N)
-        K_i = P_i_minus@H_x_i.T@invert(H_x_i@P_i_minus@H_x_i.T + R_i)
-        P_i_plus = (eye - K_i@H_x_i)@P_i_minus@(eye - K_i@H_x_i).T + K_i@R_i@K_i.T # Update covariance (parameters NOT considered)
+        K_i = kalman_gain(P_i_minus, H_x_i, R_i)
+        P_i_plus = joseph_update(P_i_minus, K_i, H_x_i, R_i) # Update covariance (parameters NOT considered)
 
         S_xc_i_plus = (eye - K_i@H_x_i)@S_xc_i_minus - K_i@H_c_i
         P_cc_minus = P_c_i_minus[N:, N:]
@@ -1481,72 +2283,137 @@ class SequentialConsiderCovarianceFilter(FilterBase):
             self.logger.log(data) 
         return fail
 
+def systematic_resample(w, rng):
+    # one uniform draw, N evenly spaced points through the weight cdf
+    N = len(w)
+    cdf = np.cumsum(w)
+    cdf[-1] = 1.0
+    return np.searchsorted(cdf, (rng.random() + np.arange(N))/N)
+
+def stratified_resample(w, rng):
+    # one uniform draw in each of N equal strata of the weight cdf
+    N = len(w)
+    cdf = np.cumsum(w)
+    cdf[-1] = 1.0
+    return np.searchsorted(cdf, (rng.random(N) + np.arange(N))/N)
+
+def multinomial_resample(w, rng):
+    cdf = np.cumsum(w)
+    cdf[-1] = 1.0
+    return np.searchsorted(cdf, rng.random(len(w)))
+
+def residual_resample(w, rng):
+    # floor(N w) copies of each particle, the rest drawn from the residual
+    # weights
+    N = len(w)
+    counts = np.floor(N*w).astype(np.int64)
+    idx = np.repeat(np.arange(N), counts)
+    M = N - len(idx)
+    if M > 0:
+        w_res = N*w - counts
+        idx = np.hstack((idx, multinomial_resample(w_res/np.sum(w_res), rng)[:M]))
+    return idx
+
+RESAMPLING = {
+    "systematic" : systematic_resample,
+    "stratified" : stratified_resample,
+    "residual" : residual_resample,
+    "multinomial" : multinomial_resample,
+}
+
 class ParticleFilter(FilterBase):
-    def __init__(self, t0, x_0_k, f_dict, h_dict, logger=None, events=None):
+    """Bootstrap particle filter. The weights are kept as normalized log
+    weights and the particles are resampled (RESAMPLING scheme) once the
+    effective sample size drops below ess_threshold*N."""
+    def __init__(self, t0, x_0_k, f_dict, h_dict, logger=None, events=None, 
+                 resampling='systematic', ess_threshold=0.5, seed=None):
         super().__init__(f_dict, h_dict, logger, events)
 
+        self.f_integrate = f_dict.get('f_integrate', dynamics_ivp_particle_batch if self.batch else dynamics_ivp_particle)
+
         self.i = 0
         self.N = len(x_0_k)
 
+        self.resampling = RESAMPLING[resampling]
+        self.ess_threshold = ess_threshold
+        self.rng = np.random.default_rng(seed)
+
+        # evaluate Q at every particle, otherwise once per step at the
+        # weighted mean
+        self.Q_state_dependent = f_dict.get('Q_state_dependent', False)
+
         self.t_i_m1 = t0
         self.x_i_m1 = x_0_k
-        self.w_i_m1 = np.full((self.N,), 1.0/self.N)
+        self.log_w_i_m1 = np.full((self.N,), -np.log(self.N))
+
+    @property
+    def w_i_m1(self):
+        return np.exp(self.log_w_i_m1)
+
+    def effective_sample_size(self, log_w):
+        return 1.0/np.sum(np.exp(2.0*log_w))
         
     def propagate_forward(self, t_i, x_i_m1):
         N = len(x_i_m1)
         Z_i_m1 = x_i_m1.reshape((-1,))
-        sol = solve_ivp(dynamics_ivp_particle, [self.t_i_m1, t_i], Z_i_m1, args=(self.f, N, self.f_args), atol=self.atol, rtol=self.rtol, method='RK45')
+        sol = self.integrate(self.f_integrate, [self.t_i_m1, t_i], Z_i_m1, args=(self.f, N, self.f_args), method='RK45')
         x_i = sol.y[:,-1].reshape((N,-1))
         self.gather_event_data(t_i,sol)
 
         return x_i
 
-    def time_update(self, x_i, Q_i_i_m1):
-        v0 = np.array([0.0,0.0])
-        noise = np.random.multivariate_normal(v0, Q_i_i_m1, size=len(x_i))
-        x_i_minus = x_i + noise
-        return x_i_minus
+    def process_noise_sqrt(self, t_i, x_i):
+        """Lower triangular square root of Q for the particles x_i, (N, N)
+        from Q at the weighted mean or (K, N, N) if Q_state_dependent. Q is
+        evaluated and factored every step since it may depend on the state
+        through Q_fcn or Q_DCM (e.g. RIC frame noise)."""
+        if self.Q_state_dependent:
+            Q_i = self.evaluate_process_noise(t_i, x_i)
+            try:
+                return np.linalg.cholesky(Q_i)
+            except np.linalg.LinAlgError:
+                return np.array([cholesky_sqrt(Q) for Q in Q_i])
+        return cholesky_sqrt(self.get_process_noise(t_i, self.w_i_m1@x_i))
+
+    def time_update(self, x_i, S_i_i_m1):
+        # x + S z with z ~ N(0, I) drawn for all particles at once
+        if not np.any(S_i_i_m1):
+            return x_i
+        z = self.rng.standard_normal(x_i.shape)
+        if S_i_i_m1.ndim == 3:
+            return x_i + np.einsum('kij,kj->ki', S_i_i_m1, z)
+        return x_i + z@S_i_i_m1.T
 
     def process_observations(self, x_i, y_i):
-        M = getattr(y_i, '__len__', lambda:1)()
-        r_i = np.zeros((len(x_i), M))
-        for i in prange(len(r_i)):
-            r_i[i] = y_i - self.h(x_i[i], self.h_args)
-        return r_i
-
-    def measurement_update(self, R_i, r_i):
-        w_i_k = np.zeros((len(r_i)))
-        m = len(r_i[0])
-        R_half = np.linalg.det(R_i)**(1/2.0)
-        R_inv = np.linalg.inv(R_i)
-        coef = 1/((2*np.pi)**(m/2)*R_half)
-        for i in prange(len(r_i)):
-            r = r_i[i]
-            expo = -1/2*r.T@R_inv@r
-            w_i_k[i] = coef*np.exp(expo)
-        return w_i_k
+        return np.asarray(y_i, dtype=np.float64).reshape((1,-1)) - self.evaluate_h(x_i)
+
+    def measurement_update(self, log_w_i_m1, R_i, r_i):
+        # Gaussian log likelihood of each residual, then normalized with
+        # log-sum-exp so small likelihoods don't underflow
+        m = r_i.shape[1]
+        L = np.linalg.cholesky(np.atleast_2d(R_i))
+        z = solve_triangular(L, r_i.T, lower=True, check_finite=False)
+        log_lik = -0.5*np.sum(z**2, axis=0) - np.sum(np.log(np.diag(L))) - m/2.0*np.log(2*np.pi)
+        log_w = log_w_i_m1 + log_lik
+        return log_w - logsumexp(log_w)
     
-    def resample(self,x_i_k, w_i_k):
-        x_i_k_plus = np.zeros_like(x_i_k)
-        w_i_k = w_i_k/np.sum(w_i_k)
-        cdf = np.cumsum(w_i_k)
-        u_i_k = np.random.uniform(0,1,size=len(x_i_k))
-        for i in prange(len(x_i_k)):
-            k = np.where(cdf >= u_i_k[i])[0][0] 
-            x_i_k_plus[i] = copy.deepcopy(x_i_k[k])
-        w_i_k = 1/self.N
-        return x_i_k_plus, w_i_k
+    def resample(self, x_i_k, log_w_i_k):
+        idx = self.resampling(np.exp(log_w_i_k), self.rng)
+        return x_i_k[idx], np.full((len(x_i_k),), -np.log(len(x_i_k)))
 
     def get_logger_dict(self):
+        w = self.w_i_m1
+        x_mean = w@self.x_i_m1
+        sigma = np.sqrt(w@(self.x_i_m1 - x_mean)**2)
         logger_data = {
             "i" : self.i,
             "t_i" : self.t_i_m1,
-            "x_i" : np.mean(self.x_i_m1, axis=0),
+            "x_i" : x_mean,
 
-            "x_hat_i_plus" : np.mean(self.x_i_m1, axis=0),
+            "x_hat_i_plus" : x_mean,
             
-            "P_i_plus" : np.diag(np.std(self.x_i_m1,axis=0)**2),
-            "sigma_i" : np.std(self.x_i_m1,axis=0),
+            "P_i_plus" : np.diag(sigma**2),
+            "sigma_i" : sigma,
 
         }
         return logger_data
@@ -1559,20 +2426,20 @@ class ParticleFilter(FilterBase):
             self.h_args = h_args
 
         x_i = self.propagate_forward(t_i, self.x_i_m1)#self.phi_i_m1)
-        Q_i = self.get_process_noise(t_i, x_i[0]) 
-        x_i_minus = self.time_update(x_i, Q_i)
+        S_i = self.process_noise_sqrt(t_i, x_i)
+        x_i_minus = self.time_update(x_i, S_i)
 
-        if np.any(np.isnan(y_i)):
-            x_i_plus = x_i_minus
-        else:
+        x_i_plus, log_w_i_plus = x_i_minus, self.log_w_i_m1
+        if not np.any(np.isnan(y_i)):
             r_i = self.process_observations(x_i_minus, y_i)
-            w_i_minus = self.measurement_update(R_i, r_i)
-            x_i_plus, w_i_plus = self.resample(x_i_minus, w_i_minus)
+            log_w_i_plus = self.measurement_update(self.log_w_i_m1, R_i, r_i)
+            if self.effective_sample_size(log_w_i_plus) < self.ess_threshold*self.N:
+                x_i_plus, log_w_i_plus = self.resample(x_i_minus, log_w_i_plus)
 
         self.i += 1
         self.t_i_m1 = t_i
         self.x_i_m1 = x_i_plus
-        self.w_i_m1 = w_i_plus
+        self.log_w_i_m1 = log_w_i_plus
         
         if self.logger is not None:
             data = self.get_logger_dict()
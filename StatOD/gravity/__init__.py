@@ -0,0 +1,68 @@
+# Gravity model wrappers. Submodules are imported on first use so that
+# classical dynamics never pay for GravNN / tensorflow at import time.
+import importlib
+import numpy as np
+
+_lazy_attributes = {
+    "pinnGravityModel" : "StatOD.gravity.pinn",
+    "sphericalHarmonicModel" : "StatOD.gravity.spherical_harmonics",
+    "load_sh_coefficients" : "StatOD.gravity.spherical_harmonics",
+    "make_SH_dynamics" : "StatOD.gravity.spherical_harmonics",
+    "mlpGravityModel" : "StatOD.gravity.mlp",
+    "export_pinn" : "StatOD.gravity.mlp",
+    "make_PINN_DMC_dynamics" : "StatOD.gravity.mlp",
+    "gridGravityModel" : "StatOD.gravity.surrogate",
+}
+
+def __getattr__(name):
+    if name in _lazy_attributes:
+        module = importlib.import_module(_lazy_attributes[name])
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(list(globals().keys()) + list(_lazy_attributes.keys()))
+
+class memoizedGravityModel():
+    """Memo of the last evaluation of a gravity model, so the f / dfdx pair
+    of a dynamics rhs shares one model call.
+
+    Subclasses define _position(X) and _compute(R, order), which returns
+    (U, a, dadx) with dadx (and possibly U) set to None below order 2.
+    evaluate(X, order) reuses the memo when the position matches and the
+    memo is at least of the requested order, otherwise it evaluates the
+    model at that order.
+
+    model_acceleration() requests acceleration_order. It is 1 by default, so
+    f-only users (UKF, particle filter, plain integration) never pay for the
+    Hessian. Set it to 2 when dfdx follows f at the same state, e.g. the STM
+    propagation of the KF / EKF, so model_dadx() reuses the evaluation of f.
+    """
+    acceleration_order = 1
+
+    def reset_memo(self):
+        self.last_R = None
+        self.last_output = None
+        self.last_order = 0
+
+    def evaluate(self, X, order=2):
+        R = self._position(X)
+        if self.last_R is None or self.last_order < order or not np.array_equal(R, self.last_R):
+            self.last_output = self._compute(R, order)
+            self.last_order = order
+            self.last_R = R
+
+        # copies so callers can't modify the memoized values in place
+        return tuple(None if value is None else np.copy(value) for value in self.last_output)
+
+# Dynamics call these so memoizedGravityModels (e.g. pinnGravityModel)
+# share one evaluation between f and dfdx
+def model_acceleration(model, X):
+    if isinstance(model, memoizedGravityModel):
+        return model.evaluate(X, model.acceleration_order)[1]
+    return model.generate_acceleration(X)
+
+def model_dadx(model, X):
+    if isinstance(model, memoizedGravityModel):
+        return model.evaluate(X, 2)[2]
+    return model.generate_dadx(X)
@@ -0,0 +1,262 @@
+import math
+import numpy as np
+from numba import njit, prange
+from StatOD.gravity import memoizedGravityModel
+
+# Array backed evaluator for PINN gravity networks. The dense layers, the
+# scale layers, and the point mass add-back of a pinnGravityModel are
+# exported into flat arrays so the potential, acceleration (gradient), and
+# dadx (Hessian) can be computed in numba without TensorFlow. The
+# derivatives w.r.t. the 3 inputs are propagated in forward mode alongside
+# the activations.
+
+ACTIVATIONS = {
+    "linear" : 0,
+    "tanh" : 1,
+    "gelu" : 2,
+    "swish" : 3,
+    "silu" : 3,
+    "softplus" : 4,
+    "sin" : 5,
+}
+
+@njit(cache=True)
+def activation(code, z):
+    # returns sigma(z), sigma'(z), sigma''(z)
+    if code == 0:
+        return z, np.ones_like(z), np.zeros_like(z)
+    elif code == 1:
+        s = np.tanh(z)
+        ds = 1.0 - s**2
+        return s, ds, -2.0*s*ds
+    elif code == 2:
+        cdf = np.zeros_like(z)
+        for i in range(len(z)):
+            cdf[i] = 0.5*(1.0 + math.erf(z[i]/np.sqrt(2.0)))
+        pdf = np.exp(-0.5*z**2)/np.sqrt(2.0*np.pi)
+        return z*cdf, cdf + z*pdf, pdf*(2.0 - z**2)
+    elif code == 3:
+        sig = 1.0/(1.0 + np.exp(-z))
+        dsig = sig*(1.0 - sig)
+        return z*sig, sig + z*dsig, dsig*(2.0 + z*(1.0 - 2.0*sig))
+    elif code == 4:
+        sig = 1.0/(1.0 + np.exp(-z))
+        return np.log1p(np.exp(-np.abs(z))) + np.maximum(z, 0.0), sig, sig*(1.0 - sig)
+    else:
+        return np.sin(z), np.cos(z), -np.sin(z)
+
+@njit(cache=True)
+def mlp_forward(x, weights, biases, sizes, activations, order):
+    # Scalar network output and its first (order >= 1) and second
+    # (order >= 2) derivatives w.r.t. the inputs
+    D = sizes[0]
+    h = x.copy()
+    J = np.eye(D)
+    H = np.zeros((D, D*D))
+    w_idx = 0
+    b_idx = 0
+    for l in range(len(sizes) - 1):
+        n_in = sizes[l]
+        n_out = sizes[l+1]
+        W = weights[w_idx:w_idx + n_in*n_out].reshape((n_in, n_out))
+        b = biases[b_idx:b_idx + n_out]
+        w_idx += n_in*n_out
+        b_idx += n_out
+
+        z = h@W + b
+        Jz = W.T@J if order >= 1 else J
+        Hz = W.T@H if order >= 2 else H
+
+        s, ds, d2s = activation(activations[l], z)
+        h = s
+        if order >= 2:
+            H = np.zeros((n_out, D*D))
+            for i in range(n_out):
+                H[i] = d2s[i]*np.outer(Jz[i], Jz[i]).reshape((-1)) + ds[i]*Hz[i]
+        if order >= 1:
+            J = Jz*ds.reshape((-1,1))
+    return h[0], J[0], H[0].reshape((D, D))
+
+@njit(cache=True)
+def mlp_gravity(x, weights, biases, sizes, activations, constants, order):
+    """Non-dimensional potential, acceleration, and dadx at position x.
+
+    constants = [x_scale (3), x_offset (3), u_scale, u_offset, mu, removed_pm, l_star, t_star]
+    """
+    x_scale = constants[0:3]
+    x_offset = constants[3:6]
+    u_scale = constants[6]
+    u_offset = constants[7]
+    mu = constants[8]
+    removed_pm = constants[9]
+    l_star = constants[10]
+    t_star = constants[11]
+
+    R = x*l_star
+    U_n, dU_n, d2U_n = mlp_forward(R*x_scale + x_offset, weights, biases, sizes, activations, order)
+
+    # undo the scale layers; a = -grad(U)
+    U = (U_n - u_offset)/u_scale
+    a = -dU_n*x_scale/u_scale
+    dadx = -d2U_n*np.outer(x_scale, x_scale)/u_scale
+
+    if removed_pm != 0.0:
+        r = np.linalg.norm(R)
+        U += -mu/r
+        a += -mu*R/r**3
+        dadx += mu*(3.0*np.outer(R, R)/r**5 - np.eye(3)/r**3)
+
+    U_non_dim = U / (l_star**2/t_star**2)
+    a_non_dim = a / (l_star/t_star**2)
+    dadx_non_dim = dadx * t_star**2
+    return U_non_dim, a_non_dim, dadx_non_dim
+
+@njit(cache=True, parallel=True)
+def mlp_gravity_batch(R, weights, biases, sizes, activations, constants, order):
+    # mlp_gravity() for each row of R in one compiled call
+    U = np.zeros((len(R),))
+    a = np.zeros((len(R),3))
+    dadx = np.zeros((len(R),3,3))
+    for i in prange(len(R)):
+        U_i, a_i, dadx_i = mlp_gravity(R[i], weights, biases, sizes, activations, constants, order)
+        U[i] = U_i
+        a[i] = a_i
+        dadx[i] = dadx_i
+    return U, a, dadx
+
+class mlpGravityModel(memoizedGravityModel):
+    """Numba counterpart of pinnGravityModel built from exported arrays.
+
+    Exposes the same generate_* / evaluate interface, so it can replace the
+    TF model in the python dynamics, and make_PINN_DMC_dynamics() builds
+    fully compiled PINN-DMC dynamics from it.
+    """
+    def __init__(self, weights, biases, sizes, activations, constants):
+        self.weights = np.ascontiguousarray(weights, dtype=np.float64)
+        self.biases = np.ascontiguousarray(biases, dtype=np.float64)
+        self.sizes = np.ascontiguousarray(sizes, dtype=np.int64)
+        self.activations = np.ascontiguousarray(activations, dtype=np.int64)
+        self.constants = np.ascontiguousarray(constants, dtype=np.float64)
+        self.reset_memo()
+
+    @property
+    def params(self):
+        return (self.weights, self.biases, self.sizes, self.activations, self.constants)
+
+    def _position(self, X):
+        return np.array(X, dtype=np.float64).reshape((-1,3))
+
+    def _evaluate(self, X, order):
+        R = self._position(X)
+        U, a, dadx = mlp_gravity_batch(R, *self.params, order)
+        return U.squeeze(), a.squeeze(), dadx.squeeze()
+
+    def _compute(self, R, order):
+        U, a, dadx = self._evaluate(R, order)
+        return U, a, (dadx if order >= 2 else None)
+
+    def generate_potential(self, X):
+        return self._evaluate(X, 0)[0]
+
+    def generate_acceleration(self, X):
+        return self._evaluate(X, 1)[1]
+
+    def generate_dadx(self, X):
+        return self._evaluate(X, 2)[2]
+
+    def save(self, file_name):
+        np.savez(file_name,
+            weights=self.weights,
+            biases=self.biases,
+            sizes=self.sizes,
+            activations=self.activations,
+            constants=self.constants)
+
+    @classmethod
+    def load(cls, file_name):
+        data = np.load(file_name)
+        return cls(data['weights'], data['biases'], data['sizes'], data['activations'], data['constants'])
+
+
+def export_pinn(model):
+    """Export a (TF) pinnGravityModel into an mlpGravityModel.
+
+    Only plain dense networks are supported: every layer must either be an
+    input layer or have a kernel / bias, and the network must map the
+    3 position components to a scalar potential.
+    """
+    gravity_model = model.gravity_model
+    network = getattr(gravity_model, 'network', gravity_model)
+
+    weights = []
+    biases = []
+    sizes = [3]
+    activations = []
+    for layer in network.layers:
+        if not hasattr(layer, 'kernel'):
+            if len(layer.get_weights()) > 0:
+                raise TypeError(f"Can't export layer {layer.name} of type {type(layer).__name__}")
+            continue
+        kernel = layer.kernel.numpy()
+        bias = layer.bias.numpy() if layer.bias is not None else np.zeros(kernel.shape[1])
+        name = getattr(layer.activation, '__name__', 'linear')
+        if name not in ACTIVATIONS:
+            raise ValueError(f"Unsupported activation {name}")
+        weights.append(kernel.reshape((-1)))
+        biases.append(bias)
+        sizes.append(kernel.shape[1])
+        activations.append(ACTIVATIONS[name])
+    if sizes[-1] != 1:
+        raise ValueError("Network must output a scalar potential")
+
+    # pinnGravityModel builds its x / u scale layers with a zero offset
+    # (PreprocessingLayer(0, scale_)), regardless of the transformer min_
+    x_transformer = model.config['x_transformer'][0]
+    u_transformer = model.config['u_transformer'][0]
+    constants = np.hstack((
+        np.broadcast_to(x_transformer.scale_, (3,)),
+        np.zeros((3,)),
+        np.array(u_transformer.scale_).reshape((-1))[0],
+        0.0,
+        model.planet.mu,
+        float(model.removed_pm),
+        model.dim_constants['l_star'],
+        model.dim_constants['t_star'],
+    ))
+    return mlpGravityModel(np.hstack(weights), np.hstack(biases), sizes, activations, constants)
+
+
+def make_PINN_DMC_dynamics(model, zero_order=False):
+    """Compiled f / dfdx equivalent to f_PINN_DMC and dfdx_PINN_DMC (or
+    the _zero_order variants) for an mlpGravityModel.
+
+    The network is baked into the functions, so the dynamics arguments are
+    the float array [X_body (6), tau] (just X_body for zero_order) rather
+    than [model, X_body, tau].
+    """
+    weights, biases, sizes, activations, constants = model.params
+
+    @njit(cache=False)
+    def f(x, args):
+        X_body = args[0:6]
+        x_pos = x[0:3] - X_body[0:3]
+        x_vel = x[3:6] - X_body[3:6]
+        w_vec = x[6:9]
+        U, a, dadx = mlp_gravity(x_pos, weights, biases, sizes, activations, constants, 1)
+        w_d = np.zeros(3) if zero_order else -1.0/args[6]*w_vec
+        return np.hstack((x_vel, a + w_vec, w_d))
+
+    @njit(cache=False)
+    def dfdx(x, f, args):
+        X_body = args[0:6]
+        x_pos = x[0:3] - X_body[0:3]
+        U, a, dadx = mlp_gravity(x_pos, weights, biases, sizes, activations, constants, 2)
+        A = np.zeros((9,9))
+        A[0:3,3:6] = np.eye(3)
+        A[3:6,0:3] = dadx
+        A[3:6,6:9] = np.eye(3)
+        if not zero_order:
+            A[6:9,6:9] = -1.0/args[6]*np.eye(3)
+        return A
+
+    return f, dfdx
@@ -0,0 +1,182 @@
+from GravNN.Support.transformations import cart2sph, invert_projection
+from GravNN.Networks.Model import load_config_and_model
+from GravNN.Networks.Layers import PreprocessingLayer, PostprocessingLayer
+from GravNN.Networks.Data import generate_dataset
+from GravNN.Networks.utils import configure_optimizer, _get_PI_constraint
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+from StatOD.gravity import memoizedGravityModel
+
+class pinnGravityModel(memoizedGravityModel):
+    def __init__(self, df_file, custom_data_dir="", learning_rate=None, dim_constants=None):
+
+        # tf.keras.mixed_precision.Policy("float64")
+        df = pd.read_pickle(custom_data_dir + df_file)
+        config, gravity_model = load_config_and_model(df.iloc[-1]['id'], df)
+        self.config = config
+        self.gravity_model = gravity_model
+        self.planet = config['planet'][0]
+        if learning_rate is not None:
+            self.config['learning_rate'][0] = learning_rate
+        self.optimizer = configure_optimizer(self.config, None)
+        if dim_constants is None:
+            self.dim_constants = {
+                "m_star" : 1.0,
+                "t_star" : 1.0,
+                "l_star" : 1.0,
+            }
+        else:
+            self.dim_constants = dim_constants
+
+        removed_pm = config.get('remove_point_mass', [False])[0]
+        deg_removed = config.get('deg_removed', [-1])[0]
+        if removed_pm or deg_removed > -1:
+            self.removed_pm = True
+        else:
+            self.removed_pm = False
+
+        # configure preprocessing layers
+        x_transformer = config['x_transformer'][0]
+        u_transformer = config['u_transformer'][0]
+        a_transformer = config['a_transformer'][0]
+
+        # # TODO: Fix this, it's very counter intuitive. 
+        # x_preprocessor = PostprocessingLayer(0, x_transformer.scale_, tf.float64) # normalizing layer
+        # u_postprocessor = PreprocessingLayer(0, u_transformer.scale_, tf.float64) # unnormalize layer
+        # a_preprocessor = PostprocessingLayer(0, a_transformer.scale_, tf.float64) # normalizing layer
+        # a_postprocessor = PreprocessingLayer(0, a_transformer.scale_, tf.float64) # unormalizing layer
+
+        # TODO: Fix this, it's very counter intuitive. 
+        x_preprocessor = PreprocessingLayer(0, x_transformer.scale_, tf.float64) # normalizing layer
+        u_postprocessor = PostprocessingLayer(0, u_transformer.scale_, tf.float64) # unnormalize layer
+        a_preprocessor = PreprocessingLayer(0, a_transformer.scale_, tf.float64) # normalizing layer
+        a_postprocessor = PostprocessingLayer(0, a_transformer.scale_, tf.float64) # unormalizing layer
+
+        self.gravity_model.x_preprocessor = x_preprocessor
+        self.gravity_model.u_postprocessor = u_postprocessor
+        self.gravity_model.a_preprocessor = a_preprocessor
+        self.gravity_model.a_postprocessor = a_postprocessor
+
+        self.evaluate_fcn = None
+        self.acceleration_fcn = None
+        self.reset_memo()
+
+    def _position(self, X):
+        X_dim = X*self.dim_constants['l_star']
+        return np.array(X_dim).reshape((-1,3)).astype(np.float64)
+
+    def _acceleration(self, R, a_model):
+        # a_model is currently a_r > 0
+        if not self.removed_pm:
+            a_model = a_model.squeeze()
+        else:
+            r = np.linalg.norm(R, axis=1)
+            a_pm_sph = np.zeros((len(R), 3))
+            a_pm_sph[:,0] = -self.planet.mu/r**2
+            r_sph = cart2sph(R)
+            a_pm_xyz = invert_projection(r_sph, a_pm_sph)
+            a_model = (a_pm_xyz + a_model).squeeze() # a_r < 0
+
+        a_non_dim = a_model / (self.dim_constants['l_star'] / self.dim_constants['t_star']**2)
+        return a_non_dim
+
+    def _dadx(self, dadx_dim):
+        dadx_non_dim = dadx_dim / (1.0 / self.dim_constants['t_star']**2)
+        return dadx_non_dim.squeeze()
+
+    def _potential(self, R, U_model):
+        if not self.removed_pm:
+            U_model = U_model.squeeze()
+        else:
+            r = np.linalg.norm(R, axis=1)
+            U_pm = np.zeros((len(R), 1))
+            U_pm[:,0] = -self.planet.mu/r
+            U_model = (U_pm + U_model).squeeze()
+
+        U_model_non_dim = U_model / (self.dim_constants['l_star']**2/ self.dim_constants['t_star']**2)
+        return U_model_non_dim
+
+    def generate_acceleration(self, X):
+        R = self._position(X)
+        a_model = self.gravity_model.generate_acceleration(R).numpy() # this is currently a_r > 0
+        return self._acceleration(R, a_model)
+
+    def generate_dadx(self, X):
+        R = self._position(X)
+        dadx_dim = self.gravity_model.generate_dU_dxdx(R).numpy() # this is also > 0
+        return self._dadx(dadx_dim)
+
+    def generate_potential(self, X):
+        R = self._position(X)
+        U_model = self.gravity_model.generate_potential(R).numpy() # this is also > 0
+        return self._potential(R, U_model)
+
+    def _build_evaluate_fcn(self):
+        # One graph for all three quantities with a fixed signature so
+        # it is only traced once regardless of the batch size
+        @tf.function(input_signature=[tf.TensorSpec(shape=[None, 3], dtype=tf.float64)])
+        def evaluate_fcn(R):
+            U = self.gravity_model.generate_potential(R)
+            a = self.gravity_model.generate_acceleration(R)
+            dadx = self.gravity_model.generate_dU_dxdx(R)
+            return U, a, dadx
+        return evaluate_fcn
+
+    def _build_acceleration_fcn(self):
+        # Acceleration only graph for the f-only callers, which never
+        # need the Hessian
+        @tf.function(input_signature=[tf.TensorSpec(shape=[None, 3], dtype=tf.float64)])
+        def acceleration_fcn(R):
+            return self.gravity_model.generate_acceleration(R)
+        return acceleration_fcn
+
+    def _compute(self, R, order):
+        if order < 2:
+            if self.acceleration_fcn is None:
+                self.acceleration_fcn = self._build_acceleration_fcn()
+            a_model = self.acceleration_fcn(tf.constant(R))
+            return None, self._acceleration(R, a_model.numpy()), None
+
+        if self.evaluate_fcn is None:
+            self.evaluate_fcn = self._build_evaluate_fcn()
+        U_model, a_model, dadx_dim = self.evaluate_fcn(tf.constant(R))
+        U = self._potential(R, U_model.numpy())
+        a = self._acceleration(R, a_model.numpy())
+        dadx = self._dadx(dadx_dim.numpy())
+        return U, a, dadx
+
+    def set_PINN_training_fcn(self, PINN_constraint_fcn):
+        PINN_variables = _get_PI_constraint(PINN_constraint_fcn)
+        self.gravity_model.eval = PINN_variables[0]
+        self.gravity_model.scale_loss = PINN_variables[1]
+        self.gravity_model.adaptive_constant = tf.Variable(PINN_variables[2], dtype=self.config['dtype'][0])
+        self.config['PINN_constraint_fcn'] = [PINN_constraint_fcn]
+        self.reset_memo()
+
+    def train(self, X, Y, **kwargs):
+        # Make sure Y_DMC has the gravity model accelerations added to it 
+        # tf.config.run_functions_eagerly(True)
+        X_dim = X*(self.dim_constants['l_star'])
+        A_dim = Y*(self.dim_constants['l_star'] / self.dim_constants['t_star']**2)
+        X_process = self.gravity_model.x_preprocessor(X_dim).numpy()
+        Y_process = self.gravity_model.a_preprocessor(A_dim).numpy()
+        if self.config['PINN_constraint_fcn'][0] == "pinn_alc":
+            Y_LC = np.full((len(Y_process), 4), 0.0)
+            Y_process = np.hstack((Y_process, Y_LC))
+
+        batch_size = kwargs.get("batch_size", 32)
+        dataset = generate_dataset(X_process, Y_process, batch_size, dtype=self.config['dtype'][0])
+        dataset.shuffle(buffer_size=batch_size)
+        self.gravity_model.compile(optimizer=self.optimizer, loss='mse')
+        self.gravity_model.fit(
+            dataset,
+            batch_size=batch_size,
+            epochs=kwargs.get("epochs", 5),
+            use_multiprocessing=True,
+        )
+        self.reset_memo() # weights changed
+
+    def save(self, df_file, data_dir):
+        # save the network and config data using PINN-GM API
+        self.gravity_model.save(df_file, data_dir)
@@ -0,0 +1,274 @@
+import math
+import numpy as np
+from numba import njit, prange
+
+# Numeric spherical harmonic gravity for arbitrary degree / order using the
+# fully normalized Cunningham (V_nm, W_nm) recursion. Derivatives of the
+# V_nm / W_nm terms are linear combinations of the degree n+1 terms, so the
+# gradient and Hessian of the potential are precomputed as coefficient
+# arrays ("pushed" coefficients) and every evaluation is one recursion to
+# degree N+2 followed by dot products.
+
+# layout of the pushed coefficient stack
+POTENTIAL = 0
+GRADIENT = (1, 2, 3)
+HESSIAN = ((4, 5, 6), (5, 7, 8), (6, 8, 9))
+
+@njit(cache=True)
+def log_norm(n, m):
+    # log of N_nm, where C_nm = N_nm * C_bar_nm
+    delta = 1.0 if m == 0 else 2.0
+    return 0.5*(math.log(delta*(2*n + 1)) + math.lgamma(n - m + 1) - math.lgamma(n + m + 1))
+
+@njit(cache=True)
+def norm_ratio(n, m, k, l):
+    # N_nm / N_kl
+    return math.exp(log_norm(n, m) - log_norm(k, l))
+
+@njit(cache=True)
+def recursion_coefficients(L):
+    # Normalized Cunningham recursion coefficients up to degree L, indexed
+    # [m, n] like cunningham():
+    # V_mm = s_m (x V_m-1,m-1 - y W_m-1,m-1) R/r^2
+    # V_nm = a_nm z R/r^2 V_n-1,m - b_nm R^2/r^2 V_n-2,m
+    a = np.zeros((L+1, L+1))
+    b = np.zeros((L+1, L+1))
+    s = np.zeros((L+1,))
+    for m in range(1, L+1):
+        s[m] = (2*m - 1)*norm_ratio(m, m, m-1, m-1)
+    for m in range(L+1):
+        for n in range(m+1, L+1):
+            a[m,n] = (2*n - 1)/(n - m)*norm_ratio(n, m, n-1, m)
+            if n - 2 >= m:
+                b[m,n] = (n + m - 1)/(n - m)*norm_ratio(n, m, n-2, m)
+    return a, b, s
+
+@njit(cache=True)
+def push_coefficients(C, S, axis):
+    # Coefficients of d/d(axis) of sum(C V + S W), in units of 1/R, on the
+    # basis of one degree higher
+    L = C.shape[0] - 1
+    C_d = np.zeros((L+2, L+2))
+    S_d = np.zeros((L+2, L+2))
+    for n in range(L+1):
+        for m in range(n+1):
+            c = C[n,m]
+            s = S[n,m] if m > 0 else 0.0
+            if c == 0.0 and s == 0.0:
+                continue
+            if axis == 2:
+                k = -(n - m + 1)*norm_ratio(n, m, n+1, m)
+                C_d[n+1,m] += k*c
+                S_d[n+1,m] += k*s
+                continue
+            if m == 0:
+                k = -norm_ratio(n, 0, n+1, 1)
+                if axis == 0:
+                    C_d[n+1,1] += k*c
+                else:
+                    S_d[n+1,1] += k*c
+                continue
+            k_up = 0.5*norm_ratio(n, m, n+1, m+1)
+            k_down = 0.5*(n - m + 2)*(n - m + 1)*norm_ratio(n, m, n+1, m-1)
+            if axis == 0:
+                C_d[n+1,m+1] -= k_up*c
+                S_d[n+1,m+1] -= k_up*s
+                C_d[n+1,m-1] += k_down*c
+                S_d[n+1,m-1] += k_down*s
+            else:
+                S_d[n+1,m+1] -= k_up*c
+                C_d[n+1,m+1] += k_up*s
+                S_d[n+1,m-1] -= k_down*c
+                C_d[n+1,m-1] += k_down*s
+    # W_n0 = 0
+    S_d[:,0] = 0.0
+    return C_d, S_d
+
+def stack_coefficients(C, S):
+    """Potential, gradient, and Hessian coefficients of (C_bar, S_bar),
+    zero padded to degree N+2 and indexed [m, n, k] (see cunningham() and
+    the layout constants above)"""
+    L = C.shape[0] - 1
+    C_stack = np.zeros((10, L+3, L+3))
+    S_stack = np.zeros((10, L+3, L+3))
+    C_stack[POTENTIAL,:L+1,:L+1] = C
+    S_stack[POTENTIAL,:L+1,:L+1] = S
+    for i in range(3):
+        C_i, S_i = push_coefficients(C, S, i)
+        C_stack[GRADIENT[i],:L+2,:L+2] = C_i
+        S_stack[GRADIENT[i],:L+2,:L+2] = S_i
+        for j in range(i, 3):
+            C_ij, S_ij = push_coefficients(C_i, S_i, j)
+            C_stack[HESSIAN[i][j]] = C_ij
+            S_stack[HESSIAN[i][j]] = S_ij
+    return np.ascontiguousarray(C_stack.transpose((2,1,0))), np.ascontiguousarray(S_stack.transpose((2,1,0)))
+
+@njit(cache=True)
+def cunningham(x, R, L, a, b, s):
+    # Normalized V_nm, W_nm up to degree L at position x. Arrays are indexed
+    # [m, n] so the column recursion over n runs over contiguous memory.
+    r2 = x[0]**2 + x[1]**2 + x[2]**2
+    rho = R/r2
+    x0 = x[0]*rho
+    y0 = x[1]*rho
+    z0 = x[2]*rho
+    rho2 = R*rho
+    V = np.zeros((L+1, L+1))
+    W = np.zeros((L+1, L+1))
+    V[0,0] = R/np.sqrt(r2)
+    for m in range(L+1):
+        if m > 0:
+            V[m,m] = s[m]*(x0*V[m-1,m-1] - y0*W[m-1,m-1])
+            W[m,m] = s[m]*(x0*W[m-1,m-1] + y0*V[m-1,m-1])
+        if m < L:
+            V[m,m+1] = a[m,m+1]*z0*V[m,m]
+            W[m,m+1] = a[m,m+1]*z0*W[m,m]
+        for n in range(m+2, L+1):
+            V[m,n] = a[m,n]*z0*V[m,n-1] - b[m,n]*rho2*V[m,n-2]
+            W[m,n] = a[m,n]*z0*W[m,n-1] - b[m,n]*rho2*W[m,n-2]
+    return V, W
+
+@njit(cache=True)
+def sh_gravity(x, R, mu, C_stack, S_stack, a, b, s, order):
+    """Potential, acceleration, and dadx at the body fixed position x.
+
+    Only the terms up to order (0, 1, or 2) are evaluated, the others are
+    returned as zeros.
+    """
+    N = C_stack.shape[0] - 3
+    L = N + order
+    V, W = cunningham(x, R, L, a, b, s)
+    # one pass over V, W accumulates every term
+    terms = np.zeros((10,))
+    for m in range(L+1):
+        for n in range(m, L+1):
+            v = V[m,n]
+            w = W[m,n]
+            if order == 0:
+                terms[0] += C_stack[m,n,0]*v + S_stack[m,n,0]*w
+            elif order == 1:
+                for k in range(4):
+                    terms[k] += C_stack[m,n,k]*v + S_stack[m,n,k]*w
+            else:
+                for k in range(10):
+                    terms[k] += C_stack[m,n,k]*v + S_stack[m,n,k]*w
+
+    k = mu/R
+    U = -k*terms[POTENTIAL]
+    acc = np.zeros((3,))
+    dadx = np.zeros((3,3))
+    if order >= 1:
+        for i in range(3):
+            acc[i] = k/R*terms[GRADIENT[i]]
+    if order >= 2:
+        for i in range(3):
+            for j in range(3):
+                dadx[i,j] = k/R**2*terms[HESSIAN[i][j]]
+    return U, acc, dadx
+
+@njit(cache=True, parallel=True)
+def sh_gravity_batch(R_batch, R, mu, C_stack, S_stack, a, b, s, order):
+    # sh_gravity() for each row of R_batch in one compiled call
+    U = np.zeros((len(R_batch),))
+    acc = np.zeros((len(R_batch),3))
+    dadx = np.zeros((len(R_batch),3,3))
+    for i in prange(len(R_batch)):
+        U_i, acc_i, dadx_i = sh_gravity(R_batch[i], R, mu, C_stack, S_stack, a, b, s, order)
+        U[i] = U_i
+        acc[i] = acc_i
+        dadx[i] = dadx_i
+    return U, acc, dadx
+
+def load_sh_coefficients(file_name, max_deg=None):
+    """Read a GravNN style coefficient csv (e.g. SH_Eros_model.csv): a header
+    row holding R and mu followed by rows of n, m, C_bar, S_bar"""
+    with open(file_name) as f:
+        header = f.readline()
+    R, mu = [float(value) for value in header.split(",")[:2]]
+    data = np.atleast_2d(np.loadtxt(file_name, delimiter=",", skiprows=1))
+    n = data[:,0].astype(int)
+    m = data[:,1].astype(int)
+    N = np.max(n) if max_deg is None else max_deg
+    C = np.zeros((N+1, N+1))
+    S = np.zeros((N+1, N+1))
+    mask = n <= N
+    C[n[mask], m[mask]] = data[mask,2]
+    S[n[mask], m[mask]] = data[mask,3]
+    return R, mu, C, S
+
+def gravnn_coefficients(model):
+    """(R, mu, C_bar, S_bar) of a GravNN SphericalHarmonics object"""
+    try:
+        return model.radEquator, model.mu, model.C_lm, model.S_lm
+    except AttributeError:
+        raise TypeError(f"Unsupported spherical harmonic model {type(model).__name__}, "
+            "expected a coefficient file, an (R, mu, C, S) tuple, or a GravNN SphericalHarmonics object") from None
+
+
+class sphericalHarmonicModel():
+    """Spherical harmonic gravity model.
+
+    model is either a coefficient csv file (see load_sh_coefficients), a
+    tuple (R, mu, C_bar, S_bar) of fully normalized coefficients, or a
+    GravNN SphericalHarmonics object whose coefficients are copied.
+    """
+    def __init__(self, model, max_deg=None):
+        if isinstance(model, str):
+            model = load_sh_coefficients(model, max_deg)
+        if not isinstance(model, tuple):
+            model = gravnn_coefficients(model)
+
+        R, mu, C, S = model
+        C = np.array(C, dtype=np.float64)
+        S = np.array(S, dtype=np.float64)
+        if max_deg is not None:
+            C = C[:max_deg+1,:max_deg+1]
+            S = S[:max_deg+1,:max_deg+1]
+        self.R = float(R)
+        self.mu = float(mu)
+        self.C = C
+        self.S = S
+        self.C_stack, self.S_stack = stack_coefficients(C, S)
+        self.a, self.b, self.s = recursion_coefficients(C.shape[0] + 1)
+
+    @property
+    def params(self):
+        return (self.R, self.mu, self.C_stack, self.S_stack, self.a, self.b, self.s)
+
+    def _evaluate(self, X, order):
+        R = np.ascontiguousarray(np.reshape(X, (-1,3)), dtype=np.float64)
+        U, a, dadx = sh_gravity_batch(R, *self.params, order)
+        return U.squeeze(), a.squeeze(), dadx.squeeze()
+
+    def generate_acceleration(self, X):
+        return self._evaluate(X, 1)[1]
+
+    def generate_potential(self, X):
+        return self._evaluate(X, 0)[0]
+
+    def generate_dadx(self, X):
+        return self._evaluate(X, 2)[2]
+
+
+def make_SH_dynamics(model):
+    """Compiled f / dfdx of the body fixed cartesian state [r, v] (like
+    f_C22, but any degree) for a coefficient based sphericalHarmonicModel.
+
+    The coefficients are baked into the functions, args are unused.
+    """
+    params = model.params
+
+    @njit(cache=False)
+    def f(x, args):
+        U, a, dadx = sh_gravity(x[0:3], *params, 1)
+        return np.hstack((x[3:6], a))
+
+    @njit(cache=False)
+    def dfdx(x, f, args):
+        U, a, dadx = sh_gravity(x[0:3], *params, 2)
+        A = np.zeros((6,6))
+        A[0:3,3:6] = np.eye(3)
+        A[3:6,0:3] = dadx
+        return A
+
+    return f, dfdx
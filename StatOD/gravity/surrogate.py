@@ -0,0 +1,201 @@
+import warnings
+import numpy as np
+from numba import njit
+
+# Gravity surrogate on a regular cartesian grid. Each acceleration
+# component is stored at the nodes with its first derivatives (the model's
+# dadx) and the mixed derivatives (finite differences of dadx), which is
+# exactly what a tricubic Hermite interpolant needs. dadx of the surrogate
+# is the analytic derivative of the interpolated acceleration, so the pair
+# stays consistent inside the filters.
+
+# order of the derivatives stored per component, as (d/dx, d/dy, d/dz) flags
+DERIVATIVES = np.array([
+    [0,0,0],
+    [1,0,0],
+    [0,1,0],
+    [0,0,1],
+    [1,1,0],
+    [1,0,1],
+    [0,1,1],
+    [1,1,1],
+])
+
+@njit(cache=True)
+def hermite_weights(t, h):
+    # W[c, d]: weight of corner c (0 = lower, 1 = upper) for the value (d = 0)
+    # or the derivative (d = 1) along one axis; dW = d/dx of W
+    t2 = t*t
+    t3 = t2*t
+    W = np.empty((2,2))
+    dW = np.empty((2,2))
+    W[0,0] = 2*t3 - 3*t2 + 1
+    W[0,1] = (t3 - 2*t2 + t)*h
+    W[1,0] = -2*t3 + 3*t2
+    W[1,1] = (t3 - t2)*h
+    dW[0,0] = (6*t2 - 6*t)/h
+    dW[0,1] = 3*t2 - 4*t + 1
+    dW[1,0] = (-6*t2 + 6*t)/h
+    dW[1,1] = 3*t2 - 2*t
+    return W, dW
+
+@njit(cache=True)
+def grid_interpolate(X, lower, spacing, coefficients, derivatives, order):
+    # Returns the interpolated accelerations (M,3), their jacobians (M,3,3)
+    # if order > 1, and a mask of the points that were inside the grid
+    M = len(X)
+    shape = coefficients.shape
+    a = np.zeros((M,3))
+    dadx = np.zeros((M,3,3))
+    inside = np.ones((M,), dtype=np.bool_)
+    for m in range(M):
+        idx = np.zeros(3, dtype=np.int64)
+        Ws = np.zeros((3,2,2))
+        dWs = np.zeros((3,2,2))
+        for k in range(3):
+            u = (X[m,k] - lower[k]) / spacing[k]
+            if u < 0.0 or u > shape[k] - 1:
+                inside[m] = False
+            i = min(max(int(np.floor(u)), 0), shape[k] - 2)
+            idx[k] = i
+            W, dW = hermite_weights(u - i, spacing[k])
+            Ws[k] = W
+            dWs[k] = dW
+        if not inside[m]:
+            continue
+
+        for cx in range(2):
+            for cy in range(2):
+                for cz in range(2):
+                    node = coefficients[idx[0]+cx, idx[1]+cy, idx[2]+cz]
+                    for q in range(len(derivatives)):
+                        dx = derivatives[q,0]
+                        dy = derivatives[q,1]
+                        dz = derivatives[q,2]
+                        wx = Ws[0,cx,dx]
+                        wy = Ws[1,cy,dy]
+                        wz = Ws[2,cz,dz]
+                        w = wx*wy*wz
+                        for i in range(3):
+                            a[m,i] += w*node[i,q]
+                        if order > 1:
+                            gx = dWs[0,cx,dx]*wy*wz
+                            gy = wx*dWs[1,cy,dy]*wz
+                            gz = wx*wy*dWs[2,cz,dz]
+                            for i in range(3):
+                                dadx[m,i,0] += gx*node[i,q]
+                                dadx[m,i,1] += gy*node[i,q]
+                                dadx[m,i,2] += gz*node[i,q]
+    return a, dadx, inside
+
+
+class gridGravityModel():
+    """Tricubic Hermite surrogate of a gravity model over a box.
+
+    Build with gridGravityModel.build(model, bounds, tol=...) from any model
+    exposing generate_acceleration / generate_dadx, persist with save() /
+    load(). Points outside the box are passed to the fallback model, if one
+    is set, otherwise a ValueError is raised.
+    """
+    def __init__(self, lower, spacing, coefficients, fallback=None):
+        self.lower = np.asarray(lower, dtype=np.float64)
+        self.spacing = np.asarray(spacing, dtype=np.float64)
+        self.coefficients = np.ascontiguousarray(coefficients, dtype=np.float64)
+        self.fallback = fallback
+
+    @property
+    def upper(self):
+        return self.lower + self.spacing*(np.array(self.coefficients.shape[:3]) - 1)
+
+    @classmethod
+    def from_model(cls, model, bounds, N, fallback=None, batch_size=4096):
+        bounds = np.asarray(bounds, dtype=np.float64)
+        N = np.broadcast_to(N, (3,)).astype(int)
+        axes = [np.linspace(bounds[k,0], bounds[k,1], N[k]) for k in range(3)]
+        spacing = np.array([axis[1] - axis[0] for axis in axes])
+        X = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape((-1,3))
+
+        a = np.zeros((len(X),3))
+        dadx = np.zeros((len(X),3,3))
+        for i in range(0, len(X), batch_size):
+            X_batch = X[i:i+batch_size]
+            a[i:i+batch_size] = np.reshape(model.generate_acceleration(X_batch), (-1,3))
+            dadx[i:i+batch_size] = np.reshape(model.generate_dadx(X_batch), (-1,3,3))
+        a = a.reshape(tuple(N) + (3,))
+        dadx = dadx.reshape(tuple(N) + (3,3))
+
+        # singular nodes (e.g. the origin for point mass terms) are inside
+        # the body; zero them so they don't spread NaNs through the FDs
+        a[~np.isfinite(a)] = 0.0
+        dadx[~np.isfinite(dadx)] = 0.0
+
+        # mixed derivatives of each component from finite differences of
+        # dadx, averaged over the two possible orderings
+        def d(values, axis):
+            return np.gradient(values, spacing[axis], axis=axis, edge_order=2)
+        a_xy = 0.5*(d(dadx[...,0], 1) + d(dadx[...,1], 0))
+        a_xz = 0.5*(d(dadx[...,0], 2) + d(dadx[...,2], 0))
+        a_yz = 0.5*(d(dadx[...,1], 2) + d(dadx[...,2], 1))
+        a_xyz = (d(a_xy, 2) + d(a_xz, 1) + d(a_yz, 0))/3.0
+
+        coefficients = np.stack([
+            a, dadx[...,0], dadx[...,1], dadx[...,2], a_xy, a_xz, a_yz, a_xyz
+            ], axis=-1)
+        return cls(bounds[:,0], spacing, coefficients, fallback)
+
+    @classmethod
+    def build(cls, model, bounds, tol=1E-4, N=9, max_N=65, r_min=0.0, test_points=1000, seed=0, verbose=False):
+        """Refine the grid (halving the spacing) until the max relative
+        acceleration error at random test points with |x| > r_min is below
+        tol, or the grid reaches max_N nodes per axis. Each node stores 24
+        doubles, so max_N = 65 is about 50 MB of coefficients and the next
+        refinement (129) about 400 MB. A warning is issued if tol isn't
+        met; the achieved error is kept in surrogate.error."""
+        bounds = np.asarray(bounds, dtype=np.float64)
+        rng = np.random.default_rng(seed)
+        X_test = np.zeros((0,3))
+        while len(X_test) < test_points:
+            X_sample = rng.uniform(bounds[:,0], bounds[:,1], size=(test_points,3))
+            X_test = np.vstack((X_test, X_sample[np.linalg.norm(X_sample, axis=1) > r_min]))
+        X_test = X_test[:test_points]
+        a_test = np.reshape(model.generate_acceleration(X_test), (-1,3))
+
+        while True:
+            surrogate = cls.from_model(model, bounds, N, fallback=model)
+            a_surrogate = surrogate.generate_acceleration(X_test).reshape((-1,3))
+            error = np.max(np.linalg.norm(a_surrogate - a_test, axis=1) / np.linalg.norm(a_test, axis=1))
+            surrogate.error = error
+            if verbose:
+                print(f"N = {N}: max relative error {error:.3e}")
+            if error <= tol:
+                return surrogate
+            if 2*N - 1 > max_N:
+                warnings.warn(f"Gravity surrogate error {error:.3e} above tol = {tol:.3e} at the maximum of {N} nodes per axis")
+                return surrogate
+            N = 2*N - 1
+
+    def _interpolate(self, X, order):
+        X = np.array(X, dtype=np.float64).reshape((-1,3))
+        a, dadx, inside = grid_interpolate(X, self.lower, self.spacing, self.coefficients, DERIVATIVES, order)
+        if not np.all(inside):
+            if self.fallback is None:
+                raise ValueError("Position outside of the gravity surrogate bounds")
+            outside = ~inside
+            a[outside] = np.reshape(self.fallback.generate_acceleration(X[outside]), (-1,3))
+            if order > 1:
+                dadx[outside] = np.reshape(self.fallback.generate_dadx(X[outside]), (-1,3,3))
+        return a, dadx
+
+    def generate_acceleration(self, X):
+        return self._interpolate(X, 1)[0].squeeze()
+
+    def generate_dadx(self, X):
+        return self._interpolate(X, 2)[1].squeeze()
+
+    def save(self, file_name):
+        np.savez(file_name, lower=self.lower, spacing=self.spacing, coefficients=self.coefficients)
+
+    @classmethod
+    def load(cls, file_name, fallback=None):
+        data = np.load(file_name)
+        return cls(data['lower'], data['spacing'], data['coefficients'], fallback)
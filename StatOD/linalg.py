@@ -0,0 +1,262 @@
+import numpy as np
+from numba import njit
+from scipy.linalg import LinAlgError, cho_factor, cho_solve, qr, solve_triangular
+
+# Linear algebra shared by the filters. Innovation / covariance matrices are
+# symmetric positive definite, so systems are solved with a Cholesky
+# factorization instead of forming inverses. A general (LU) solve is only
+# used when the factorization fails, e.g. for a matrix that lost
+# definiteness to round off.
+
+def cholesky_factor(A):
+    """Cholesky factorization of A for spd_solve(), None if A isn't
+    positive definite"""
+    try:
+        return cho_factor(A, lower=True, check_finite=False)
+    except LinAlgError:
+        return None
+
+def spd_solve(A, B, factor=None):
+    """Solve A X = B for a symmetric positive definite A, reusing factor
+    (from cholesky_factor()) if given"""
+    if factor is None:
+        factor = cholesky_factor(A)
+    if factor is not None:
+        X = cho_solve(factor, B, check_finite=False)
+        if np.all(np.isfinite(X)):
+            return X
+    try:
+        return np.linalg.solve(A, B)
+    except np.linalg.LinAlgError:
+        return np.linalg.lstsq(A, B, rcond=None)[0]
+
+def kalman_gain(P, H, R):
+    """K = P H^T (H P H^T + R)^-1 from a Cholesky solve with the innovation
+    covariance"""
+    PHt = P@H.T
+    S = H@PHt + R
+    return spd_solve(S, PHt.T).T # S symmetric
+
+def batch_kalman_gain(P, H, R):
+    """kalman_gain() of K filters, (K, N, M) from P (K, N, N), H (K, M, N)
+    and a shared (M, M) or per filter (K, M, M) R, with a batched Cholesky
+    factorization of the innovation covariances"""
+    PHt = P@np.swapaxes(H, 1, 2)
+    S = H@PHt + R
+    try:
+        L = np.linalg.cholesky(S)
+    except np.linalg.LinAlgError:
+        return np.array([spd_solve(S[k], PHt[k].T).T for k in range(len(S))])
+    K_T = batch_cholesky_substitution(L, np.ascontiguousarray(np.swapaxes(PHt, 1, 2)))
+    return np.swapaxes(K_T, 1, 2)
+
+def joseph_update(P, K, H, R):
+    """Joseph form covariance update (I - K H) P (I - K H)^T + K R K^T"""
+    G = np.eye(len(P)) - K@H
+    return G@P@G.T + K@R@K.T
+
+def tria(A):
+    """Lower triangular L with L L^T = A A^T (from the QR of A^T), with a
+    non-negative diagonal"""
+    N = len(A)
+    R = qr(A.T, mode='r', check_finite=False)[0][:N]
+    L = np.zeros((N,N))
+    L[:len(R)] = R
+    L = L.T
+    signs = np.where(np.diag(L) < 0.0, -1.0, 1.0)
+    return L*signs
+
+def cholesky_sqrt(A):
+    """Lower triangular square root of a symmetric positive semi-definite A,
+    through its eigendecomposition if A is singular (e.g. process noise)"""
+    if not np.any(A):
+        return np.zeros_like(A)
+    try:
+        return np.linalg.cholesky(A)
+    except np.linalg.LinAlgError:
+        W, V = np.linalg.eigh(A)
+        return tria(V*np.sqrt(np.clip(W, 0.0, None)))
+
+@njit(cache=True)
+def cholupdate(L, X, sign):
+    # L L^T + sign X X^T (sign = 1 update, -1 downdate) as rank one
+    # rotations of the lower triangular L, one per column of X. Returns
+    # False if a downdate leaves the matrix indefinite.
+    N = len(L)
+    L = L.copy()
+    for m in range(X.shape[1]):
+        x = X[:,m].copy()
+        for k in range(N):
+            r2 = L[k,k]**2 + sign*x[k]**2
+            if r2 < 0.0 or (r2 == 0.0 and x[k] != 0.0):
+                return L, False
+            if r2 == 0.0:
+                continue
+            r = np.sqrt(r2)
+            c = L[k,k]/r
+            s = x[k]/r
+            L[k,k] = r
+            for i in range(k+1, N):
+                L_ik = L[i,k]
+                L[i,k] = c*L_ik + sign*s*x[i]
+                x[i] = c*x[i] - s*L_ik
+    return L, True
+
+@njit(cache=True)
+def cholesky_substitution(L, B):
+    # A X = B from the Cholesky factor L of A by forward and back
+    # substitution
+    N = len(L)
+    Y = np.zeros_like(B)
+    for i in range(N):
+        Y[i] = (B[i] - L[i,:i]@Y[:i])/L[i,i]
+    U = np.ascontiguousarray(L.T)
+    X = np.zeros_like(B)
+    for i in range(N-1, -1, -1):
+        X[i] = (Y[i] - U[i,i+1:]@X[i+1:])/U[i,i]
+    return X
+
+@njit(cache=True)
+def cholesky_solve(A, B):
+    # A X = B for a symmetric positive definite A. Returns False if A isn't
+    # numerically positive definite (numba only catches Exception, here the
+    # LinAlgError of the factorization).
+    try:
+        L = np.linalg.cholesky(A)
+    except Exception:
+        return B.copy(), False
+    X = cholesky_substitution(L, B)
+    return X, np.all(np.isfinite(X))
+
+@njit(cache=True)
+def batch_cholesky_substitution(L, B):
+    # cholesky_substitution() of a stack of factors (K, N, N) and right hand
+    # sides (K, N, M)
+    X = np.zeros_like(B)
+    for k in range(len(L)):
+        X[k] = cholesky_substitution(L[k], B[k])
+    return X
+
+def whiten(H, R, r):
+    """Transform the observations so their noise is uncorrelated, returns
+    H, r and the diagonal of R. Correlated R is whitened with its Cholesky
+    factor (L^-1 H, L^-1 r, unit variances)."""
+    R = np.atleast_2d(R)
+    R_diag = np.diag(R).copy()
+    if np.count_nonzero(R - np.diag(R_diag)) == 0:
+        return H, r, R_diag
+    L = np.linalg.cholesky(R)
+    H = solve_triangular(L, H, lower=True, check_finite=False)
+    r = solve_triangular(L, r, lower=True, check_finite=False)
+    return H, r, np.ones(len(r))
+
+@njit(cache=True)
+def scalar_updates(dx, P, H, R_diag, r, joseph):
+    # process the observations one at a time, each a rank one update
+    # without any matrix inversion (R must be diagonal, see whiten())
+    dx = dx.copy()
+    P = P.copy()
+    N = len(dx)
+    for k in range(len(r)):
+        h = H[k]
+        Ph = P@h
+        s = h@Ph + R_diag[k]
+        K = Ph/s
+        dx += K*(r[k] - h@dx)
+        if joseph:
+            # (I - K h) P (I - K h)^T + K R K^T expanded, valid for any K
+            for i in range(N):
+                for j in range(N):
+                    P[i,j] += -K[i]*Ph[j] - Ph[i]*K[j] + s*K[i]*K[j]
+        else:
+            for i in range(N):
+                for j in range(N):
+                    P[i,j] -= K[i]*Ph[j]
+    return dx, P
+
+def sequential_update(dx, P, H, R, r, joseph=True):
+    """Measurement update of dx (deviation, zero for an EKF) and P with the
+    components of r = y - h processed sequentially, in conventional or
+    Joseph form"""
+    H, r, R_diag = whiten(np.atleast_2d(np.asarray(H, dtype=np.float64)), R, np.asarray(r, dtype=np.float64).reshape((-1)))
+    return scalar_updates(np.asarray(dx, dtype=np.float64), np.asarray(P, dtype=np.float64), 
+                          np.ascontiguousarray(H), R_diag, np.ascontiguousarray(r), joseph)
+
+@njit(cache=True)
+def ud_factor(P):
+    """P = U diag(d) U^T with U unit upper triangular. Zero pivots (positive
+    semi-definite P, e.g. process noise) leave the column of U at e_j."""
+    N = len(P)
+    U = np.eye(N)
+    d = np.zeros((N,))
+    for j in range(N-1, -1, -1):
+        d_j = P[j,j]
+        for k in range(j+1, N):
+            d_j -= d[k]*U[j,k]**2
+        d[j] = max(d_j, 0.0)
+        if d[j] <= 0.0:
+            continue
+        for i in range(j):
+            u = P[i,j]
+            for k in range(j+1, N):
+                u -= d[k]*U[i,k]*U[j,k]
+            U[i,j] = u/d[j]
+    return U, d
+
+def ud_pack(U, d):
+    # U and d in one matrix, d on the diagonal and U (unit diagonal dropped)
+    # above it
+    return np.triu(U, 1) + np.diag(d)
+
+def ud_unpack(UD):
+    return np.triu(UD, 1) + np.eye(len(UD)), np.diag(UD).copy()
+
+@njit(cache=True)
+def ud_time_update(U, d, phi, U_Q, d_Q):
+    # Thornton's modified weighted Gram-Schmidt: U diag(d) U^T of
+    # phi U D U^T phi^T + U_Q D_Q U_Q^T from the rows of W = [phi U, U_Q]
+    N = len(d)
+    W = np.hstack((phi@U, U_Q))
+    D_W = np.concatenate((d, d_Q))
+    U_new = np.eye(N)
+    d_new = np.zeros((N,))
+    for k in range(N-1, -1, -1):
+        c = W[k]*D_W
+        d_new[k] = W[k]@c
+        if d_new[k] <= 0.0:
+            d_new[k] = 0.0
+            continue
+        for j in range(k):
+            U_new[j,k] = (W[j]@c)/d_new[k]
+            W[j] -= U_new[j,k]*W[k]
+    return U_new, d_new
+
+@njit(cache=True)
+def bierman_update(dx, U, d, H, R_diag, r):
+    # Bierman's scalar measurement updates of dx and the U D factors of P
+    # for r = y - h (R must be diagonal, see whiten())
+    N = len(d)
+    dx = dx.copy()
+    U = U.copy()
+    d = d.copy()
+    K = np.zeros((N,))
+    for m in range(len(r)):
+        h = H[m]
+        f = U.T@h
+        v = d*f
+        alpha = R_diag[m] + f[0]*v[0]
+        d[0] *= R_diag[m]/alpha
+        K[:] = 0.0
+        K[0] = v[0]
+        for j in range(1, N):
+            beta = alpha
+            alpha += f[j]*v[j]
+            lam = -f[j]/beta
+            d[j] *= beta/alpha
+            for i in range(j):
+                U_ij = U[i,j]
+                U[i,j] = U_ij + lam*K[i]
+                K[i] += v[j]*U_ij
+            K[j] = v[j]
+        dx += K/alpha*(r[m] - h@dx)
+    return dx, U, d
@@ -4,6 +4,8 @@ from StatOD.constants import EarthParams
 from StatOD.utils import print_expression, latlon2cart, ECEF_2_ECI
 import numba
 from numba import njit
+import inspect
+from StatOD.cache import cache_key, cached_module, cached_symbolic, rename_function
 
 #########################
 # Measurement Functions #
@@ -120,7 +122,7 @@ def dhdx(x, h, args):
 
     return dhdx.tolist()
 
-def measurements(x, h, args, cse_func=cse, consider=None):
+def measurements(x, h, args, cse_func=cse, consider=None, use_cache=True):
     n = len(x) # state [x, y, z, vx, vy, vz]
     k = len(args) # non-state arguments [xs, ys, zs, R, mu]
 
@@ -128,29 +130,57 @@ def measurements(x, h, args, cse_func=cse, consider=None):
     x_args = np.array(symbols('x:'+str(n)))
     c_args = np.array(symbols('arg:'+str(k)))
 
-    h_sym = h(x_args, c_args)
-    dhdx_sym = dhdx(x_args, h_sym, c_args)
+    if consider is not None:
+        assert len(consider) == k # ensure that consider variable is of length args
+        consider = np.array(consider).astype(bool)
+        c_arg_subset = c_args[consider]
+        required_args = np.append(x_args, c_args[~consider])
+
+    def derive():
+        h_sym = h(x_args, c_args)
+        dhdx_sym = dhdx(x_args, h_sym, c_args)
+        dhdc_sym = None
+        if consider is not None:
+            dhdc_sym = dhdx(c_arg_subset, h_sym, required_args)
+        return h_sym, dhdx_sym, dhdc_sym
+
+    def generate():
+        # Define X, R as the inputs to expression
+        modules = ['numpy' , {'DiracDelta': custom_DiracDelta}]
+        func_h = lambdify([x_args, c_args], h_sym, cse=cse_func, modules=modules)
+        func_dhdx = lambdify([x_args, h_args, c_args], dhdx_sym, cse=cse_func, modules=modules)
+        source = [
+            rename_function(inspect.getsource(func_h), 'h'),
+            rename_function(inspect.getsource(func_dhdx), 'dhdx')
+        ]
+        if consider is not None:
+            func_dhdc = lambdify([c_arg_subset, h_args, required_args], dhdc_sym, cse=cse_func, modules='numpy')
+            source.append(rename_function(inspect.getsource(func_dhdc), 'dhdc'))
+        return "\n\n".join(source)
+
+    # Load or regenerate the symbolic expressions and code
+    header = "from numpy import *\nfrom StatOD.measurements import custom_DiracDelta as DiracDelta"
+    if use_cache:
+        key = cache_key(h, dhdx, n, k, consider, getattr(cse_func, '__name__', cse_func))
+        h_sym, dhdx_sym, dhdc_sym = cached_symbolic('measurements', h.__name__, key, derive)
+    else:
+        h_sym, dhdx_sym, dhdc_sym = derive()
 
     # Can't resolve length until function has been called
     m = len(h_sym) # measurement [rho, rhod]
     h_args = np.array(symbols('h:'+str(m)))
 
-    # Define X, R as the inputs to expression
-    func_h = lambdify([x_args, c_args], h_sym, cse=cse_func, modules=['numpy' , {'DiracDelta': custom_DiracDelta}])
-    func_dhdx = lambdify([x_args, h_args, c_args], dhdx_sym, cse=cse_func, modules=['numpy' , {'DiracDelta': custom_DiracDelta}])
+    if use_cache:
+        namespace = cached_module('measurements', h.__name__, key, generate, header).__dict__
+    else:
+        namespace = {}
+        exec(header + "\n\n" + generate(), namespace)
 
     # Generate consider dynamics if requested
     if consider is not None:
-        assert len(consider) == k # ensure that consider variable is of length args
-        consider = np.array(consider).astype(bool)
-        c_arg_subset = c_args[consider]
-        required_args = np.append(x_args, c_args[~consider])
-        dhdc_sym = dhdx(c_arg_subset, h_sym, required_args)
-        lambdify_dhdc = lambdify([c_arg_subset, h_args, required_args], dhdc_sym, cse=cse_func, modules='numpy')
-        func_dhdc = lambdify_dhdc
-        return func_h, func_dhdx, func_dhdc
+        return namespace['h'], namespace['dhdx'], namespace['dhdc']
 
-    return func_h, func_dhdx
+    return namespace['h'], namespace['dhdx']
 
 
 def get_rho_rhod_el(t, X_ECI, X_obs_ECI, elevation_mask):  
@@ -1,19 +1,39 @@
 import numpy as np
 def ECI_2_RCI(x):
-    
+    # x may be a single state or a (K, N) block of states, giving (3, 3)
+    # or (K, 3, 3)
+
     # Inertial Frame
-    r = x[0:3]
-    r_dot = x[3:6]
+    r = x[..., 0:3]
+    r_dot = x[..., 3:6]
     h = np.cross(r, r_dot)
 
     # RIC Frame (radial, in track, cross track)
-    o_r = r / np.linalg.norm(r)
-    o_h = h / np.linalg.norm(h)
+    o_r = r / np.linalg.norm(r, axis=-1, keepdims=True)
+    o_h = h / np.linalg.norm(h, axis=-1, keepdims=True)
     o_theta = np.cross(o_h, o_r)
 
-    ON = np.vstack([o_r.T, o_theta.T, o_h.T])
+    ON = np.stack([o_r, o_theta, o_h], axis=-2)
     return ON
 
 
 def no_rotation(x):
-    return np.eye(3)
\ No newline at end of file
+    return np.eye(3)
+
+def compute_BN(tVec, omega):
+    theta = tVec*omega
+    C00 = np.cos(theta)
+    C01 = -np.sin(theta)
+    C10 = np.sin(theta)
+    C11 = np.cos(theta)
+    Cij = np.zeros_like(C00)
+    C22 = np.zeros_like(C00) + 1
+
+    C = np.block([
+        [[C00], [C01], [Cij]],
+        [[C10], [C11], [Cij]],
+        [[Cij], [Cij], [C22]],
+    ])    
+    C = np.transpose(C,axes=[2,0,1])
+
+    return C
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from StatOD.cache import set_cache_dir
+from StatOD.constants import EarthParams
+from StatOD.data import get_measurements
+from StatOD.dynamics import dynamics, f_J2
+from StatOD.filters import FilterLogger
+from StatOD.measurements import h_rho_rhod, measurements
+
+@pytest.fixture(scope="session", autouse=True)
+def session_cache_dir(tmp_path_factory):
+    # keep the generated code of the test session out of the repository
+    path = tmp_path_factory.mktemp("statod_cache")
+    set_cache_dir(str(path))
+    yield path
+    set_cache_dir(None)
+
+@pytest.fixture(scope="session")
+def j2_case():
+    """Short arc of the J2 range / range-rate data set with the filter
+    inputs shared by the tests"""
+    ep = EarthParams()
+    x0 = np.array([-3515.4903270335103, 8390.716310243395, 4127.627352553683,
+                   -4.357676322178153, -3.3565791387645487, 3.111892927869902])
+    t, Y, X = get_measurements("Data/Measurements/range_rangerate_w_J2_w_noise.data")
+    n = 60
+    f_args = np.array([ep.R, ep.mu, ep.J2])
+    f, dfdx = dynamics(x0, f_J2, f_args)
+    h, dhdx = measurements(x0, h_rho_rhod, X[0])
+    return {
+        "x0" : x0,
+        "dx0" : np.array([0.1, 0.0, 0.0, 1E-4, 0.0, 0.0]),
+        "P0" : np.diag(np.array([1, 1, 1, 1E-3, 1E-3, 1E-3])**2),
+        "R0" : np.diag(np.array([1E-3, 1E-6])**2),
+        "t" : t[:n],
+        "Y" : Y[:n,1:],
+        "X" : X[:n],
+        "f_args" : f_args,
+        "f_dict" : {"f" : f, "dfdx" : dfdx, "f_args" : f_args, "Q" : np.zeros((3,3))},
+        "h_dict" : {"h" : h, "dhdx" : dhdx, "h_args" : X[0]},
+    }
+
+def run_filter(filter, case, R_vec=None, **kwargs):
+    t = case["t"]
+    if R_vec is None:
+        R_vec = np.repeat(np.array([case["R0"]]), len(t), axis=0)
+    filter.run(t, case["Y"], R_vec, np.full((len(t), len(case["f_args"])), case["f_args"]), case["X"], **kwargs)
+    return filter
+
+def run_case(filter_class, case, *args, f_dict={}, h_dict={}, **kwargs):
+    # filter_class with a FilterLogger over case, f_dict / h_dict update
+    # the case's, kwargs go to run_filter
+    logger = FilterLogger(6, len(case["t"]))
+    filter = filter_class(case["t"][0], case["x0"], case["dx0"], case["P0"], *args,
+                          dict(case["f_dict"], **f_dict), dict(case["h_dict"], **h_dict), logger=logger)
+    return run_filter(filter, case, **kwargs)
+
+def assert_same_estimates(logger, ref, rows=slice(None), ref_rows=slice(None)):
+    x, P = logger.x_hat_i_plus[rows], logger.P_i_plus[rows]
+    x_ref, P_ref = ref.x_hat_i_plus[ref_rows], ref.P_i_plus[ref_rows]
+    np.testing.assert_allclose(x, x_ref, rtol=0, atol=1E-6)
+    np.testing.assert_allclose(P, P_ref, rtol=1E-6, atol=1E-9*np.max(np.abs(P_ref)))
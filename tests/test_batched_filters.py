@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from conftest import assert_same_estimates
+from StatOD.dynamics.process_noise_SNC import get_Q, process_noise
+from StatOD.filters import (BatchedExtendedKalmanFilter, BatchedKalmanFilter,
+                            ExtendedKalmanFilter, FilterLogger, KalmanFilter)
+from StatOD.rotations import ECI_2_RCI
+
+@pytest.mark.parametrize("single, batched", [
+    (KalmanFilter, BatchedKalmanFilter),
+    (ExtendedKalmanFilter, BatchedExtendedKalmanFilter),
+])
+@pytest.mark.parametrize("vectorized", [False, True])
+def test_batched_matches_single(j2_case, single, batched, vectorized):
+    # mixed NaN / valid trials with per trial R and h_args, and RIC frame
+    # process noise, with h and Q evaluated per trial or for all at once
+    c = j2_case
+    t = c["t"]
+    K = 3
+    n = len(t)
+    x0 = np.array([c["x0"] + k*np.array([0.05, 0, 0, 0, 1E-5, 0]) for k in range(K)])
+    dx0 = np.zeros(6) if single is ExtendedKalmanFilter else c["dx0"]
+    Y = np.repeat(c["Y"][:,None,:], K, axis=1)
+    Y[1::3,1] = np.nan
+    R = np.array([[c["R0"]*(k + 1)**2 for k in range(K)]]*n)
+    X = np.array([[c["X"][i] + np.array([k, 0, 0, 0, 0, 0]) for k in range(K)] for i in range(n)])
+    f_args = np.full((n, len(c["f_args"])), c["f_args"])
+    Q0 = np.diag([1E-12, 4E-12, 9E-12])
+    f_dict = dict(c["f_dict"], Q=Q0, Q_fcn=process_noise(c["x0"], Q0, get_Q, [], use_numba=False), Q_DCM=ECI_2_RCI)
+
+    logger = FilterLogger(6, n, K=K)
+    filter = batched(t[0], x0, dx0, c["P0"], dict(f_dict, Q_vectorized=vectorized),
+                     dict(c["h_dict"], vectorized=vectorized, h_args_per_trial=True), logger=logger)
+    filter.run(t, Y, R, f_args, X, merge_gaps=False)
+    assert np.any(np.isnan(Y[:,1]).any(axis=1))
+
+    for k in range(K):
+        logger_k = FilterLogger(6, n)
+        filter = single(t[0], x0[k], dx0, c["P0"], dict(f_dict), dict(c["h_dict"]), logger=logger_k)
+        filter.run(t, Y[:,k], R[:,k], f_args, X[:,k], merge_gaps=False)
+        # the trials are integrated as one system, so agreement is to the
+        # integrator tolerance
+        assert_same_estimates(logger, logger_k, rows=k)
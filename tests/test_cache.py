@@ -0,0 +1,78 @@
+import importlib
+import os
+import sys
+import numpy as np
+import pytest
+import StatOD.cache as cache
+from StatOD.cache import cache_key, get_cache_dir, set_cache_dir
+from StatOD.dynamics import dynamics, f_J2, get_Q, process_noise
+from StatOD.measurements import h_rho_rhod, measurements
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    previous = get_cache_dir()
+    set_cache_dir(str(tmp_path))
+    yield tmp_path
+    set_cache_dir(previous)
+
+def test_cache_key(monkeypatch):
+    key = cache_key(get_Q, 6, 3)
+    assert key == cache_key(get_Q, 6, 3)
+    assert key != cache_key(get_Q, 6, 4)
+    monkeypatch.setattr(cache, "CACHE_VERSION", cache.CACHE_VERSION + 1)
+    assert key != cache_key(get_Q, 6, 3)
+
+def test_cached_process_noise(j2_case, cache_dir):
+    Q0 = np.diag([1E-9, 4E-9, 9E-9])
+    x0 = j2_case["x0"]
+    args = (30.0, x0, Q0, np.eye(3), np.array([]))
+    Q_ref = process_noise(x0, Q0, get_Q, [], use_numba=False, use_cache=False)(*args)
+    assert not os.listdir(cache_dir)
+
+    for _ in range(2): # derive, then load
+        Q = process_noise(x0, Q0, get_Q, [], use_numba=False)(*args)
+        np.testing.assert_array_equal(Q, Q_ref)
+    assert os.listdir(cache_dir / "process_noise")
+
+def test_cached_measurements(j2_case, cache_dir):
+    x0, X = j2_case["x0"], j2_case["X"][0]
+    h_ref, dhdx_ref = measurements(x0, h_rho_rhod, X, use_cache=False)
+    for _ in range(2):
+        h, dhdx = measurements(x0, h_rho_rhod, X)
+        np.testing.assert_array_equal(h(x0, X), h_ref(x0, X))
+        np.testing.assert_array_equal(dhdx(x0, h(x0, X), X), dhdx_ref(x0, h_ref(x0, X), X))
+    assert os.listdir(cache_dir / "measurements")
+
+def test_cached_dynamics(j2_case, cache_dir):
+    x0, f_args = j2_case["x0"], j2_case["f_args"]
+    f_ref, dfdx_ref = dynamics(x0, f_J2, f_args, use_cache=False)
+    for _ in range(2):
+        f, dfdx = dynamics(x0, f_J2, f_args, fused=True)[:2]
+        np.testing.assert_array_equal(f(x0, f_args), f_ref(x0, f_args))
+        np.testing.assert_array_equal(dfdx(x0, f(x0, f_args), f_args), dfdx_ref(x0, f_ref(x0, f_args), f_args))
+    assert sorted(os.listdir(cache_dir / "dynamics"))[0].startswith("f_J2_")
+
+def test_dynamics_cache_invalidation(cache_dir, tmp_path, monkeypatch):
+    # editing the model gives a new entry instead of the stale code
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(sys, "dont_write_bytecode", True)
+    x = np.array([1.0, 0.5])
+    args = np.array([2.0])
+    results = []
+    for k in ["1.0", "30.0", "1.0"]:
+        (tmp_path / "cache_test_model.py").write_text(
+            f"def f_spring(x, args):\n    return [x[1], -{k}*args[0]*x[0]]\n")
+        importlib.invalidate_caches()
+        sys.modules.pop("cache_test_model", None)
+        module = importlib.import_module("cache_test_model")
+        f, dfdx = dynamics(x, module.f_spring, args, use_numba=False)
+        results.append((np.array(f(x, args)), np.array(dfdx(x, f(x, args), args))))
+    sys.modules.pop("cache_test_model", None)
+
+    np.testing.assert_array_equal(results[0][0], [0.5, -2.0])
+    np.testing.assert_array_equal(results[1][0], [0.5, -60.0])
+    np.testing.assert_array_equal(results[1][1], [[0.0, 1.0], [-60.0, 0.0]])
+    for expected, actual in zip(results[0], results[2]):
+        np.testing.assert_array_equal(actual, expected)
+    entries = {name.rsplit(".", 1)[0] for name in os.listdir(cache_dir / "dynamics")}
+    assert len(entries) == 2
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from scipy.linalg import block_diag
+from conftest import assert_same_estimates, run_case
+from StatOD.dynamics import get_Q, process_noise
+from StatOD.filters import (ExtendedKalmanFilter, KalmanFilter,
+                            SRUnscentedKalmanFilter, UDKalmanFilter,
+                            UnscentedKalmanFilter)
+from StatOD.linalg import cholesky_sqrt
+
+@pytest.fixture(scope="module")
+def snc_noise(j2_case):
+    Q0 = np.eye(3)*1E-12
+    return {"Q" : Q0, "Q_fcn" : process_noise(j2_case["x0"], Q0, get_Q, [], use_numba=False), "Q_args" : []}
+
+@pytest.mark.parametrize("filter_class", [KalmanFilter, ExtendedKalmanFilter])
+@pytest.mark.parametrize("sequential", [True, "conventional"])
+def test_sequential_updates(j2_case, filter_class, sequential):
+    ref = run_case(filter_class, j2_case).logger
+    logger = run_case(filter_class, j2_case, h_dict={"sequential" : sequential}).logger
+    assert_same_estimates(logger, ref)
+
+@pytest.mark.parametrize("noise", [False, True])
+def test_ud_filter(j2_case, snc_noise, noise):
+    f_dict = snc_noise if noise else {}
+    ref = run_case(KalmanFilter, j2_case, f_dict=f_dict).logger
+    assert_same_estimates(run_case(UDKalmanFilter, j2_case, f_dict=f_dict).logger, ref)
+
+@pytest.mark.parametrize("filter_class", [KalmanFilter, ExtendedKalmanFilter])
+def test_stacked_measurements(j2_case, filter_class):
+    # every epoch observed twice (the second with a noisier R), against a
+    # model measuring both at once. Every row of an epoch logs the stacked
+    # estimate.
+    n = 30
+    R0 = j2_case["R0"]
+    h, dhdx = j2_case["h_dict"]["h"], j2_case["h_dict"]["dhdx"]
+    def h_twice(x, args):
+        return np.tile(np.array(h(x, args)).reshape((-1)), 2)
+    def dhdx_twice(x, h_i, args):
+        return np.tile(np.array(dhdx(x, h_i[:2], args)), (2, 1))
+    case = dict(j2_case, **{key : j2_case[key][:n] for key in ["t", "Y", "X"]})
+    ref = run_case(filter_class, dict(case, Y=np.tile(case["Y"], 2)), R_vec=np.array([block_diag(R0, 4*R0)]*n),
+                   h_dict={"h" : h_twice, "dhdx" : dhdx_twice}).logger
+
+    case = dict(case, **{key : np.repeat(case[key], 2, axis=0) for key in ["t", "Y", "X"]})
+    R = np.array([R0, 4*R0]*n)
+    logger = run_case(filter_class, case, R_vec=R, stack_measurements=True).logger
+    assert_same_estimates(logger, ref, rows=slice(0, None, 2))
+    assert_same_estimates(logger, ref, rows=slice(1, None, 2))
+    if filter_class is KalmanFilter:
+        # the linear updates are order independent
+        every_second = slice(1, None, 2)
+        assert_same_estimates(logger, run_case(filter_class, case, R_vec=R).logger, every_second, every_second)
+
+class CholeskyUnscentedKalmanFilter(UnscentedKalmanFilter):
+    # sigma points from the same square root of P as the SR-UKF
+    def get_sigma_vecs(self, P):
+        return cholesky_sqrt(P)
+
+@pytest.mark.parametrize("alpha", [1.0, 1E-1]) # positive / negative zeroth weight
+def test_sr_ukf(j2_case, snc_noise, alpha):
+    args = (alpha, 0.0, 2.0)
+    ref = run_case(CholeskyUnscentedKalmanFilter, j2_case, *args, f_dict=snc_noise).logger
+    assert_same_estimates(run_case(SRUnscentedKalmanFilter, j2_case, *args, f_dict=snc_noise).logger, ref)
+
+@pytest.mark.parametrize("filter_class", [UnscentedKalmanFilter, SRUnscentedKalmanFilter])
+def test_sigma_point_measurements(j2_case, filter_class):
+    # the broadcast measurement evaluation against the per point loop
+    args = (1.0, 0.0, 2.0)
+    vectorized = run_case(filter_class, j2_case, *args, h_dict={"vectorized" : True})
+    looped = run_case(filter_class, j2_case, *args)
+    assert_same_estimates(vectorized.logger, looped.logger)
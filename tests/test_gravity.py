@@ -0,0 +1,290 @@
+import numpy as np
+import pytest
+import StatOD.gravity.mlp as mlp
+from StatOD.dynamics import (dynamics_ivp_particle_batch, dynamics_ivp_unscented_batch,
+                             dynamics_ivp_unscented_no_jit, f_PINN_DMC)
+from StatOD.gravity import model_acceleration, model_dadx
+from StatOD.gravity.mlp import export_pinn, mlp_forward, mlp_gravity, mlpGravityModel
+from StatOD.gravity.spherical_harmonics import load_sh_coefficients, sphericalHarmonicModel
+from StatOD.gravity.surrogate import gridGravityModel
+
+def random_mlp(seed=0, removed_pm=1.0):
+    rng = np.random.default_rng(seed)
+    sizes = [3, 16, 16, 1]
+    weights = np.hstack([rng.normal(size=sizes[l]*sizes[l+1])/np.sqrt(sizes[l]) for l in range(3)])
+    biases = np.hstack([rng.normal(size=sizes[l+1])*0.1 for l in range(3)])
+    activations = [1, 3, 0]
+    # x_scale, x_offset, u_scale, u_offset, mu, removed_pm, l_star, t_star
+    constants = np.hstack(([0.1, 0.2, 0.3], [0.5, -0.2, 0.1], 2.0, 0.3, 5.0, removed_pm, 1.0, 1.0))
+    return mlpGravityModel(weights, biases, sizes, activations, constants)
+
+def fd_gradient(fcn, x, h):
+    # central differences of a scalar or vector function, last axis = d/dx
+    return np.stack([(np.asarray(fcn(x + h*e)) - np.asarray(fcn(x - h*e)))/(2*h) for e in np.eye(len(x))], axis=-1)
+
+@pytest.mark.parametrize("removed_pm", [0.0, 1.0])
+def test_mlp_derivatives(removed_pm):
+    model = random_mlp(removed_pm=removed_pm)
+    x = np.array([3.0, -4.0, 6.0])
+    h = 1E-4
+
+    def U(x):
+        return mlp_gravity(x, *model.params, 2)[0]
+    U_x, a, dadx = mlp_gravity(x, *model.params, 2)
+    np.testing.assert_allclose(a, -fd_gradient(U, x, h), rtol=1E-7, atol=1E-10)
+    dadx_fd = -fd_gradient(lambda x: fd_gradient(U, x, h), x, 1E-3)
+    np.testing.assert_allclose(dadx, dadx_fd, rtol=1E-5, atol=1E-8)
+    np.testing.assert_allclose(dadx, dadx.T, rtol=1E-12, atol=1E-15)
+
+    # the forward mode derivatives of the bare network
+    weights, biases, sizes, activations, constants = model.params
+    def h_n(x):
+        return mlp_forward(x, weights, biases, sizes, activations, 2)[0]
+    h_x, J, H = mlp_forward(x, weights, biases, sizes, activations, 2)
+    np.testing.assert_allclose(J, fd_gradient(h_n, x, h), rtol=1E-7, atol=1E-10)
+    np.testing.assert_allclose(H, fd_gradient(lambda x: mlp_forward(x, weights, biases, sizes, activations, 1)[1], x, h), rtol=1E-6, atol=1E-9)
+
+class fakeArray():
+    def __init__(self, value):
+        self.value = np.asarray(value)
+    def numpy(self):
+        return self.value
+
+class fakeLayer():
+    # the attributes of a keras layer read by export_pinn
+    def __init__(self, name, shape=None, activation="tanh", weights=()):
+        self.name = name
+        self.weights = list(weights)
+        if shape is not None:
+            self.kernel = fakeArray(np.ones(shape))
+            self.bias = fakeArray(np.zeros(shape[1]))
+            self.activation = type(activation, (), {})
+            self.activation.__name__ = activation
+    def get_weights(self):
+        return self.weights
+
+@pytest.mark.parametrize("layers, error, match", [
+    ([fakeLayer("norm", weights=[np.ones(3)]), fakeLayer("dense", (3, 1))], TypeError, "Can't export layer norm"),
+    ([fakeLayer("dense", (3, 1), activation="relu")], ValueError, "Unsupported activation relu"),
+    ([fakeLayer("dense", (3, 2))], ValueError, "scalar potential"),
+])
+def test_export_pinn_unsupported(layers, error, match):
+    class pinn():
+        gravity_model = type("network", (), {"layers" : layers})
+    with pytest.raises(error, match=match):
+        export_pinn(pinn())
+
+@pytest.fixture
+def orders(monkeypatch):
+    # orders of the compiled evaluations made by mlpGravityModel
+    orders = []
+    batch = mlp.mlp_gravity_batch
+    def recording_batch(R, *args):
+        orders.append(args[-1])
+        return batch(R, *args)
+    monkeypatch.setattr(mlp, "mlp_gravity_batch", recording_batch)
+    return orders
+
+def test_acceleration_order(orders):
+    model = random_mlp()
+    X = np.random.default_rng(1).uniform(5.0, 10.0, size=(5,3))
+    a_ref = [model.generate_acceleration(x) for x in X]
+    dadx_ref = [model.generate_dadx(x) for x in X]
+
+    # acceleration only callers stay at first order
+    orders.clear()
+    for x in X:
+        model_acceleration(model, x)
+    model_acceleration(model, X)
+    assert orders == [1]*6
+
+    # f / dfdx pairs: a second evaluation for dadx at first order, one
+    # shared evaluation once requested
+    for acceleration_order, expected in [(1, [1, 2]*5), (2, [2]*5)]:
+        model.acceleration_order = acceleration_order
+        model.reset_memo()
+        orders.clear()
+        for k, x in enumerate(X):
+            np.testing.assert_array_equal(model_acceleration(model, x), a_ref[k])
+            np.testing.assert_array_equal(model_dadx(model, x), dadx_ref[k])
+        assert orders == expected
+
+def test_batched_dynamics_match_loop(orders):
+    # f_dict['batch'] passes all sigma points / particles to f as one block
+    model = random_mlp()
+    f_args = np.array([model] + [0.0]*6 + [120.0], dtype=object)
+    x0 = np.array([6.0, 2.0, -3.0, 0.0, 0.6, 0.1, 1E-3, 0.0, -1E-3])
+    rng = np.random.default_rng(4)
+
+    Z = (x0 + rng.normal(size=(2*len(x0) + 1, len(x0)))*1E-2).reshape((-1))
+    K = 50
+    X = x0 + rng.normal(size=(K, len(x0)))*1E-2
+    Zd_unscented = dynamics_ivp_unscented_no_jit(0.0, Z, f_PINN_DMC, None, f_args)
+    Zd_particle = np.hstack([f_PINN_DMC(x, f_args) for x in X])
+
+    orders.clear()
+    np.testing.assert_allclose(dynamics_ivp_unscented_batch(0.0, Z, f_PINN_DMC, None, f_args), Zd_unscented, rtol=1E-12, atol=1E-15)
+    np.testing.assert_allclose(dynamics_ivp_particle_batch(0.0, X.reshape((-1)), f_PINN_DMC, K, f_args), Zd_particle, rtol=1E-12, atol=1E-15)
+
+    # one first order evaluation per block
+    assert orders == [1, 1]
+
+def test_pinn_acceleration_does_not_trace_hessian():
+    tf = pytest.importorskip("tensorflow")
+    pytest.importorskip("GravNN")
+    from StatOD.gravity.pinn import pinnGravityModel
+
+    traced = []
+    class pointMass():
+        def generate_potential(self, R):
+            traced.append("U")
+            return -1.0/tf.norm(R, axis=1, keepdims=True)
+        def generate_acceleration(self, R):
+            traced.append("a")
+            return -R/tf.norm(R, axis=1, keepdims=True)**3
+        def generate_dU_dxdx(self, R):
+            traced.append("dU_dxdx")
+            return tf.zeros((tf.shape(R)[0], 3, 3), dtype=tf.float64)
+
+    model = pinnGravityModel.__new__(pinnGravityModel)
+    model.gravity_model = pointMass()
+    model.removed_pm = False
+    model.dim_constants = {"m_star" : 1.0, "t_star" : 1.0, "l_star" : 1.0}
+    model.evaluate_fcn = None
+    model.acceleration_fcn = None
+    model.reset_memo()
+
+    X = np.array([[1.0, 2.0, 3.0], [3.0, 2.0, 1.0]])
+    for x in X:
+        a = model_acceleration(model, x)
+        np.testing.assert_allclose(a, -x/np.linalg.norm(x)**3)
+    model_acceleration(model, X)
+    assert "dU_dxdx" not in traced
+
+class pointMassModel():
+    def generate_acceleration(self, X):
+        X = np.reshape(X, (-1,3))
+        r = np.linalg.norm(X, axis=1).reshape((-1,1))
+        return (-X/r**3).squeeze()
+
+    def generate_dadx(self, X):
+        X = np.reshape(X, (-1,3))
+        r = np.linalg.norm(X, axis=1).reshape((-1,1,1))
+        return (3.0*np.einsum('ki,kj->kij', X, X)/r**5 - np.eye(3)/r**3).squeeze()
+
+def test_model_dispatch():
+    # only memoizedGravityModels go through evaluate(), e.g. not a keras model
+    class kerasModel(pointMassModel):
+        def evaluate(self, *args, **kwargs):
+            raise AssertionError("evaluate() called")
+    x = np.array([1.0, 2.0, 3.0])
+    np.testing.assert_allclose(model_acceleration(kerasModel(), x), -x/np.linalg.norm(x)**3)
+    np.testing.assert_allclose(model_dadx(kerasModel(), x), pointMassModel().generate_dadx(x))
+
+def test_grid_surrogate():
+    model = pointMassModel()
+    bounds = np.array([[1.0, 3.0], [-1.0, 1.0], [0.5, 2.5]])
+    tol = 1E-6
+    surrogate = gridGravityModel.build(model, bounds, tol=tol)
+    assert surrogate.error <= tol
+
+    X = np.random.default_rng(2).uniform(bounds[:,0], bounds[:,1], size=(500,3))
+    a = model.generate_acceleration(X)
+    dadx = model.generate_dadx(X)
+    a_error = np.linalg.norm(surrogate.generate_acceleration(X) - a, axis=1)/np.linalg.norm(a, axis=1)
+    dadx_error = np.linalg.norm(surrogate.generate_dadx(X) - dadx, axis=(1,2))/np.linalg.norm(dadx, axis=(1,2))
+    assert np.max(a_error) <= 2*tol
+    assert np.max(dadx_error) <= 20*tol
+
+    # dadx is the derivative of the interpolated acceleration
+    x = X[0]
+    dadx_fd = np.stack([(surrogate.generate_acceleration(x + 1E-6*e) - surrogate.generate_acceleration(x - 1E-6*e))/2E-6 for e in np.eye(3)], axis=-1)
+    np.testing.assert_allclose(surrogate.generate_dadx(x), dadx_fd, rtol=1E-6, atol=1E-9)
+
+def test_grid_surrogate_tol_not_met():
+    with pytest.warns(UserWarning, match="above tol"):
+        surrogate = gridGravityModel.build(pointMassModel(), [[1.0, 3.0], [-1.0, 1.0], [0.5, 2.5]], tol=1E-12, max_N=17)
+    assert surrogate.error > 1E-12
+    assert surrogate.coefficients.shape[:3] == (17, 17, 17)
+
+def degree_3_potential(x, R, mu, C, S):
+    # direct sum of the fully normalized terms up to degree 3 (no C31, C32, C33)
+    r = np.linalg.norm(x)
+    s = x[2]/r
+    c = np.sqrt(1.0 - s**2)
+    lam = np.arctan2(x[1], x[0])
+    P = {
+        (2,0) : np.sqrt(5.0)*(3*s**2 - 1)/2,
+        (2,1) : np.sqrt(5.0/3.0)*3*s*c,
+        (2,2) : np.sqrt(5.0/12.0)*3*c**2,
+        (3,0) : np.sqrt(7.0)*(5*s**3 - 3*s)/2,
+    }
+    terms = 1.0
+    for (n, m), P_nm in P.items():
+        terms += (R/r)**n*P_nm*(C[n,m]*np.cos(m*lam) + S[n,m]*np.sin(m*lam))
+    return -mu/r*terms
+
+@pytest.fixture(scope="module")
+def sh_coefficients(tmp_path_factory):
+    R, mu = 16.0, 4.46E-4
+    C = np.zeros((4,4))
+    S = np.zeros((4,4))
+    C[0,0] = 1.0
+    C[2,0], C[2,1], C[2,2], C[3,0] = -0.05, 0.002, 0.08, 0.01
+    S[2,1], S[2,2] = -0.003, -0.03
+    file_name = tmp_path_factory.mktemp("sh") / "SH_test_model.csv"
+    with open(file_name, "w") as f:
+        f.write(f"{R},{mu}\n")
+        for n in range(4):
+            for m in range(n+1):
+                f.write(f"{n},{m},{C[n,m]},{S[n,m]}\n")
+    return R, mu, C, S, str(file_name)
+
+def test_sh_potential(sh_coefficients):
+    R, mu, C, S, file_name = sh_coefficients
+    R_file, mu_file, C_file, S_file = load_sh_coefficients(file_name)
+    assert (R_file, mu_file) == (R, mu)
+    np.testing.assert_array_equal(C_file, C)
+    np.testing.assert_array_equal(S_file, S)
+
+    model = sphericalHarmonicModel(file_name)
+    X = np.random.default_rng(3).normal(size=(20,3))*30.0
+    X = X[np.linalg.norm(X, axis=1) > R]
+    U_ref = [degree_3_potential(x, R, mu, C, S) for x in X]
+    np.testing.assert_allclose(model.generate_potential(X), U_ref, rtol=1E-12)
+
+    # truncation drops the degree 3 term
+    C_2 = C.copy()
+    C_2[3,0] = 0.0
+    U_2 = sphericalHarmonicModel(file_name, max_deg=2).generate_potential(X)
+    np.testing.assert_allclose(U_2, [degree_3_potential(x, R, mu, C_2, S) for x in X], rtol=1E-12)
+
+def test_sh_derivatives(sh_coefficients):
+    R, mu, C, S, file_name = sh_coefficients
+    model = sphericalHarmonicModel((R, mu, C, S))
+    for x in [np.array([20.0, -5.0, 12.0]), np.array([0.0, 0.0, 25.0]), np.array([-18.0, 3.0, -1.0])]:
+        a = model.generate_acceleration(x)
+        dadx = model.generate_dadx(x)
+        np.testing.assert_allclose(a, -fd_gradient(model.generate_potential, x, 1E-3), rtol=1E-8)
+        np.testing.assert_allclose(dadx, fd_gradient(model.generate_acceleration, x, 1E-3), rtol=1E-7, atol=1E-14)
+        np.testing.assert_allclose(dadx, dadx.T, rtol=1E-12, atol=1E-20)
+
+class fakeSphericalHarmonics():
+    # attributes of a GravNN SphericalHarmonics object
+    def __init__(self, R, mu, C, S):
+        self.radEquator = R
+        self.mu = mu
+        self.C_lm = C
+        self.S_lm = S
+
+def test_sh_gravnn_model(sh_coefficients):
+    R, mu, C, S, file_name = sh_coefficients
+    model = sphericalHarmonicModel(fakeSphericalHarmonics(R, mu, C, S))
+    reference = sphericalHarmonicModel((R, mu, C, S))
+    X = np.random.default_rng(4).normal(size=(10,3))*30.0
+    np.testing.assert_array_equal(model.generate_acceleration(X), reference.generate_acceleration(X))
+    np.testing.assert_array_equal(model.generate_dadx(X), reference.generate_dadx(X))
+    assert model.generate_dadx(X).shape == (10,3,3)
+
+    with pytest.raises(TypeError):
+        sphericalHarmonicModel(object())
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from conftest import assert_same_estimates, run_filter
+from scipy.integrate import solve_ivp
+from StatOD.dynamics.integrate_functions import dynamics_ivp
+from StatOD.dynamics.integrators import integrate_ivp
+from StatOD.filters import FilterLogger, KalmanFilter
+
+@pytest.fixture(scope="module")
+def stm_case(j2_case):
+    f, dfdx = j2_case["f_dict"]["f"], j2_case["f_dict"]["dfdx"]
+    Z0 = np.hstack((j2_case["x0"], np.eye(6).reshape((-1))))
+    return Z0, (f, dfdx, j2_case["f_args"])
+
+@pytest.mark.parametrize("method", ["RK45", "DOP853"])
+def test_adaptive_matches_solve_ivp(stm_case, method):
+    # one interval, so both take the same steps
+    Z0, args = stm_case
+    ref = solve_ivp(dynamics_ivp, [0, 600], Z0, args=args, method=method, rtol=1E-10, atol=1E-10)
+    Z, nfev = integrate_ivp(dynamics_ivp, [0, 600], Z0, args, method=method, rtol=1E-10, atol=1E-10)
+    np.testing.assert_allclose(Z[:,-1], ref.y[:,-1], rtol=1E-12, atol=1E-12)
+    assert nfev == ref.nfev
+
+@pytest.mark.parametrize("method", ["RK4", "RK45", "DOP853"])
+def test_t_eval(stm_case, method):
+    Z0, args = stm_case
+    t_eval = np.linspace(0, 600, 7)
+    ref = solve_ivp(dynamics_ivp, [0, 600], Z0, args=args, t_eval=t_eval, rtol=1E-12, atol=1E-12)
+    Z, nfev = integrate_ivp(dynamics_ivp, t_eval, Z0, args, method=method, rtol=1E-12, atol=1E-12, h_max=1.0)
+    assert Z.shape == ref.y.shape and nfev > 0
+    np.testing.assert_allclose(Z, ref.y, rtol=1E-8, atol=1E-9)
+
+def test_filter_integrator(j2_case):
+    # the compiled kernel and solve_ivp paths of the KF, with the same
+    # solution fields available either way
+    c = j2_case
+    loggers, sols = [], []
+    for integrator in [None, "DOP853"]:
+        logger = FilterLogger(6, len(c["t"]))
+        filter = KalmanFilter(c["t"][0], c["x0"], c["dx0"], c["P0"],
+                              dict(c["f_dict"], integrator=integrator), dict(c["h_dict"]), logger=logger)
+        run_filter(filter, c)
+        sols.append(filter.integrate(dynamics_ivp, [0, 60], np.hstack((c["x0"], np.eye(6).reshape((-1)))), (filter.f, filter.dfdx, c["f_args"])))
+        loggers.append(logger)
+    assert set(sols[0].keys()) <= set(sols[1].keys())
+    assert sols[1].status == 0 and sols[1].nfev > 0
+    assert_same_estimates(loggers[1], loggers[0])
@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+from StatOD.linalg import (bierman_update, cholesky_solve, cholesky_sqrt,
+                           cholupdate, joseph_update, kalman_gain,
+                           sequential_update, spd_solve, tria, ud_factor,
+                           ud_pack, ud_time_update, ud_unpack)
+
+@pytest.fixture
+def spd():
+    rng = np.random.default_rng(0)
+    A = rng.normal(size=(6,6))
+    return A@A.T + np.eye(6), rng.normal(size=(6,4))
+
+@pytest.fixture
+def update():
+    # covariance, partials, measurement noise, and residuals of one update
+    rng = np.random.default_rng(1)
+    A = rng.normal(size=(6,6))
+    R = rng.normal(size=(3,3))
+    return A@A.T + np.eye(6), rng.normal(size=(3,6)), R@R.T + np.eye(3), rng.normal(size=3)
+
+def test_spd_solve(spd):
+    A, B = spd
+    np.testing.assert_allclose(spd_solve(A, B), np.linalg.solve(A, B), rtol=1E-12, atol=1E-12)
+    # indefinite and singular matrices fall back to LU / least squares
+    np.testing.assert_allclose(spd_solve(-A, B), np.linalg.solve(-A, B), rtol=1E-12, atol=1E-12)
+    np.testing.assert_allclose(spd_solve(np.zeros_like(A), B), np.zeros_like(B))
+
+def test_kalman_gain(update):
+    P, H, R, _ = update
+    K = kalman_gain(P, H, R)
+    np.testing.assert_allclose(K, P@H.T@np.linalg.inv(H@P@H.T + R), rtol=1E-10, atol=1E-12)
+    # the Joseph form equals the conventional update for the optimal gain
+    np.testing.assert_allclose(joseph_update(P, K, H, R), (np.eye(6) - K@H)@P, rtol=1E-10, atol=1E-12)
+
+def test_cholesky_solve(spd):
+    A, B = spd
+    for rhs in [B, B[:,0].copy()]:
+        X, ok = cholesky_solve(A, rhs)
+        assert ok
+        np.testing.assert_allclose(X, np.linalg.solve(A, rhs), rtol=1E-12, atol=1E-12)
+    assert not cholesky_solve(-A, B)[1]
+    assert not cholesky_solve(np.zeros_like(A), B)[1]
+
+@pytest.mark.parametrize("joseph", [True, False])
+@pytest.mark.parametrize("correlated", [True, False])
+def test_sequential_update(update, joseph, correlated):
+    P, H, R, r = update
+    if not correlated:
+        R = np.diag(np.diag(R))
+    dx = np.linspace(-1, 1, 6)
+    K = kalman_gain(P, H, R)
+    dx_seq, P_seq = sequential_update(dx, P, H, R, r, joseph)
+    np.testing.assert_allclose(dx_seq, dx + K@(r - H@dx), rtol=1E-10, atol=1E-12)
+    np.testing.assert_allclose(P_seq, joseph_update(P, K, H, R), rtol=1E-10, atol=1E-12)
+
+def test_ud_factor(spd):
+    P = spd[0]
+    U, d = ud_factor(P)
+    assert np.allclose(np.tril(U, -1), 0.0) and np.allclose(np.diag(U), 1.0)
+    np.testing.assert_allclose(U@np.diag(d)@U.T, P, rtol=1E-12, atol=1E-12)
+    U_unpacked, d_unpacked = ud_unpack(ud_pack(U, d))
+    np.testing.assert_array_equal(U_unpacked, U)
+    np.testing.assert_array_equal(d_unpacked, d)
+    # semi-definite, e.g. process noise mapped into the velocities
+    Q = np.zeros((6,6))
+    Q[3:,3:] = P[:3,:3]
+    U, d = ud_factor(Q)
+    np.testing.assert_allclose(U@np.diag(d)@U.T, Q, rtol=1E-12, atol=1E-12)
+
+def test_ud_time_update(spd, update):
+    P, phi = update[0], spd[0]
+    Q = np.diag(np.linspace(1, 2, 6))
+    U, d = ud_time_update(*ud_factor(P), phi, *ud_factor(Q))
+    np.testing.assert_allclose(U@np.diag(d)@U.T, phi@P@phi.T + Q, rtol=1E-10, atol=1E-10)
+
+def test_bierman_update(update):
+    P, H, R, r = update
+    R = np.diag(np.diag(R))
+    dx = np.linspace(-1, 1, 6)
+    K = kalman_gain(P, H, R)
+    dx_ud, U, d = bierman_update(dx, *ud_factor(P), H, np.diag(R).copy(), r)
+    np.testing.assert_allclose(dx_ud, dx + K@(r - H@dx), rtol=1E-10, atol=1E-12)
+    np.testing.assert_allclose(U@np.diag(d)@U.T, joseph_update(P, K, H, R), rtol=1E-10, atol=1E-12)
+
+def test_tria(update):
+    A = update[1].T # 6 x 3, rank deficient
+    for B in [A, np.hstack((A, A, A))]:
+        L = tria(B)
+        assert np.allclose(np.triu(L, 1), 0.0) and np.all(np.diag(L) >= 0.0)
+        np.testing.assert_allclose(L@L.T, B@B.T, rtol=1E-12, atol=1E-12)
+
+def test_cholesky_sqrt(spd, update):
+    P, Q = spd[0], np.zeros((6,6))
+    np.testing.assert_allclose(cholesky_sqrt(P), np.linalg.cholesky(P), rtol=1E-12)
+    np.testing.assert_array_equal(cholesky_sqrt(Q), Q)
+    # semi-definite
+    H = update[1]
+    S = cholesky_sqrt(H.T@H)
+    np.testing.assert_allclose(S@S.T, H.T@H, rtol=1E-10, atol=1E-10)
+
+def test_cholupdate(spd, update):
+    P, X = spd[0], update[1].T*0.1
+    L = np.linalg.cholesky(P)
+    L_up, ok = cholupdate(L, X, 1.0)
+    assert ok
+    np.testing.assert_allclose(L_up@L_up.T, P + X@X.T, rtol=1E-12, atol=1E-12)
+    L_down, ok = cholupdate(L_up, X, -1.0)
+    assert ok
+    np.testing.assert_allclose(L_down, L, rtol=1E-10, atol=1E-12)
+    assert not cholupdate(L, 10*np.linalg.cholesky(P), -1.0)[1]
@@ -0,0 +1,11 @@
+import numpy as np
+import pytest
+from conftest import assert_same_estimates, run_case
+from StatOD.filters import ExtendedKalmanFilter, KalmanFilter
+
+@pytest.mark.parametrize("filter_class", [KalmanFilter, ExtendedKalmanFilter])
+def test_merge_gaps(j2_case, filter_class):
+    case = dict(j2_case, Y=j2_case["Y"].copy())
+    case["Y"][10:30] = np.nan
+    ref, merged = [run_case(filter_class, case, merge_gaps=merge_gaps).logger for merge_gaps in [False, True]]
+    assert_same_estimates(merged, ref)
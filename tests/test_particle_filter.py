@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+from StatOD.dynamics import get_Q, process_noise
+from StatOD.filters import RESAMPLING, ParticleFilter
+from StatOD.rotations import ECI_2_RCI
+
+@pytest.fixture(scope="module")
+def ric_noise(j2_case):
+    # SNC noise defined in the RIC frame, so Q depends on the state
+    Q0 = np.diag([1E-9, 4E-9, 9E-9])
+    Q_fcn = process_noise(j2_case["x0"], Q0, get_Q, [], use_numba=False)
+    return {"f" : None, "dfdx" : None, "f_args" : None,
+            "Q_fcn" : Q_fcn, "Q" : Q0, "Q_args" : [], "Q_DCM" : ECI_2_RCI}
+
+def particle_filter(x, f_dict, **kwargs):
+    return ParticleFilter(0.0, x, f_dict, {"h" : None, "dhdx" : None, "h_args" : None}, **kwargs)
+
+def test_process_noise_follows_state(j2_case, ric_noise):
+    rng = np.random.default_rng(0)
+    x0 = j2_case["x0"]
+    pf = particle_filter(x0 + rng.normal(size=(100,6))*1E-3, ric_noise, seed=0)
+    for x in [x0, np.hstack((x0[3:], x0[:3]))]:
+        x_k = np.repeat(x.reshape((1,-1)), 100, axis=0)
+        S = pf.process_noise_sqrt(30.0, x_k)
+        np.testing.assert_allclose(S@S.T, pf.get_process_noise(30.0, x), rtol=1E-8, atol=1E-20)
+
+def test_state_dependent_process_noise(j2_case, ric_noise):
+    rng = np.random.default_rng(0)
+    x = j2_case["x0"] + rng.normal(size=(50,6))*1E2
+    pf = particle_filter(x, dict(ric_noise, Q_state_dependent=True, Q_vectorized=True), seed=0)
+    S = pf.process_noise_sqrt(30.0, x)
+    assert S.shape == (50, 6, 6)
+    for k in range(len(x)):
+        np.testing.assert_allclose(S[k]@S[k].T, pf.get_process_noise(30.0, x[k]), rtol=1E-8, atol=1E-20)
+
+    # Q_dt sub-steps over the block
+    Q = pf.evaluate_process_noise(150.0, x)
+    for k in range(len(x)):
+        np.testing.assert_allclose(Q[k], pf.get_process_noise(150.0, x[k]), rtol=1E-12, atol=0.0)
+
+def test_process_noise_statistics(j2_case, ric_noise):
+    rng = np.random.default_rng(0)
+    x = j2_case["x0"] + rng.normal(size=(200000,6))*1E-3
+    pf = particle_filter(x, ric_noise, seed=1)
+    Q = pf.get_process_noise(30.0, pf.w_i_m1@x)
+    dx = pf.time_update(x, pf.process_noise_sqrt(30.0, x)) - x
+    np.testing.assert_allclose(dx.T@dx/len(dx), Q, rtol=0, atol=0.02*np.max(np.abs(Q)))
+
+def test_no_process_noise(j2_case):
+    x = np.repeat(j2_case["x0"].reshape((1,-1)), 5, axis=0)
+    pf = particle_filter(x, {"f" : None, "dfdx" : None, "f_args" : None})
+    np.testing.assert_array_equal(pf.time_update(x, pf.process_noise_sqrt(30.0, x)), x)
+
+@pytest.mark.parametrize("scheme", RESAMPLING.keys())
+def test_resampling_unbiased(scheme):
+    # the expected number of copies of each particle is N w
+    rng = np.random.default_rng(0)
+    w = rng.random(20)**4
+    w /= np.sum(w)
+    counts = np.zeros_like(w)
+    trials = 20000
+    for _ in range(trials):
+        idx = RESAMPLING[scheme](w, rng)
+        assert len(idx) == len(w) and np.all((idx >= 0) & (idx < len(w)))
+        counts += np.bincount(idx, minlength=len(w))
+    np.testing.assert_allclose(counts/trials, len(w)*w, rtol=0, atol=0.03)
+    if scheme in ["systematic", "residual"]:
+        # at least floor(N w) copies
+        assert np.all(np.bincount(RESAMPLING[scheme](w, rng), minlength=len(w)) >= np.floor(len(w)*w))
+
+def test_log_weights(j2_case):
+    rng = np.random.default_rng(0)
+    pf = particle_filter(np.zeros((50,6)), {"f" : None, "dfdx" : None, "f_args" : None}, seed=0)
+    R = j2_case["R0"]
+    r = rng.normal(size=(50,2))*np.sqrt(np.diag(R))
+    log_w = pf.measurement_update(pf.log_w_i_m1, R, r)
+    lik = np.exp(-0.5*np.sum(r**2/np.diag(R), axis=1))
+    np.testing.assert_allclose(np.exp(log_w), lik/np.sum(lik), rtol=1E-10)
+    # residuals thousands of sigmas away underflow every likelihood
+    log_w = pf.measurement_update(pf.log_w_i_m1, R, r*1E4)
+    assert np.all(np.isfinite(log_w)) and np.isclose(np.sum(np.exp(log_w)), 1.0)
+    assert np.argmax(log_w) == np.argmin(np.sum(r**2/np.diag(R), axis=1))
+
+def test_evaluate_h_vectorized():
+    calls = []
+    def h_range(x, args):
+        calls.append(np.shape(x))
+        return [np.sqrt((x[0] - args[0])**2 + x[1]**2), x[2]*args[1], args[0]]
+
+    X = np.random.default_rng(0).normal(size=(1000,6))
+    expected = np.stack((np.sqrt((X[:,0] - 1.0)**2 + X[:,1]**2), 2.0*X[:,2], np.ones(len(X))), axis=1)
+    for vectorized in [False, True]:
+        pf = ParticleFilter(0.0, np.zeros((10,6)), {"f" : None, "dfdx" : None, "f_args" : None},
+                            {"h" : h_range, "dhdx" : None, "h_args" : np.array([1.0, 2.0]), "vectorized" : vectorized})
+        calls.clear()
+        np.testing.assert_allclose(pf.evaluate_h(X), expected, rtol=1E-12)
+        # one call on the columns of X.T, the state independent entry broadcast
+        assert calls == ([(6, 1000)] if vectorized else [(6,)]*len(X))
@@ -0,0 +1,82 @@
+import copy
+import numpy as np
+import pytest
+from conftest import assert_same_estimates, run_case, run_filter
+from StatOD.dynamics import get_Gamma_SRIF, get_Q, process_noise
+from StatOD.filters import (ExtendedKalmanFilter, FilterLogger, FixedLagSmoother, KalmanFilter,
+                            Smoother, SquareRootInformationFilter)
+
+def with_noise(case, get_noise):
+    Q0 = np.eye(3)*1E-12
+    Q_fcn = process_noise(case["x0"], Q0, get_noise, [], use_numba=False)
+    return dict(case, f_dict=dict(case["f_dict"], Q=Q0, Q_fcn=Q_fcn, Q_args=[]))
+
+@pytest.fixture(scope="module")
+def noisy_case(j2_case):
+    # the SRIF takes the noise mapping Gamma as Q_fcn
+    return with_noise(j2_case, get_Gamma_SRIF)
+
+def test_srif_smoother(j2_case):
+    ref = Smoother(run_case(KalmanFilter, j2_case).logger)
+    ref.update()
+    srif = run_case(SquareRootInformationFilter, j2_case)
+    srif.smooth()
+    assert_same_estimates(srif.logger, ref.logger)
+
+def test_srif_smoother_process_noise(noisy_case):
+    # RTS over the SRIF's own predictions, which include Gamma Q Gamma^T
+    srif = run_case(SquareRootInformationFilter, noisy_case)
+    assert srif.R_u_0 is not None
+    ref = Smoother(srif.logger)
+    ref.update()
+    srif.smooth()
+    assert_same_estimates(srif.logger, ref.logger)
+
+def test_srif_without_process_noise(j2_case):
+    assert run_case(SquareRootInformationFilter, j2_case).R_u_0 is None
+    assert run_case(SquareRootInformationFilter, j2_case, f_dict={"Q" : None}).R_u_0 is None
+
+def smoothed(case, n, filter_class=KalmanFilter):
+    # RTS over the first n epochs
+    smoother = Smoother(run_case(filter_class, dict(case, **{key : case[key][:n] for key in ["t", "Y", "X"]})).logger)
+    smoother.update()
+    return smoother.logger
+
+@pytest.mark.parametrize("filter_class", [KalmanFilter, ExtendedKalmanFilter])
+@pytest.mark.parametrize("lag", [5, 59])
+def test_fixed_lag_smoother(j2_case, filter_class, lag):
+    case = with_noise(j2_case, get_Q)
+    n = len(case["t"])
+    logger = FilterLogger(6, n)
+    emitted = []
+    filter = filter_class(case["t"][0], case["x0"], case["dx0"], case["P0"], dict(case["f_dict"]), dict(case["h_dict"]))
+    run_filter(FixedLagSmoother(filter, lag, logger=logger, callback=emitted.append), case)
+    assert len(emitted) == n
+    # epoch k is smoothed with the data up to k + lag
+    for k in [0, n//2, n - lag - 1, n - 1]:
+        ref = smoothed(case, min(k + lag + 1, n), filter_class)
+        assert_same_estimates(logger, ref, k, k)
+    # deviations are from the reference trajectory, zero for the EKF
+    np.testing.assert_allclose(logger.dx_i_plus, logger.x_hat_i_plus - logger.x_i, rtol=0, atol=1E-9)
+    if filter_class is ExtendedKalmanFilter:
+        np.testing.assert_array_equal(logger.x_i, 0.0)
+
+@pytest.mark.parametrize("in_place, diagonal_only", [(True, False), (False, True), (True, True)])
+def test_smoother_modes(j2_case, in_place, diagonal_only):
+    filter_logger = run_case(KalmanFilter, with_noise(j2_case, get_Q)).logger
+    ref = Smoother(copy.deepcopy(filter_logger))
+    ref.update()
+
+    P_filter = filter_logger.P_i_plus.copy()
+    smoother = Smoother(filter_logger, in_place=in_place, diagonal_only=diagonal_only)
+    smoother.update()
+    assert (smoother.logger is filter_logger) == in_place
+    for key in ["x_hat_i_plus", "dx_i_plus", "sigma_i"]:
+        np.testing.assert_allclose(getattr(smoother.logger, key), getattr(ref.logger, key), rtol=1E-12, atol=1E-15)
+    if diagonal_only:
+        np.testing.assert_array_equal(filter_logger.P_i_plus, P_filter)
+    else:
+        np.testing.assert_allclose(smoother.logger.P_i_plus, ref.logger.P_i_plus, rtol=1E-12, atol=1E-20)
+    if not in_place:
+        np.testing.assert_array_equal(filter_logger.P_i_plus, P_filter)
+        assert not np.array_equal(filter_logger.x_hat_i_plus, smoother.logger.x_hat_i_plus)
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from StatOD.constants import EarthParams
+from StatOD.dynamics import (analytic_states, dfdx_pattern, dynamics, dynamics_ivp,
+                             dynamics_ivp_jacobian, f_J2, f_J2_DMC, stm_jacobian)
+from StatOD.filters import ExtendedKalmanFilter
+
+def f_damped_spring(x, args):
+    # A[1,2] = x[1] vanishes at rest, and couples the analytic state x[2]
+    tau, k = args
+    return np.array([x[1], -k*x[0] + 0.5*x[1]*x[2], -x[2]/tau])
+
+def propagate(x0, f_fcn, f_args, t, blocks):
+    N = len(x0)
+    f, dfdx = dynamics(x0, f_fcn, f_args)
+    f_dict = {"f" : f, "dfdx" : dfdx, "f_args" : f_args}
+    if blocks:
+        f_dict['analytic_states'] = analytic_states(x0, f_fcn, f_args)
+        f_dict['dfdx_pattern'] = dfdx_pattern(x0, f_fcn, f_args)
+    h_dict = {"h" : None, "dhdx" : None, "h_args" : None}
+    filter = ExtendedKalmanFilter(0.0, x0, np.zeros(N), np.eye(N), f_dict, h_dict)
+    return filter.propagate_forward(t, x0, np.eye(N))
+
+@pytest.mark.parametrize("case", ["J2_DMC", "damped_spring"])
+def test_block_stm(case):
+    if case == "J2_DMC":
+        ep = EarthParams()
+        x0 = np.array([-3515.4903270335103, 8390.716310243395, 4127.627352553683,
+                       -4.357676322178153, -3.3565791387645487, 3.111892927869902,
+                       1E-7, 2E-7, -1E-7])
+        f_fcn, f_args, t, S = f_J2_DMC, np.array([ep.R, ep.mu, ep.J2, 1000.0]), 600.0, [6, 7, 8]
+    else:
+        x0 = np.array([1.0, 0.0, 0.1])
+        f_fcn, f_args, t, S = f_damped_spring, np.array([50.0, 1.0]), 10.0, [2]
+    assert analytic_states(x0, f_fcn, f_args) == S
+
+    x_ref, phi_ref = propagate(x0, f_fcn, f_args, t, blocks=False)
+    x, phi = propagate(x0, f_fcn, f_args, t, blocks=True)
+    np.testing.assert_allclose(x, x_ref, rtol=1E-12)
+    np.testing.assert_allclose(phi, phi_ref, rtol=0, atol=1E-11*np.max(np.abs(phi_ref)))
+    if case == "damped_spring":
+        assert abs(phi_ref[1,2]) > 1E-3
+
+def test_block_stm_requires_pattern():
+    x0 = np.array([1.0, 0.0, 0.1])
+    f, dfdx = dynamics(x0, f_damped_spring, np.array([50.0, 1.0]))
+    f_dict = {"f" : f, "dfdx" : dfdx, "f_args" : np.array([50.0, 1.0]), "analytic_states" : [2]}
+    with pytest.raises(ValueError, match="dfdx_pattern"):
+        ExtendedKalmanFilter(0.0, x0, np.zeros(3), np.eye(3), f_dict, {"h" : None, "dhdx" : None, "h_args" : None})
+
+@pytest.mark.parametrize("case", ["J2", "J2_DMC"])
+def test_stm_jacobian(j2_case, case):
+    if case == "J2":
+        x0, f_fcn, f_args = j2_case["x0"], f_J2, j2_case["f_args"]
+    else:
+        x0 = np.append(j2_case["x0"], [1E-7, 2E-7, -1E-7])
+        f_fcn, f_args = f_J2_DMC, np.append(j2_case["f_args"], 1000.0)
+    N = len(x0)
+    f, dfdx = dynamics(x0, f_fcn, f_args)
+    d2fdx2, sparsity = stm_jacobian(x0, f_fcn, f_args)
+    phi = np.eye(N) + np.random.default_rng(4).normal(size=(N,N))
+    Z = np.hstack((x0, phi.reshape((-1))))
+
+    J = dynamics_ivp_jacobian(0.0, Z, f, dfdx, d2fdx2, f_args)
+    h = 1E-4*np.maximum(np.abs(Z), 1.0)
+    J_fd = np.zeros_like(J)
+    for k in range(len(Z)):
+        dZ = np.zeros_like(Z)
+        dZ[k] = h[k]
+        J_fd[:,k] = (dynamics_ivp(0.0, Z + dZ, f, dfdx, f_args) - dynamics_ivp(0.0, Z - dZ, f, dfdx, f_args))/(2*h[k])
+    # the blocks differ by orders of magnitude, so compare them separately
+    for rows, cols in [(slice(0,N), slice(0,N)), (slice(N,None), slice(0,N)), (slice(N,None), slice(N,None))]:
+        scale = np.max(np.abs(J_fd[rows,cols]))
+        np.testing.assert_allclose(J[rows,cols], J_fd[rows,cols], rtol=1E-5, atol=1E-7*scale)
+
+    # the pattern covers every nonzero, and isn't dense
+    assert np.all(sparsity[J != 0.0])
+    assert np.all(sparsity[J_fd != 0.0])
+    assert sparsity.sum() < sparsity.size